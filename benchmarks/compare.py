@@ -0,0 +1,93 @@
+"""
+Compara dois resultados do benchmarks/run.py (ex.: antes e depois de uma alteração).
+
+Uso:
+    python -m benchmarks.compare benchmarks/results/antes.json benchmarks/results/depois.json
+    python -m benchmarks.compare antes.json depois.json --fail-on-regression 10
+
+Com --fail-on-regression o comando termina com código 1 quando alguma métrica piora mais que a porcentagem informada.
+"""
+from typing import List, Optional, Tuple
+from pathlib import Path
+import argparse
+import json
+import sys
+
+# (nome exibido, caminho no resultado do cenário, True se valores maiores são melhores)
+METRICS: List[Tuple[str, Tuple[str, ...], bool]] = [
+    ("vazão (req/s)", ("throughput_rps",), True),
+    ("latência média (s)", ("latency_seconds", "mean"), False),
+    ("latência p50 (s)", ("latency_seconds", "p50"), False),
+    ("latência p95 (s)", ("latency_seconds", "p95"), False),
+    ("latência p99 (s)", ("latency_seconds", "p99"), False),
+    ("pico RSS (MB)", ("peak_rss_mb",), False),
+    ("chamadas Ollama/req", ("upstream_calls_per_request", "ollama"), False),
+    ("chamadas Chroma/req", ("upstream_calls_per_request", "chroma"), False),
+    ("chamadas Sonar/req", ("upstream_calls_per_request", "sonar"), False),
+]
+
+
+def _get(data: dict, path: Tuple[str, ...]) -> Optional[float]:
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def _change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if before is None or after is None or before == 0:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(before: dict, after: dict, fail_threshold: Optional[float] = None) -> List[str]:
+    """Imprime a tabela de cada cenário e retorna as métricas que pioraram acima de fail_threshold (%)"""
+    regressions = []
+    print(f"Antes:  {before.get('commit')}{' (dirty)' if before.get('dirty') else ''} {before.get('label') or ''} {before.get('started_at', '')}")
+    print(f"Depois: {after.get('commit')}{' (dirty)' if after.get('dirty') else ''} {after.get('label') or ''} {after.get('started_at', '')}")
+
+    for scenario in after.get("scenarios", {}):
+        if scenario not in before.get("scenarios", {}):
+            print(f"\n{scenario}: sem resultado anterior")
+            continue
+        old, new = before["scenarios"][scenario], after["scenarios"][scenario]
+        print(f"\n{scenario} ({old.get('ok')}/{old.get('requests')} → {new.get('ok')}/{new.get('requests')} ok)")
+        print(f"  {'métrica':<22}{'antes':>12}{'depois':>12}{'variação':>12}")
+        for name, path, higher_is_better in METRICS:
+            old_value, new_value = _get(old, path), _get(new, path)
+            if old_value is None and new_value is None:
+                continue
+            change = _change(old_value, new_value)
+            mark = ""
+            if change is not None and abs(change) >= 1:
+                improved = change > 0 if higher_is_better else change < 0
+                mark = " ✅" if improved else " ⚠️"
+                if not improved and fail_threshold is not None and abs(change) > fail_threshold:
+                    regressions.append(f"{scenario}: {name} {change:+.1f}%")
+            change_text = f"{change:+.1f}%" if change is not None else "-"
+            print(f"  {name:<22}{_format(old_value):>12}{_format(new_value):>12}{change_text:>12}{mark}")
+    return regressions
+
+
+def _format(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:g}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara dois resultados do benchmark")
+    parser.add_argument("before", type=Path, help="Resultado de referência (ex.: commit anterior)")
+    parser.add_argument("after", type=Path, help="Resultado novo")
+    parser.add_argument("--fail-on-regression", type=float, metavar="PORCENTAGEM", help="Termina com código 1 se alguma métrica piorar mais que isso")
+    args = parser.parse_args(argv)
+
+    before = json.loads(args.before.read_text(encoding="utf-8"))
+    after = json.loads(args.after.read_text(encoding="utf-8"))
+    regressions = compare(before, after, args.fail_on_regression)
+    if regressions:
+        print("\n❌ Regressões acima do limite:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
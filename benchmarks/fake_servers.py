@@ -0,0 +1,408 @@
+"""
+Servidores falsos (Ollama, ChromaDB e SonarQube) usados nos benchmarks.
+
+Cada servidor roda em uma thread, responde somente o necessário para a API funcionar e conta
+as chamadas recebidas por rota, para comparar a quantidade de chamadas aos upstreams entre commits.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+import threading
+import hashlib
+import json
+import math
+import time
+import uuid
+import re
+
+Route = Tuple[str, Pattern, Callable, str]
+
+
+class FakeServer:
+    """Servidor HTTP em thread, com rotas (método + regex) e contagem das chamadas"""
+
+    name = "fake"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.routes: List[Route] = []
+        self.calls: Counter = Counter()
+        self._calls_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def route(self, method: str, pattern: str, fn: Callable, name: Optional[str] = None):
+        """Adiciona uma rota; 'name' identifica a rota na contagem das chamadas (padrão: o próprio caminho)"""
+        self.routes.append((method, re.compile(f"^{pattern}$"), fn, name or pattern))
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"fake-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_calls(self):
+        with self._calls_lock:
+            self.calls.clear()
+
+    def snapshot_calls(self) -> Dict[str, int]:
+        with self._calls_lock:
+            return dict(self.calls)
+
+    def _count(self, key: str):
+        with self._calls_lock:
+            self.calls[key] += 1
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method: str):
+                path = self.path.split("?", 1)[0]
+                for route_method, pattern, fn, name in server.routes:
+                    match = pattern.match(path)
+                    if route_method == method and match:
+                        server._count(f"{method} {name}")
+                        length = int(self.headers.get("Content-Length") or 0)
+                        body = self.rfile.read(length) if length else b""
+                        try:
+                            fn(self, match, body)
+                        except (BrokenPipeError, ConnectionResetError):
+                            # O cliente encerrou a conexão (ex.: geração interrompida ao fechar o JSON)
+                            self.close_connection = True
+                        return
+                server._count(f"{method} (não encontrado)")
+                send_json(self, {"error": f"rota não encontrada: {method} {path}"}, status=404)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+        return Handler
+
+
+def send_json(handler: BaseHTTPRequestHandler, data, status: int = 200):
+    body = json.dumps(data).encode("utf-8")
+    handler.send_response(status)
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def send_chunk(handler: BaseHTTPRequestHandler, data: bytes):
+    handler.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+    handler.wfile.flush()
+
+
+class FakeOllama(FakeServer):
+    """
+    Ollama falso: /api/generate e /api/chat em streaming, /api/embeddings e /api/ps.
+
+    :param ttft: segundos até o primeiro token (simula a avaliação do prompt)
+    :param tokens_per_second: velocidade da geração (0 = sem espera entre os tokens)
+    :param issues_per_file: issues no JSON retornado para cada arquivo analisado (/api/chat)
+    :param answer: texto retornado no /api/generate (chat do /ask e descrição de imagens)
+    :param embedding_dim: tamanho dos vetores do /api/embeddings
+    :param embedding_latency: segundos de cada chamada de embedding
+    """
+
+    name = "ollama"
+    FILE_PATTERN = re.compile(r"--- Arquivo: (.+?) ---")
+
+    def __init__(self, ttft: float = 0.05, tokens_per_second: float = 0, issues_per_file: int = 2,
+                 answer: str = "Resposta de teste gerada pelo Ollama falso.", embedding_dim: int = 384,
+                 embedding_latency: float = 0.005, **kwargs):
+        super().__init__(**kwargs)
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.issues_per_file = issues_per_file
+        self.answer = answer
+        self.embedding_dim = embedding_dim
+        self.embedding_latency = embedding_latency
+        self.route("POST", "/api/generate", self._generate)
+        self.route("POST", "/api/chat", self._chat)
+        self.route("POST", "/api/embeddings", self._embeddings)
+        self.route("GET", "/api/ps", self._ps)
+
+    def canned_issues(self, prompt: str) -> str:
+        """JSON de issues para cada arquivo do prompt (vários na análise agrupada), no formato pedido pelo prompt de análise"""
+        file_paths = self.FILE_PATTERN.findall(prompt) or ["arquivo.py"]
+        issues = [
+            {
+                "id": f"bench-{file_number}-{index}",
+                "severity": "MAJOR",
+                "category": "BUG",
+                "description": f"Problema sintético {index} encontrado pelo benchmark",
+                "file": file_path,
+                "line": str(10 * (index + 1)),
+                "recommendation": "Corrigir o problema sintético"
+            }
+            for file_number, file_path in enumerate(file_paths)
+            for index in range(self.issues_per_file)
+        ]
+        return json.dumps(issues, ensure_ascii=False)
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        # ~4 caracteres por token
+        return [text[index:index + 4] for index in range(0, len(text), 4)]
+
+    def _stream(self, handler, payload: dict, text: str, prompt_chars: int, chat: bool):
+        model = payload.get("model", "")
+        tokens = self._tokens(text)
+        start = time.time()
+
+        if payload.get("stream") is False:
+            time.sleep(self.ttft + (len(tokens) / self.tokens_per_second if self.tokens_per_second else 0))
+            data = {"model": model, "done": True, "response": text}
+            send_json(handler, data)
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        time.sleep(self.ttft)
+        generation_start = time.time()
+        for token in tokens:
+            data = {"model": model, "done": False}
+            if chat:
+                data["message"] = {"role": "assistant", "content": token}
+            else:
+                data["response"] = token
+            send_chunk(handler, (json.dumps(data) + "\n").encode("utf-8"))
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+
+        final = {
+            "model": model,
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.time() - start) * 1e9),
+            "prompt_eval_count": max(1, prompt_chars // 4),
+            "prompt_eval_duration": int(self.ttft * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": max(1, int((time.time() - generation_start) * 1e9))
+        }
+        if chat:
+            final["message"] = {"role": "assistant", "content": ""}
+        else:
+            final["response"] = ""
+        send_chunk(handler, (json.dumps(final) + "\n").encode("utf-8"))
+        send_chunk(handler, b"")
+
+    def _generate(self, handler, match, body: bytes):
+        payload = json.loads(body or b"{}")
+        self._stream(handler, payload, self.answer, len(payload.get("prompt", "")), chat=False)
+
+    def _chat(self, handler, match, body: bytes):
+        payload = json.loads(body or b"{}")
+        messages = payload.get("messages", [])
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        user_prompt = messages[-1].get("content", "") if messages else ""
+        self._stream(handler, payload, self.canned_issues(user_prompt), len(prompt), chat=True)
+
+    def _embeddings(self, handler, match, body: bytes):
+        payload = json.loads(body or b"{}")
+        time.sleep(self.embedding_latency)
+        # Vetor determinístico a partir do texto
+        seed = hashlib.sha256(str(payload.get("prompt", "")).encode("utf-8")).digest()
+        vector = [math.sin(seed[index % len(seed)] + index) for index in range(self.embedding_dim)]
+        send_json(handler, {"embedding": vector})
+
+    def _ps(self, handler, match, body: bytes):
+        send_json(handler, {"models": []})
+
+
+class FakeChroma(FakeServer):
+    """ChromaDB falso (API v2, usada pelo chromadb.AsyncHttpClient), com as coleções em memória e busca por distância"""
+
+    name = "chroma"
+    BASE = r"/api/v2/tenants/[^/]+/databases/[^/]+/collections"
+
+    def __init__(self, query_latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.query_latency = query_latency
+        self.collections: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+        self.route("GET", r"/api/v2/?(heartbeat)?", lambda h, m, b: send_json(h, {"nanosecond heartbeat": time.time_ns()}), "heartbeat")
+        self.route("GET", r"/api/v2/version", lambda h, m, b: send_json(h, "1.0.0"), "version")
+        self.route("GET", r"/api/v2/pre-flight-checks", lambda h, m, b: send_json(h, {"max_batch_size": 5000}), "pre-flight-checks")
+        self.route("GET", r"/api/v2/auth/identity", lambda h, m, b: send_json(h, {"user_id": "", "tenant": "default_tenant", "databases": ["default_database"]}), "identity")
+        self.route("GET", r"/api/v2/tenants/([^/]+)", lambda h, m, b: send_json(h, {"name": m.group(1)}), "tenant")
+        self.route("GET", r"/api/v2/tenants/([^/]+)/databases/([^/]+)", lambda h, m, b: send_json(h, {"id": str(uuid.UUID(int=0)), "name": m.group(2), "tenant": m.group(1)}), "database")
+        self.route("POST", self.BASE, self._create_collection, "collections")
+        self.route("POST", self.BASE + r"/([^/]+)/add", self._add, "add")
+        self.route("POST", self.BASE + r"/([^/]+)/upsert", self._add, "upsert")
+        self.route("POST", self.BASE + r"/([^/]+)/get", self._get, "get")
+        self.route("POST", self.BASE + r"/([^/]+)/delete", self._delete, "delete")
+        self.route("POST", self.BASE + r"/([^/]+)/query", self._query, "query")
+        self.route("GET", self.BASE + r"/([^/]+)/count", self._count_records, "count")
+
+    @staticmethod
+    def _collection_model(collection: dict) -> dict:
+        return {
+            "id": collection["id"],
+            "name": collection["name"],
+            "metadata": collection["metadata"],
+            "configuration_json": {},
+            "dimension": None,
+            "tenant": "default_tenant",
+            "database": "default_database",
+            "version": 0,
+            "log_position": 0
+        }
+
+    def _create_collection(self, handler, match, body: bytes):
+        payload = json.loads(body or b"{}")
+        with self._lock:
+            collection = next((c for c in self.collections.values() if c["name"] == payload["name"]), None)
+            if collection is None:
+                collection = {"id": str(uuid.uuid4()), "name": payload["name"], "metadata": payload.get("metadata"), "records": {}}
+                self.collections[collection["id"]] = collection
+        send_json(handler, self._collection_model(collection))
+
+    def _records(self, collection_id: str) -> dict:
+        return self.collections[collection_id]["records"]
+
+    @staticmethod
+    def _matches(metadata: Optional[dict], where: Optional[dict]) -> bool:
+        if not where:
+            return True
+        metadata = metadata or {}
+        for key, condition in where.items():
+            expected = condition.get("$eq") if isinstance(condition, dict) else condition
+            if metadata.get(key) != expected:
+                return False
+        return True
+
+    def _add(self, handler, match, body: bytes):
+        payload = json.loads(body or b"{}")
+        ids = payload.get("ids", [])
+        metadatas = payload.get("metadatas") or [None] * len(ids)
+        documents = payload.get("documents") or [None] * len(ids)
+        embeddings = payload.get("embeddings") or [None] * len(ids)
+        with self._lock:
+            records = self._records(match.group(1))
+            for index, record_id in enumerate(ids):
+                records[record_id] = {"document": documents[index], "metadata": metadatas[index], "embedding": embeddings[index]}
+        send_json(handler, True, status=201)
+
+    def _get(self, handler, match, body: bytes):
+        payload = json.loads(body or b"{}")
+        with self._lock:
+            records = self._records(match.group(1))
+            selected = [
+                (record_id, record) for record_id, record in records.items()
+                if (not payload.get("ids") or record_id in payload["ids"]) and self._matches(record["metadata"], payload.get("where"))
+            ]
+        send_json(handler, {
+            "ids": [record_id for record_id, _ in selected],
+            "documents": [record["document"] for _, record in selected],
+            "metadatas": [record["metadata"] for _, record in selected],
+            "embeddings": None,
+            "uris": None,
+            "data": None,
+            "include": ["documents", "metadatas"]
+        })
+
+    def _delete(self, handler, match, body: bytes):
+        payload = json.loads(body or b"{}")
+        with self._lock:
+            records = self._records(match.group(1))
+            for record_id in [record_id for record_id, record in records.items()
+                              if (not payload.get("ids") or record_id in payload["ids"]) and self._matches(record["metadata"], payload.get("where"))]:
+                del records[record_id]
+        send_json(handler, None)
+
+    def _count_records(self, handler, match, body: bytes):
+        with self._lock:
+            send_json(handler, len(self._records(match.group(1))))
+
+    def _query(self, handler, match, body: bytes):
+        payload = json.loads(body or b"{}")
+        time.sleep(self.query_latency)
+        n_results = payload.get("n_results", 10)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": None, "uris": None, "data": None, "include": ["documents", "metadatas", "distances"]}
+
+        with self._lock:
+            records = list(self._records(match.group(1)).items())
+        for query in payload.get("query_embeddings", []):
+            scored = sorted(
+                ((sum((a - b) ** 2 for a, b in zip(query, record["embedding"] or [])), record_id, record) for record_id, record in records),
+                key=lambda item: item[0]
+            )[:n_results]
+            result["ids"].append([record_id for _, record_id, _ in scored])
+            result["documents"].append([record["document"] for _, _, record in scored])
+            result["metadatas"].append([record["metadata"] for _, _, record in scored])
+            result["distances"].append([distance for distance, _, _ in scored])
+        send_json(handler, result)
+
+
+class FakeSonar(FakeServer):
+    """SonarQube falso: /api/issues/search (paginado) e /api/components/show"""
+
+    name = "sonar"
+
+    def __init__(self, total_issues: int = 0, files: Optional[List[str]] = None, latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.total_issues = total_issues
+        self.files = files or ["main.py"]
+        self.latency = latency
+        self.analysis_date = time.strftime("%Y-%m-%dT%H:%M:%S+0000", time.gmtime())
+        self.route("GET", r"/api/issues/search", self._issues)
+        self.route("GET", r"/api/components/show", self._component)
+
+    def _issues(self, handler, match, body: bytes):
+        from urllib.parse import parse_qs, urlparse
+        query = parse_qs(urlparse(handler.path).query)
+        page = int(query.get("p", ["1"])[0])
+        page_size = int(query.get("ps", ["100"])[0])
+        component = query.get("componentKeys", ["bench"])[0]
+        time.sleep(self.latency)
+
+        start = (page - 1) * page_size
+        issues = [
+            {
+                "key": f"sonar-{index}",
+                "rule": "bench:rule",
+                "severity": "MAJOR",
+                "component": f"{component}:{self.files[index % len(self.files)]}",
+                "line": 5 + index % 50,
+                "message": f"Issue sintética do SonarQube {index}",
+                "type": "CODE_SMELL"
+            }
+            for index in range(start, min(self.total_issues, start + page_size))
+        ]
+        send_json(handler, {"total": self.total_issues, "p": page, "ps": page_size, "paging": {"pageIndex": page, "pageSize": page_size, "total": self.total_issues}, "issues": issues})
+
+    def _component(self, handler, match, body: bytes):
+        send_json(handler, {"component": {"key": "bench", "analysisDate": self.analysis_date}})
@@ -0,0 +1,385 @@
+"""
+Benchmark ponta a ponta da API: /upload-pdf, /ask e /analyze.
+
+Sobe o Ollama, o ChromaDB e o SonarQube falsos (benchmarks/fake_servers.py), gera um repositório e um PDF
+sintéticos (benchmarks/synthetic.py), inicia a API (uvicorn) em outro processo apontando para os servidores
+falsos e mede, por cenário: vazão, percentis de latência, pico de memória (RSS) do processo da API e
+quantidade de chamadas recebidas por cada upstream.
+
+O resultado é gravado em JSON (benchmarks/results/<data>-<commit>.json) para comparar commits com
+benchmarks/compare.py.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.run --requests 20 --concurrency 4 --files 30
+"""
+from benchmarks.fake_servers import FakeOllama, FakeChroma, FakeSonar
+from benchmarks.synthetic import make_repo, make_pdf
+from typing import Dict, List, Optional
+from pathlib import Path
+import subprocess
+import threading
+import argparse
+import platform
+import tempfile
+import asyncio
+import shutil
+import socket
+import httpx
+import json
+import math
+import time
+import sys
+import os
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SCENARIOS = ("upload-pdf", "ask", "analyze")
+RESULT_SCHEMA = 1
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Percentil com interpolação linear entre os valores vizinhos"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_summary(latencies: List[float]) -> dict:
+    summary = {"mean": sum(latencies) / len(latencies) if latencies else None}
+    for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99), ("max", 1.0)):
+        summary[name] = percentile(latencies, fraction)
+    return {name: round(value, 4) if value is not None else None for name, value in summary.items()}
+
+
+def git_info() -> dict:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or "unknown",
+        "subject": git("log", "-1", "--format=%s"),
+        # Alterações não commitadas nos arquivos versionados (o resultado não corresponde exatamente ao commit)
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class RssSampler:
+    """Lê o RSS do processo da API (/proc/<pid>/status) em uma thread, guardando o maior valor do cenário"""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def read_status(self, field: str) -> int:
+        try:
+            with open(f"/proc/{self.pid}/status") as status:
+                for line in status:
+                    if line.startswith(f"{field}:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        # Sem /proc (ex.: Windows/macOS): usa o psutil, se estiver instalado
+        try:
+            import psutil
+            return psutil.Process(self.pid).memory_info().rss // 1024
+        except Exception:
+            return 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_kb = max(self.peak_kb, self.read_status("VmRSS"))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self.peak_kb = self.read_status("VmRSS")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> float:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return round(self.peak_kb / 1024, 1)
+
+
+class ApiProcess:
+    """API (uvicorn main:app) em outro processo, configurada pelas variáveis de ambiente"""
+
+    def __init__(self, port: int, env: Dict[str, str], log_path: Path):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.env = env
+        self.log_path = log_path
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self, timeout: float = 60):
+        self._log = open(self.log_path, "wb")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=ROOT_DIR, env={**os.environ, **self.env}, stdout=self._log, stderr=subprocess.STDOUT
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"A API terminou durante o startup (código {self.process.returncode}), veja {self.log_path}")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=2).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"A API não respondeu o /health em {timeout}s, veja {self.log_path}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self._log.close()
+
+
+def request_ok(scenario: str, response: httpx.Response) -> bool:
+    if response.status_code != 200:
+        return False
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    if scenario == "upload-pdf":
+        # O /upload-pdf retorna 200 mesmo com erro, a mensagem indica o resultado
+        return "error" not in data and "Erro" not in data.get("status", "")
+    if scenario == "ask":
+        return bool(data.get("answer"))
+    return "analysis" in data
+
+
+async def run_scenario(scenario: str, api_url: str, build_request, requests: int, concurrency: int, timeout: float) -> dict:
+    """Executa 'requests' chamadas do cenário, no máximo 'concurrency' ao mesmo tempo"""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        for index in counter:
+            method, path, kwargs = build_request(index)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, f"{api_url}{path}", **kwargs)
+                elapsed = time.perf_counter() - start
+                if request_ok(scenario, response):
+                    latencies.append(elapsed)
+                    continue
+                key = f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+            errors[key] = errors.get(key, 0) + 1
+
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        duration = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "duration_seconds": round(duration, 4),
+        "throughput_rps": round(len(latencies) / duration, 4) if duration else None,
+        "latency_seconds": latency_summary(latencies),
+    }
+
+
+def scenario_requests(scenario: str, args, repo_path: Path, pdf_bytes: bytes):
+    """Função que monta a chamada (método, caminho, kwargs do httpx) de cada requisição do cenário"""
+    if scenario == "upload-pdf":
+        # Nomes diferentes por requisição: cada upload apaga somente os próprios chunks
+        return lambda index: ("POST", "/upload-pdf", {
+            "files": {"file": (f"bench_{index}.pdf", pdf_bytes, "application/pdf")},
+            "data": {"description": "Manual sintético do benchmark"},
+        })
+    if scenario == "ask":
+        return lambda index: ("POST", "/ask", {"data": {"question": f"Como configurar o servidor? ({index})"}})
+    return lambda index: ("POST", "/analyze", {"json": {
+        "sonar_project_key": "bench",
+        "project_git_url": str(repo_path),
+        "project_git_branch": "master",
+    }})
+
+
+def api_env(args, workdir: Path, ollama: FakeOllama, chroma: FakeChroma, sonar: FakeSonar) -> Dict[str, str]:
+    env = {
+        "OLLAMA_URL": ollama.url,
+        "OLLAMA_URLS": ollama.url,
+        "CHROMADB_HOST": "127.0.0.1",
+        "CHROMADB_PORT": str(chroma.port),
+        "SONAR_URL": sonar.url,
+        "SONAR_TOKEN": "bench",
+        "SONAR_ISSUES_CACHE_TTL": "0",
+        # Obrigatórios no startup; o repositório sintético é um caminho local, sem autenticação
+        "GIT_USER": "bench",
+        "GIT_TOKEN": "bench",
+        "GIT_PROJECT_TEMP": str(workdir / "project_temp"),
+        "ANALYSIS_CACHE_ENABLED": "true" if args.analysis_cache else "false",
+        "ANALYSIS_CACHE_DIR": str(workdir / "cache" / "analysis"),
+        "ANALYSIS_STATE_DIR": str(workdir / "cache" / "state"),
+        "RESULT_STORE_PATH": str(workdir / "cache" / "results.db"),
+        "RESULT_STORE_REUSE": "true" if args.reuse_results else "false",
+        "ACCEPTED_EXTENSIONS": ",".join(args.extensions),
+        "ANALYZE_MAX_WORKERS": str(args.analyze_workers),
+        # As requisições concorrentes aguardam na fila dos executores em vez de receber 503
+        "EXECUTOR_QUEUE_SIZE": str(max(10, args.concurrency)),
+        "LOGS": str(workdir / "logs"),
+        "LOG_PROMPTS": "off",
+        "LOG_LEVEL": args.log_level,
+    }
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+    return env
+
+
+def run(args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="bench_"))
+    ollama = FakeOllama(ttft=args.ttft, tokens_per_second=args.tokens_per_second, issues_per_file=args.issues_per_file,
+                        embedding_latency=args.embedding_latency).start()
+    chroma = FakeChroma(query_latency=args.chroma_latency).start()
+    repo_files = [f"src/pacote_{index // 10}/modulo_{index}{args.extensions[index % len(args.extensions)]}" for index in range(args.files)]
+    sonar = FakeSonar(total_issues=args.sonar_issues, files=repo_files, latency=args.sonar_latency).start()
+    upstreams = {"ollama": ollama, "chroma": chroma, "sonar": sonar}
+
+    repo_path = make_repo(workdir / "repo", files=args.files, lines_per_file=args.lines_per_file, extensions=args.extensions)
+    pdf_bytes = make_pdf(workdir / "manual.pdf", pages=args.pdf_pages, images_per_page=args.pdf_images).read_bytes()
+
+    api = ApiProcess(args.port or free_port(), api_env(args, workdir, ollama, chroma, sonar), workdir / "api.log")
+    results = {"scenarios": {}}
+    try:
+        api.start()
+        sampler = RssSampler(api.process.pid)
+        for scenario in args.scenarios:
+            build_request = scenario_requests(scenario, args, repo_path, pdf_bytes)
+            if args.warmup:
+                asyncio.run(run_scenario(scenario, api.url, build_request, args.warmup, 1, args.timeout))
+            for upstream in upstreams.values():
+                upstream.reset_calls()
+
+            print(f"▶️ {scenario}: {args.requests} requisições, concorrência {args.concurrency}")
+            sampler.start()
+            result = asyncio.run(run_scenario(scenario, api.url, build_request, args.requests, args.concurrency, args.timeout))
+            result["peak_rss_mb"] = sampler.stop()
+            calls = {name: upstream.snapshot_calls() for name, upstream in upstreams.items()}
+            result["upstream_calls"] = calls
+            result["upstream_calls_per_request"] = {
+                name: round(sum(counts.values()) / args.requests, 3) for name, counts in calls.items()
+            }
+            results["scenarios"][scenario] = result
+        results["process_peak_rss_mb"] = round(sampler.read_status("VmHWM") / 1024, 1)
+    finally:
+        api.stop()
+        for upstream in upstreams.values():
+            upstream.stop()
+        if args.keep_workdir:
+            print(f"📁 Arquivos do benchmark mantidos em {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta da API com Ollama, ChromaDB e SonarQube falsos")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Cenários separados por vírgula ({', '.join(SCENARIOS)})")
+    parser.add_argument("--requests", type=int, default=10, help="Requisições medidas por cenário")
+    parser.add_argument("--concurrency", type=int, default=2, help="Requisições ao mesmo tempo")
+    parser.add_argument("--warmup", type=int, default=1, help="Requisições por cenário antes da medição (não entram no resultado)")
+    parser.add_argument("--timeout", type=float, default=600, help="Tempo máximo (segundos) de cada requisição")
+    parser.add_argument("--label", default="", help="Identificação livre gravada no resultado")
+
+    group = parser.add_argument_group("dados sintéticos")
+    group.add_argument("--files", type=int, default=20, help="Arquivos do repositório sintético")
+    group.add_argument("--lines-per-file", type=int, default=80, help="Linhas de cada arquivo do repositório")
+    group.add_argument("--extensions", default=".py,.js,.java", help="Extensões dos arquivos do repositório")
+    group.add_argument("--pdf-pages", type=int, default=5, help="Páginas do PDF sintético")
+    group.add_argument("--pdf-images", type=int, default=1, help="Imagens por página do PDF")
+
+    group = parser.add_argument_group("upstreams falsos")
+    group.add_argument("--ttft", type=float, default=0.05, help="Segundos até o primeiro token do Ollama")
+    group.add_argument("--tokens-per-second", type=float, default=0, help="Velocidade da geração do Ollama (0 = sem espera)")
+    group.add_argument("--issues-per-file", type=int, default=2, help="Issues retornadas pelo Ollama para cada arquivo")
+    group.add_argument("--embedding-latency", type=float, default=0.005, help="Segundos de cada embedding")
+    group.add_argument("--chroma-latency", type=float, default=0.0, help="Segundos de cada query no ChromaDB")
+    group.add_argument("--sonar-issues", type=int, default=0, help="Issues existentes no SonarQube falso")
+    group.add_argument("--sonar-latency", type=float, default=0.0, help="Segundos de cada página de issues do SonarQube")
+
+    group = parser.add_argument_group("API")
+    group.add_argument("--port", type=int, default=0, help="Porta da API (0 = porta livre)")
+    group.add_argument("--analyze-workers", type=int, default=1, help="ANALYZE_MAX_WORKERS da API")
+    group.add_argument("--analysis-cache", action="store_true", help="Manter o cache das análises ligado (as requisições repetidas usam o cache)")
+    group.add_argument("--reuse-results", action="store_true", help="Responder as análises repetidas do mesmo commit com o resultado salvo no histórico")
+    group.add_argument("--log-level", default="WARNING", help="LOG_LEVEL da API")
+    group.add_argument("--env", action="append", default=[], metavar="NOME=VALOR", help="Variável de ambiente extra para a API (pode repetir)")
+
+    group = parser.add_argument_group("resultado")
+    group.add_argument("--output", help="Arquivo JSON do resultado (padrão: benchmarks/results/<data>-<commit>.json)")
+    group.add_argument("--keep-workdir", action="store_true", help="Não apagar o diretório temporário (logs da API, repositório e PDF)")
+
+    args = parser.parse_args(argv)
+    args.scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Cenários desconhecidos: {', '.join(sorted(unknown))}")
+    args.extensions = tuple(extension.strip() for extension in args.extensions.split(",") if extension.strip())
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    info = git_info()
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+    results = run(args)
+    output = {
+        "schema": RESULT_SCHEMA,
+        "started_at": started_at,
+        "label": args.label,
+        **info,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {name: value for name, value in vars(args).items() if name not in ("output", "keep_workdir")},
+        **results,
+    }
+
+    output_path = Path(args.output) if args.output else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{info['commit']}{'-dirty' if info['dirty'] else ''}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(output, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    for scenario, result in output["scenarios"].items():
+        latency = result["latency_seconds"]
+        print(
+            f"📊 {scenario}: {result['ok']}/{result['requests']} ok, {result['throughput_rps']} req/s, "
+            f"p50 {latency['p50']}s, p95 {latency['p95']}s, p99 {latency['p99']}s, pico RSS {result['peak_rss_mb']} MB, "
+            f"upstreams/req {result['upstream_calls_per_request']}"
+            + (f", erros {result['errors']}" if result["errors"] else "")
+        )
+    print(f"💾 Resultado gravado em {output_path}")
+    return output
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Repositórios git e PDFs sintéticos, de tamanho configurável, usados nos benchmarks.
+
+O conteúdo é gerado a partir de uma semente, assim o mesmo comando gera sempre os mesmos arquivos
+e os resultados de commits diferentes podem ser comparados.
+"""
+from pathlib import Path
+from typing import Sequence
+import subprocess
+import random
+import io
+
+EXTENSIONS = (".py", ".js", ".java")
+
+WORDS = (
+    "configuração servidor usuário arquivo processo conexão relatório pedido cliente cadastro "
+    "instalação manual etapa comando caminho parâmetro sistema banco tabela consulta permissão"
+).split()
+
+
+def _python_file(rng: random.Random, index: int, lines: int) -> str:
+    out = [f'"""Módulo sintético {index}"""', "import os", "", ""]
+    function = 0
+    while len(out) < lines:
+        out += [
+            f"def funcao_{index}_{function}(valor, limite={rng.randint(1, 100)}):",
+            f"    total = 0",
+            f"    for item in range(valor):",
+            f"        if item % {rng.randint(2, 9)} == 0:",
+            f"            total += item * {rng.randint(1, 50)}",
+            f"    caminho = os.path.join('/tmp', str(total))",
+            f"    return total if total < limite else caminho",
+            "",
+        ]
+        function += 1
+    return "\n".join(out[:lines]) + "\n"
+
+
+def _js_file(rng: random.Random, index: int, lines: int) -> str:
+    out = [f"// Módulo sintético {index}", ""]
+    function = 0
+    while len(out) < lines:
+        out += [
+            f"function funcao{index}_{function}(valor) {{",
+            f"  let total = 0;",
+            f"  for (let i = 0; i < valor; i++) {{",
+            f"    if (i % {rng.randint(2, 9)} == 0) total += i * {rng.randint(1, 50)};",
+            f"  }}",
+            f"  return eval('total + ' + valor);",
+            f"}}",
+            "",
+        ]
+        function += 1
+    return "\n".join(out[:lines]) + "\n"
+
+
+def _java_file(rng: random.Random, index: int, lines: int) -> str:
+    out = [f"public class Modulo{index} {{", ""]
+    method = 0
+    while len(out) < lines - 1:
+        out += [
+            f"    public int metodo{method}(int valor) {{",
+            f"        int total = 0;",
+            f"        for (int i = 0; i < valor; i++) {{",
+            f"            if (i % {rng.randint(2, 9)} == 0) total += i * {rng.randint(1, 50)};",
+            f"        }}",
+            f"        return total;",
+            f"    }}",
+            "",
+        ]
+        method += 1
+    return "\n".join(out[:lines - 1] + ["}"]) + "\n"
+
+
+GENERATORS = {".py": _python_file, ".js": _js_file, ".java": _java_file}
+
+
+def _git(path: Path, *args: str):
+    subprocess.run(
+        ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost", "-c", "commit.gpgsign=false", *args],
+        cwd=path, check=True, capture_output=True
+    )
+
+
+def make_repo(path: Path, files: int = 20, lines_per_file: int = 80, extensions: Sequence[str] = EXTENSIONS,
+              branch: str = "master", seed: int = 42) -> Path:
+    """
+    Cria um repositório git com 'files' arquivos de código em pastas (src/pacote_N/), com um commit na 'branch'.
+    O caminho do repositório pode ser usado como project_git_url no /analyze.
+    """
+    rng = random.Random(seed)
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    _git(path, "init", "-q", "-b", branch)
+
+    for index in range(files):
+        extension = extensions[index % len(extensions)]
+        file_path = path / "src" / f"pacote_{index // 10}" / f"modulo_{index}{extension}"
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(GENERATORS[extension](rng, index, lines_per_file), encoding="utf-8")
+    (path / ".gitignore").write_text("*.log\n", encoding="utf-8")
+
+    _git(path, "add", "-A")
+    _git(path, "commit", "-q", "-m", "Projeto sintético do benchmark")
+    return path
+
+
+def _paragraph(rng: random.Random, words: int = 60) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _image_png(rng: random.Random, size: int = 200) -> bytes:
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (size, size), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(8):
+        x, y = rng.randint(0, size - 40), rng.randint(0, size - 20)
+        draw.rectangle((x, y, x + 40, y + 20), outline="black")
+        draw.text((x + 4, y + 4), rng.choice(WORDS)[:6], fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_pdf(path: Path, pages: int = 5, paragraphs_per_page: int = 6, images_per_page: int = 1, seed: int = 42) -> Path:
+    """Cria um PDF com 'pages' páginas de texto e 'images_per_page' imagens (OCR e descrição pelo llava) em cada página"""
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_index in range(pages):
+        page = doc.new_page()
+        text = "\n\n".join(_paragraph(rng) for _ in range(paragraphs_per_page))
+        page.insert_textbox(fitz.Rect(40, 40, 555, 560), f"Página {page_index + 1}\n\n{text}", fontsize=9)
+        for image_index in range(images_per_page):
+            # Até 4 imagens por linha, abaixo do texto (as linhas seguintes se sobrepõem, sem problema para a extração)
+            top = 580 + (image_index // 4 % 2) * 125
+            left = 40 + image_index % 4 * 130
+            page.insert_image(fitz.Rect(left, top, left + 120, top + 120), stream=_image_png(rng))
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    doc.save(str(path))
+    doc.close()
+    return path
@@ -8,9 +8,35 @@ load_dotenv()
 def parse_env_list(value: str) -> list:
     return [item.strip() for item in value.split(",") if item.strip()]
 
+# Função auxiliar para transformar string em booleano
+def parse_env_bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "sim")
+
 # Url do servidor Ollama
 OLLAMA_URL = os.getenv("OLLAMA_URL", "") 
 
+# Lista de servidores Ollama (separados por vírgula), as chamadas são distribuídas entre eles
+# Se não for informada, usa somente o OLLAMA_URL
+OLLAMA_URLS = parse_env_list(os.getenv("OLLAMA_URLS", "")) or ([OLLAMA_URL] if OLLAMA_URL else [])
+OLLAMA_PS_REFRESH_SECONDS = float(os.getenv("OLLAMA_PS_REFRESH_SECONDS", 15)) # Intervalo para atualizar os modelos carregados (/api/ps) e a saúde de cada servidor
+OLLAMA_MODEL_LOAD_PENALTY = float(os.getenv("OLLAMA_MODEL_LOAD_PENALTY", 2)) # Peso (em requisições pendentes) de enviar para um servidor sem o modelo carregado
+
+# Limites das chamadas de geração do Ollama
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 10)) # Tempo máximo (segundos) para conectar no Ollama
+OLLAMA_DEADLINE_SECONDS = float(os.getenv("OLLAMA_DEADLINE_SECONDS", 900)) # Tempo máximo (segundos) de cada chamada de geração
+OLLAMA_MAX_OUTPUT_TOKENS = int(os.getenv("OLLAMA_MAX_OUTPUT_TOKENS", 8192)) # Quantidade máxima de tokens gerados por chamada
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m") # Tempo que o modelo (e o cache do prompt) fica carregado após a última chamada
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", 300)) # Tempo máximo (segundos) aguardando resposta nas demais chamadas (ex.: embeddings)
+OLLAMA_STRUCTURED_OUTPUT = parse_env_bool(os.getenv("OLLAMA_STRUCTURED_OUTPUT", "true")) # Enviar o JSON schema das issues no "format" da análise (Ollama 0.5+); false = somente "format": "json"
+
+# Cliente HTTP compartilhado (Ollama, SonarQube e webhooks)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 20)) # Conexões keep-alive mantidas por upstream
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2)) # Novas tentativas em erro de conexão ou resposta 5xx
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.5)) # Espera base (segundos) entre tentativas, dobra a cada tentativa
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", 8)) # Espera máxima (segundos) entre tentativas
+CIRCUIT_BREAKER_FAILURES = int(os.getenv("CIRCUIT_BREAKER_FAILURES", 5)) # Falhas seguidas para abrir o circuito do upstream
+CIRCUIT_BREAKER_RESET_SECONDS = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", 30)) # Tempo com o circuito aberto antes de testar novamente
+
 # LLM Models
 MODEL_CHAT = os.getenv("MODEL_CHAT", "mistral")
 MODEL_IMAGE_ANALYZE = os.getenv("MODEL_IMAGE_ANALYZE", "llava")
@@ -24,6 +50,45 @@ MODEL_CODING_ANALYZE = os.getenv("MODEL_CODING_ANALYZE", "qwen2.5-coder:32b")
 #Tokens aceito pelo modelo LLM (Padrão do Ollama é 4096)
 NUM_CTX = int(os.getenv("NUM_CTX", 32000))
 
+# Divisão de arquivos grandes em trechos que caibam no NUM_CTX
+SPLIT_CHARS_PER_TOKEN = float(os.getenv("SPLIT_CHARS_PER_TOKEN", 3.0)) # Média de caracteres por token usada na estimativa
+SPLIT_RESPONSE_TOKENS = int(os.getenv("SPLIT_RESPONSE_TOKENS", 4096)) # Tokens reservados para a resposta do modelo
+SPLIT_OVERLAP_LINES = int(os.getenv("SPLIT_OVERLAP_LINES", 20)) # Linhas repetidas entre um trecho e o próximo
+SPLIT_MAX_WORKERS = max(1, int(os.getenv("SPLIT_MAX_WORKERS", 1))) # Trechos do mesmo arquivo analisados ao mesmo tempo
+
+# Agrupamento de arquivos pequenos em uma única chamada ao LLM (cada arquivo continua com resultado e cache próprios)
+PACK_SMALL_FILES = parse_env_bool(os.getenv("PACK_SMALL_FILES", "true")) # Analisar vários arquivos pequenos no mesmo prompt
+PACK_MAX_FILE_TOKENS = int(os.getenv("PACK_MAX_FILE_TOKENS", 800)) # Arquivos até esse tamanho (tokens estimados) podem ser agrupados
+PACK_TOKEN_BUDGET = int(os.getenv("PACK_TOKEN_BUDGET", 6000)) # Tokens de código por pacote (limitado também pelo NUM_CTX)
+PACK_MAX_FILES = max(1, int(os.getenv("PACK_MAX_FILES", 10))) # Arquivos por pacote (as issues de todos precisam caber na resposta)
+
+# Estrutura do projeto enviada no prompt
+PROJECT_TREE_TOKEN_BUDGET = int(os.getenv("PROJECT_TREE_TOKEN_BUDGET", 2000)) # Tokens máximos da estrutura; acima disso as pastas distantes do arquivo são resumidas
+PROJECT_TREE_SHOW_SIZES = parse_env_bool(os.getenv("PROJECT_TREE_SHOW_SIZES", "false")) # Mostrar o tamanho de cada arquivo
+PROJECT_TREE_CACHE_SIZE = int(os.getenv("PROJECT_TREE_CACHE_SIZE", 16)) # Quantidade de commits com a estrutura mantida em memória
+
+# Quantidade máxima de arquivos analisados ao mesmo tempo no /analyze (1 = sequencial)
+# Recomendado usar o mesmo valor do OLLAMA_NUM_PARALLEL configurado no servidor Ollama
+ANALYZE_MAX_WORKERS = max(1, int(os.getenv("ANALYZE_MAX_WORKERS", 1)))
+
+# Prioridade dos arquivos quando a análise tem tempo limite (time_budget_seconds no /analyze)
+SCHEDULER_CHURN_DAYS = int(os.getenv("SCHEDULER_CHURN_DAYS", 90)) # Período do histórico de alterações (commits) considerado
+# Peso por extensão ("ext:peso"); extensões não informadas têm peso 1
+SCHEDULER_EXTENSION_WEIGHTS = {
+    extension.strip().lower(): float(weight)
+    for extension, _, weight in (item.partition(":") for item in parse_env_list(os.getenv("SCHEDULER_EXTENSION_WEIGHTS", ".html:0.5,.css:0.5,.scss:0.5,.json:0.3,.xml:0.3,.yml:0.3,.yaml:0.3,.md:0.2")))
+    if weight
+}
+
+# Executores do trabalho bloqueante chamado pelos endpoints (o event loop da API não fica parado)
+EXECUTOR_ANALYSIS_WORKERS = max(1, int(os.getenv("EXECUTOR_ANALYSIS_WORKERS", 2))) # Análises do /analyze executadas ao mesmo tempo
+EXECUTOR_PDF_WORKERS = max(1, int(os.getenv("EXECUTOR_PDF_WORKERS", 2))) # PDFs do /upload-pdf processados ao mesmo tempo (PyMuPDF, OCR e descrição das imagens)
+EXECUTOR_QUEUE_SIZE = max(0, int(os.getenv("EXECUTOR_QUEUE_SIZE", 10))) # Tarefas aguardando em cada executor; acima disso a API retorna 503
+
+# Análise em streaming (/analyze/stream)
+ANALYZE_STREAM_QUEUE_SIZE = max(1, int(os.getenv("ANALYZE_STREAM_QUEUE_SIZE", 64))) # Registros aguardando envio ao cliente; com a fila cheia a análise espera o cliente ler
+ANALYZE_STREAM_DISCONNECT_CHECK_SECONDS = float(os.getenv("ANALYZE_STREAM_DISCONNECT_CHECK_SECONDS", 1.0)) # Intervalo para verificar se o cliente desconectou (a análise é interrompida)
+
 # ChromaDB
 CHROMADB_HOST = os.getenv("CHROMADB_HOST", "") # Ip do servidor do chromadb
 CHROMADB_PORT = int(os.getenv("CHROMADB_PORT", 8000)) # porta que está sendo utilizada a aplicação do chromadb
@@ -41,14 +106,57 @@ SONAR_TOKEN = os.getenv("SONAR_TOKEN", "")
 SONAR_RULES_ID = os.getenv("SONAR_RULES_ID", "agenteia")
 SONAR_ENGINE_ID = os.getenv("SONAR_ENGINE_ID", "AgenteIAEngine")
 SONAR_NOME = os.getenv("SONAR_NOME", "Agente IA")
+SONAR_TIMEOUT = float(os.getenv("SONAR_TIMEOUT", 60)) # Tempo máximo (segundos) aguardando resposta da API do SonarQube
+SONAR_FETCH_WORKERS = max(1, int(os.getenv("SONAR_FETCH_WORKERS", 4))) # Páginas de issues buscadas ao mesmo tempo
+SONAR_ISSUES_CACHE_TTL = int(os.getenv("SONAR_ISSUES_CACHE_TTL", 300)) # Segundos que as issues do projeto ficam em cache (0 = sem cache)
+SONAR_SCANNER_TIMEOUT = float(os.getenv("SONAR_SCANNER_TIMEOUT", 1800)) # Tempo máximo (segundos) de execução do sonar-scanner
+SONAR_PUBLISH_WORKERS = max(1, int(os.getenv("SONAR_PUBLISH_WORKERS", 1))) # Quantidade de sonar-scanner executados ao mesmo tempo
+SONAR_PUBLISH_HISTORY_SIZE = max(1, int(os.getenv("SONAR_PUBLISH_HISTORY_SIZE", 100))) # Quantidade de envios finalizados mantidos em memória para consulta
+# Enviar para o SonarQube somente os arquivos com issues (sonar.inclusions) em vez do projeto inteiro (padrão).
+# Cuidado: o SonarQube considera removidos os arquivos fora do sonar.inclusions, fechando as issues nativas e apagando
+# cobertura, duplicação e tamanho deles; em uma análise sem issues nenhum arquivo é indexado. Use somente em projetos
+# que não dependem das análises nativas do SonarQube.
+SONAR_PUBLISH_ONLY_ISSUE_FILES = parse_env_bool(os.getenv("SONAR_PUBLISH_ONLY_ISSUE_FILES", "false"))
 
 # Git
 GIT_USER = os.getenv("GIT_USER", "")
 GIT_TOKEN = os.getenv("GIT_TOKEN", "")
 GIT_PROJECT_TEMP = os.getenv("GIT_PROJECT_TEMP", "project_temp")
+GIT_FETCH_DEPTH = int(os.getenv("GIT_FETCH_DEPTH", 0)) # Quantidade de commits baixados (0 = histórico completo, necessário na análise incremental)
+GIT_PARTIAL_CLONE = parse_env_bool(os.getenv("GIT_PARTIAL_CLONE", "true")) # Baixar o conteúdo dos arquivos somente quando necessário (--filter=blob:none)
+GIT_SPARSE_CHECKOUT = parse_env_bool(os.getenv("GIT_SPARSE_CHECKOUT", "true")) # Extrair somente os arquivos com ACCEPTED_EXTENSIONS
+GIT_CACHE_MAX_MB = int(os.getenv("GIT_CACHE_MAX_MB", 2048)) # Tamanho máximo dos repositórios em cache (0 = sem limite)
+
+# Cache das análises por arquivo (evita reenviar ao LLM arquivos que não mudaram)
+ANALYSIS_CACHE_ENABLED = parse_env_bool(os.getenv("ANALYSIS_CACHE_ENABLED", "true"))
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", "cache/analysis")
+ANALYSIS_CACHE_MAX_MB = float(os.getenv("ANALYSIS_CACHE_MAX_MB", 200)) # Tamanho máximo do cache em disco, os mais antigos são removidos
+
+# Estado da última análise de cada repositório/branch (usado na análise incremental)
+ANALYSIS_STATE_DIR = os.getenv("ANALYSIS_STATE_DIR", "cache/state")
+
+# Histórico das análises em SQLite (issues, estatísticas e tempo de cada arquivo por repositório/commit/modelo)
+RESULT_STORE_ENABLED = parse_env_bool(os.getenv("RESULT_STORE_ENABLED", "true"))
+RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", "cache/results.db")
+RESULT_STORE_REUSE = parse_env_bool(os.getenv("RESULT_STORE_REUSE", "true")) # Responder com o resultado salvo quando o commit já foi analisado com o mesmo modelo e versão do prompt
+RESULT_STORE_MAX_RUNS = int(os.getenv("RESULT_STORE_MAX_RUNS", 1000)) # Execuções mantidas no histórico, as mais antigas são removidas (0 = sem limite)
+
+# Jobs de análise assíncronos
+JOBS_WORKERS = max(1, int(os.getenv("JOBS_WORKERS", 1))) # Quantidade de jobs executados ao mesmo tempo
+JOBS_QUEUE_SIZE = max(1, int(os.getenv("JOBS_QUEUE_SIZE", 10))) # Quantidade máxima de jobs aguardando na fila
+JOBS_HISTORY_SIZE = max(1, int(os.getenv("JOBS_HISTORY_SIZE", 100))) # Quantidade de jobs finalizados mantidos em memória para consulta
+JOBS_CALLBACK_TIMEOUT = float(os.getenv("JOBS_CALLBACK_TIMEOUT", 10)) # Tempo máximo (segundos) para notificar a callback_url
 
 # Logs
 LOGS_DIR = os.getenv("LOGS", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower() # "json" (um objeto por linha, com job_id e file) ou "text"
+LOG_ROTATION = os.getenv("LOG_ROTATION", "size").lower() # "size" (LOG_MAX_MB) ou "time" (LOG_ROTATION_WHEN)
+LOG_MAX_MB = float(os.getenv("LOG_MAX_MB", 50)) # Tamanho máximo de cada arquivo de log antes da rotação
+LOG_ROTATION_WHEN = os.getenv("LOG_ROTATION_WHEN", "midnight") # Horário da rotação (ver TimedRotatingFileHandler: "midnight", "H", "D"...)
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 7)) # Arquivos antigos mantidos após a rotação
+LOG_PROMPTS = os.getenv("LOG_PROMPTS", "on_failure").lower() # Prompts/respostas do LLM em logs/prompts.log: "off", "sampled", "on_failure" ou "on"
+LOG_PROMPTS_SAMPLE_RATE = float(os.getenv("LOG_PROMPTS_SAMPLE_RATE", 0.05)) # Fração das chamadas registradas no modo "sampled"
 
 # Carregar diretórios ignorados
 IGNORED_FOLDERS = set(parse_env_list(os.getenv("IGNORED_FOLDERS", "")))
@@ -59,6 +167,20 @@ IGNORED_FILES = set(parse_env_list(os.getenv("IGNORED_FILES", "")))
 # Carregar extensões aceitas
 ACCEPTED_EXTENSIONS = tuple(parse_env_list(os.getenv("ACCEPTED_EXTENSIONS", "")))
 
+# Varredura do projeto
+SCAN_MAX_FILE_KB = int(os.getenv("SCAN_MAX_FILE_KB", 512)) # Arquivos maiores que isso não são analisados (0 = sem limite)
+SCAN_RESPECT_GITIGNORE = parse_env_bool(os.getenv("SCAN_RESPECT_GITIGNORE", "true")) # Ignorar o que está no .gitignore do projeto
+SCAN_SKIPPED_SAMPLE_SIZE = int(os.getenv("SCAN_SKIPPED_SAMPLE_SIZE", 20)) # Arquivos ignorados listados como exemplo no statistics.ignored_files (a lista completa fica no log)
+# Pastas de dependências de terceiros, não entram na estrutura nem na análise
+SCAN_VENDORED_FOLDERS = set(parse_env_list(os.getenv(
+    "SCAN_VENDORED_FOLDERS",
+    "node_modules,bower_components,jspm_packages,vendor,third_party,third-party,Pods,Carthage,site-packages,.venv,venv"
+)))
+
+# Issues repetidas
+ISSUE_DEDUP_SIMILARITY = float(os.getenv("ISSUE_DEDUP_SIMILARITY", 0.6)) # Semelhança mínima (0 a 1) das descrições para considerar a mesma issue
+ISSUE_MATCH_LINE_DISTANCE = int(os.getenv("ISSUE_MATCH_LINE_DISTANCE", 10)) # Distância máxima (linhas) para reconhecer uma issue de uma análise anterior
+
 # Frases para serem ignoradas nas issues dos codigos
 BAD_PATTERNS = [
     "está bem estruturado",
@@ -1,8 +1,13 @@
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import logging
-from config import IGNORED_FOLDERS, IGNORED_FILES, ACCEPTED_EXTENSIONS, BAD_PATTERNS
+from config import BAD_PATTERNS, PROJECT_TREE_CACHE_SIZE
+from core.project_scanner import ProjectScan, scan_project
+from utils.project_tree import ProjectTreeEncoder
+from utils.issue_fingerprint import deduplicate_issues, match_previous_issues
+from collections import OrderedDict
+import threading
 import time
 
 # Esse metodo irá converter o diretorio "src/components/arquivos.js" para "C:\\Diretorio\\Projeto\\src\\components\\arquivos.js"
@@ -15,77 +20,53 @@ def convert_project_to_path(project_path: str, file_path: str) -> str:
 
 # Esse metodo irá converter o diretorio "C:\\Diretorio\\Projeto\\src\\components\\arquivos.js" para "src/components/arquivos.js"
 def convert_path_to_project(project_path: str, file_path: str) -> str:
-    # Adicionando "\\" no final do caminho do projeto
-    path_project = str(Path(project_path)) + "\\"
+    # Alterando o "\\" para "/" (funciona tanto em caminhos do Windows quanto do Linux)
+    path = file_path.replace("\\", '/')
+    # Adicionando "/" no final do caminho do projeto
+    path_project = str(Path(project_path)).replace("\\", '/').rstrip('/') + '/'
     # Removendo o caminho do projeto
-    path = file_path.replace(path_project, '')
-    # Alterando o "\\" para "/"
-    path = path.replace("\\", '/')
+    if path.startswith(path_project):
+        path = path[len(path_project):]
     return path
 
 def generate_project_tree(project_path: str) -> Dict:
     """Gera estrutura do projeto em formato de dicionário"""
+    return scan_project(project_path).tree
 
-    # Usa a biblioteca pathlib para manipular o caminho de forma mais robusta, multiplataforma e elegante.
-    project_root = Path(project_path)
 
-    # Cria a estrutura inicial do dicionário
-    structure = {
-        "name": project_root.name,
-        "type": "directory",
-        "children": []
-    }
+def get_project_files(project_path: str) -> List[str]:
+    """Retorna lista todos arquivos no projeto"""
+    return scan_project(project_path).absolute_files(project_path)
 
-    # Percorre todos os arquivos e subpastas diretamente dentro do diretório (*)
-    for item in project_root.glob("*"):
-        # Chama recursivamente a função generate_project_tree() passando o caminho da subpasta
-        # Adiciona a árvore dessa subpasta na lista "children".
-        if item.is_dir():
-            # Ignorando diretorios desnecessários
-            if item.name in IGNORED_FOLDERS:
-                continue  
 
-            structure["children"].append(generate_project_tree(str(item)))
+# Varredura do projeto e estrutura já codificada, por commit (o mesmo commit sempre tem os mesmos arquivos)
+_project_scan_cache: "OrderedDict[str, Tuple[ProjectScan, ProjectTreeEncoder]]" = OrderedDict()
+_project_scan_lock = threading.Lock()
 
-        # Se for um arquivo, cria um dicionário com as informações do arquivo
-        else:
-            # Ignorando arquivos desnecessários
-            if item.name in IGNORED_FILES:
-                continue  
-
-            structure["children"].append({
-                "name": item.name,
-                "type": "file",
-                "size": item.stat().st_size
-            })
-    
-    return structure
 
+def get_project_scan(project_path: str, commit: Optional[str] = None) -> Tuple[ProjectScan, ProjectTreeEncoder]:
+    """
+    Retorna a varredura do projeto (arquivos para análise e ignorados) e a estrutura pronta para o prompt.
+    Com o commit informado, o resultado é reaproveitado entre as requisições, sem percorrer o projeto novamente.
+    """
+    if commit:
+        with _project_scan_lock:
+            cached = _project_scan_cache.get(commit)
+            if cached is not None:
+                _project_scan_cache.move_to_end(commit)
+                logging.info(f"♻️ Estrutura do projeto do commit {commit[:8]} obtida do cache")
+                return cached
 
-def get_project_files(project_path: str) -> List[str]:
-    """Retorna lista todos arquivos no projeto"""
-    # Criando uma lista vazia onde será guardado todos os diretorios dos arquivos encontrados
-    project_files = []
+    scan = scan_project(project_path)
+    cached = (scan, ProjectTreeEncoder(scan.tree))
 
-    # Percorrendo por todos os arquivos, sub-diretorio e arquivos dentro dos sub-diretorio
-    for root, dirs, files in os.walk(project_path):
-        # Filtra diretórios ignorados (remove da lista antes de entrar)
-        dirs[:] = [d for d in dirs if d not in IGNORED_FOLDERS]
+    if commit and PROJECT_TREE_CACHE_SIZE > 0:
+        with _project_scan_lock:
+            _project_scan_cache[commit] = cached
+            while len(_project_scan_cache) > PROJECT_TREE_CACHE_SIZE:
+                _project_scan_cache.popitem(last=False)
 
-        for file in files:
-            # Ignorar arquivos ocultos (que começam com ponto '.')
-            if file.startswith('.'):
-                continue
-
-             # Ignorar arquivos específicos
-            if file in IGNORED_FILES:
-                continue
-
-            # Formatos que será aceito para avaliar
-            if file.endswith(ACCEPTED_EXTENSIONS):
-                # Adicionando o arquivo encontrado na lista
-                project_files.append(os.path.join(root, file))
-    return project_files
+    return cached
 
 
 def filter_false_positives(analysis: list) -> list:
@@ -101,8 +82,13 @@ def filter_false_positives(analysis: list) -> list:
     return filtered
 
 
-def consolidate_analysis(analysis_list: List[dict], start_time: time, project_path: str) -> dict:
-    """Combina análises de múltiplos arquivos"""
+def consolidate_analysis(analysis_list: List[dict], start_time: time, project_path: str, extra_statistics: Optional[dict] = None, previous_issues: Optional[List[dict]] = None) -> dict:
+    """
+    Combina análises de múltiplos arquivos
+
+    Issues repetidas são removidas (ver deduplicate_issues) e as já reportadas em 'previous_issues'
+    (análise anterior/SonarQube) mantêm o mesmo id.
+    """
 
     # LOG
     logging.info(f"=== Todas as issues ===")
@@ -117,8 +103,9 @@ def consolidate_analysis(analysis_list: List[dict], start_time: time, project_pa
             if "file" in issue and issue["file"]:
                 issue["file"] = convert_path_to_project(project_path=project_path, file_path=issue["file"])
 
-        # LOG
-        logging.info(f"{analysis}")
+        # LOG (o json completo somente em DEBUG; a quantidade de issues de cada arquivo já foi registrada pelo finish_file)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"{analysis}")
 
         # Obtendo o conteudo do json, ele vai receber algo assim: {"analysis": [{... meu json ....}]}
         if "analysis" in analysis and isinstance(analysis["analysis"], list):
@@ -132,6 +119,12 @@ def consolidate_analysis(analysis_list: List[dict], start_time: time, project_pa
     #LOG
     logging.info(f"=======================")
 
+    # Removendo issues repetidas e mantendo o id das issues já conhecidas
+    consolidated["analysis"], duplicates_removed = deduplicate_issues(consolidated["analysis"])
+    matched_previous = match_previous_issues(consolidated["analysis"], previous_issues)
+    if duplicates_removed or matched_previous:
+        logging.info(f"Issues repetidas removidas: {duplicates_removed} | Issues já conhecidas: {matched_previous}")
+
     
     end_time = time.time()  # 🕒 Fim do timer
     duration = end_time - start_time  # ⏱️ Tempo decorrido em segundos
@@ -143,8 +136,22 @@ def consolidate_analysis(analysis_list: List[dict], start_time: time, project_pa
     consolidated["statistics"] = {
         "total_files_analyzed": len(analysis_list),
         "total_issues_found": len(consolidated["analysis"]),
+        "duplicate_issues_removed": duplicates_removed,
+        "known_issues_matched": matched_previous,
         "total_time": f"{duration:.2f} segundos"
     }
 
+    # Respostas do modelo com JSON inválido: quantas issues foram recuperadas e quantas se perderam
+    json_repair = {}
+    for analysis in analysis_list:
+        for key, value in analysis.get("json_repair", {}).items():
+            json_repair[key] = json_repair.get(key, 0) + value
+    if json_repair:
+        consolidated["statistics"]["json_repair"] = json_repair
+
+    # Estatísticas adicionais da execução (ex.: cache)
+    if extra_statistics:
+        consolidated["statistics"].update(extra_statistics)
+
     return consolidated
 
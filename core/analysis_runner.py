@@ -0,0 +1,332 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional, Union
+from config import ANALYZE_MAX_WORKERS, ANALYSIS_CACHE_ENABLED, NUM_CTX, SPLIT_CHARS_PER_TOKEN, SPLIT_RESPONSE_TOKENS
+from config import PACK_SMALL_FILES, PACK_MAX_FILE_TOKENS, PACK_TOKEN_BUDGET, PACK_MAX_FILES
+from utils import llm_integration
+from utils.analysis_cache import AnalysisCache, CacheStats, analysis_cache
+from utils.code_splitter import estimate_tokens
+from utils.json_treatment import get_issues_by_file
+from utils.logging_setup import log_context
+from utils.metrics import FILE_ANALYSIS_SECONDS
+from core.analysis import convert_path_to_project
+import contextvars
+import threading
+import logging
+import json
+import time
+import os
+
+
+# Prompt fixo, ou função que monta o prompt fixo a partir do arquivo ("src/app.py") quando ele depende da pasta do arquivo
+SystemPrompt = Union[str, Callable[[str], str]]
+
+
+class PackStats:
+    """Contadores do agrupamento de arquivos pequenos (ver plan_file_units) em uma execução do /analyze"""
+
+    def __init__(self):
+        self.packs = 0
+        self.files = 0
+        self.unattributed_issues = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def pack(self, files: int, unattributed_issues: int):
+        with self._lock:
+            self.packs += 1
+            self.files += files
+            self.unattributed_issues += unattributed_issues
+
+    def fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": PACK_SMALL_FILES,
+                "packs": self.packs,
+                "packed_files": self.files,
+                "unattributed_issues": self.unattributed_issues,
+                "fallbacks": self.fallbacks
+            }
+
+
+def analysis_cache_key(file_path: str, file_path_project: str, issues_list: dict) -> str:
+    # A chave considera o conteúdo do arquivo e as issues do SonarQube enviadas junto no prompt
+    with open(file_path, 'rb') as f:
+        file_content = f.read()
+    file_issues = get_issues_by_file(analysis=issues_list, file_path=file_path_project)
+    return AnalysisCache.build_key(file_content, llm_integration.PROMPT_VERSION, file_issues)
+
+
+def save_to_cache(cache_key: str, analysis: dict, project_path: str):
+    # Falhas e respostas cortadas pelo tempo limite não vão para o cache, o arquivo será analisado novamente na próxima execução
+    if "error" in analysis or analysis.get("incomplete"):
+        return
+    # Salvando o caminho relativo ao projeto, o mesmo arquivo pode estar em outro diretório na próxima execução
+    for issue in analysis["analysis"]:
+        if issue.get("file"):
+            issue["file"] = convert_path_to_project(project_path=project_path, file_path=issue["file"])
+    analysis_cache.set(cache_key, analysis["analysis"])
+
+
+def analyze_with_cache(prompt: SystemPrompt, file_path: str, project_path: str, issues_list: dict, cache_stats: Optional[CacheStats] = None, deadline: Optional[float] = None) -> dict:
+    """
+    Retorna a análise do arquivo a partir do cache, ou analisa com o Ollama e salva no cache.
+    """
+    file_path_project = convert_path_to_project(project_path=project_path, file_path=file_path)
+    if callable(prompt):
+        prompt = prompt(file_path_project)
+
+    if not ANALYSIS_CACHE_ENABLED:
+        return llm_integration.analyze_with_ollama(prompt=prompt, file_path=file_path, project_path=project_path, analysis=issues_list, deadline=deadline)
+
+    cache_key = analysis_cache_key(file_path, file_path_project, issues_list)
+
+    cached_issues = analysis_cache.get(cache_key)
+    if cached_issues is not None:
+        if cache_stats:
+            cache_stats.hit()
+        logging.info(f"♻️ Análise do arquivo '{file_path_project}' obtida do cache")
+        return {"analysis": cached_issues}
+
+    if cache_stats:
+        cache_stats.miss()
+
+    analysis = llm_integration.analyze_with_ollama(prompt=prompt, file_path=file_path, project_path=project_path, analysis=issues_list, deadline=deadline)
+    save_to_cache(cache_key, analysis, project_path)
+    return analysis
+
+
+def finish_file(file_path_project: str, analysis: dict, duration: float, file_index: int, total_files: int, on_file_done: Optional[Callable[[str, dict, float], None]] = None) -> dict:
+    """Registra a conclusão da análise de um arquivo (logs, métrica do tempo e progresso)"""
+    #Adicionando LOG (o json completo somente em DEBUG, evitando serializar todas as issues a cada arquivo)
+    logging.info(f"{len(analysis.get('analysis', []))} issues encontradas no arquivo '{file_path_project}'")
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(json.dumps(analysis, ensure_ascii=False))
+
+    FILE_ANALYSIS_SECONDS.observe(duration)
+
+    # Adicionando LOG do tempo da analise
+    logging.info(f"✅ Análise do arquivo '{file_path_project}' concluída em {duration:.2f} segundos ({file_index}/{total_files})")
+
+    # Notificando quem acompanha o progresso da análise
+    if on_file_done:
+        on_file_done(file_path_project, analysis, duration)
+
+    return analysis
+
+
+def should_stop(start_time: float, deadline: Optional[float], cancel_event: Optional[threading.Event]) -> bool:
+    """Tempo limite atingido ou análise cancelada: os arquivos que ainda não começaram não são analisados"""
+    return (deadline is not None and start_time >= deadline) or (cancel_event is not None and cancel_event.is_set())
+
+
+def analyze_file(prompt: SystemPrompt, file_path: str, project_path: str, issues_list: dict, file_index: int, total_files: int, on_file_done: Optional[Callable[[str, dict, float], None]] = None, cache_stats: Optional[CacheStats] = None, deadline: Optional[float] = None, skipped_files: Optional[List[str]] = None, cancel_event: Optional[threading.Event] = None) -> Optional[dict]:
+    """
+    Analisa um único arquivo com o LLM, registrando o tempo gasto.
+    Retorna None caso a análise do arquivo falhe, sem interromper os demais arquivos.
+
+    Com 'deadline' (horário limite, time.time()), arquivos que não começaram ou não terminaram
+    até esse horário são adicionados em 'skipped_files' e também retornam None.
+    O mesmo vale para arquivos que não começaram antes de 'cancel_event' ser sinalizado.
+    """
+    # Inicio Timer
+    start_time_current_file = time.time()
+
+    file_path_project = convert_path_to_project(project_path=project_path, file_path=file_path)
+    if should_stop(start_time_current_file, deadline, cancel_event):
+        if skipped_files is not None:
+            skipped_files.append(file_path_project)
+        return None
+
+    # Todos os logs da análise do arquivo identificam o arquivo (ver utils/logging_setup.py)
+    with log_context(file=file_path_project):
+        try:
+            logging.info(f"=== Iniciando Validação do arquivo {file_path} ===\n=== Arquivos {file_index}/{total_files} ===")
+
+            # Analisar com Ollama (ou obter do cache caso o arquivo não tenha mudado)
+            analysis = analyze_with_cache(prompt=prompt, file_path=file_path, project_path=project_path, issues_list=issues_list, cache_stats=cache_stats, deadline=deadline)
+
+            # Análise interrompida pelo tempo limite: o arquivo conta como não analisado
+            if deadline is not None and "error" in analysis and time.time() >= deadline:
+                logging.warning(f"⏱️ Tempo limite atingido durante a análise do arquivo '{file_path_project}'")
+                if skipped_files is not None:
+                    skipped_files.append(file_path_project)
+                return None
+
+            # Obtendo o tempo atual para calcular o tempo levado para processar o arquivo
+            duration = time.time() - start_time_current_file  # Tempo decorrido em segundos
+            return finish_file(file_path_project, analysis, duration, file_index, total_files, on_file_done)
+
+        except Exception as e:
+            logging.error(f"Erro ao analisar {file_path}: {str(e)}")
+            return None
+
+
+def plan_file_units(prompt: SystemPrompt, project_files: List[str], project_path: str) -> List[List[int]]:
+    """
+    Divide os arquivos em unidades de análise (índices de 'project_files'), na ordem do primeiro arquivo de cada unidade.
+
+    Arquivos pequenos (até PACK_MAX_FILE_TOKENS) com o mesmo prompt fixo são agrupados em pacotes de até
+    PACK_MAX_FILES arquivos e PACK_TOKEN_BUDGET tokens de código, analisados em uma única chamada ao LLM.
+    Os demais arquivos ficam sozinhos na unidade.
+    """
+    if not PACK_SMALL_FILES or PACK_MAX_FILES < 2:
+        return [[index] for index in range(len(project_files))]
+
+    units: List[List[int]] = []
+    # Pacote ainda aberto de cada prompt fixo: {"unit": índices, "tokens": tokens de código, "budget": limite de tokens}
+    open_packs = {}
+
+    for index, file_path in enumerate(project_files):
+        try:
+            # Estimativa pelo tamanho em disco, sem ler o arquivo
+            tokens = os.path.getsize(file_path) / SPLIT_CHARS_PER_TOKEN
+        except OSError:
+            tokens = None
+        if tokens is None or tokens > PACK_MAX_FILE_TOKENS:
+            units.append([index])
+            continue
+
+        system_prompt = prompt(convert_path_to_project(project_path=project_path, file_path=file_path)) if callable(prompt) else prompt
+        pack = open_packs.get(system_prompt)
+        if pack is None or len(pack["unit"]) >= PACK_MAX_FILES or pack["tokens"] + tokens > pack["budget"]:
+            budget = pack["budget"] if pack else min(PACK_TOKEN_BUDGET, NUM_CTX - estimate_tokens(system_prompt) - SPLIT_RESPONSE_TOKENS)
+            pack = {"unit": [], "tokens": 0.0, "budget": budget}
+            open_packs[system_prompt] = pack
+            units.append(pack["unit"])
+        pack["unit"].append(index)
+        pack["tokens"] += tokens
+
+    return units
+
+
+def analyze_pack(prompt: SystemPrompt, file_paths: List[str], project_path: str, issues_list: dict, file_indexes: List[int], total_files: int, on_file_done: Optional[Callable[[str, dict, float], None]] = None, cache_stats: Optional[CacheStats] = None, deadline: Optional[float] = None, skipped_files: Optional[List[str]] = None, pack_stats: Optional[PackStats] = None, cancel_event: Optional[threading.Event] = None) -> List[Optional[dict]]:
+    """
+    Analisa um pacote de arquivos pequenos (ver plan_file_units) em uma única chamada ao LLM.
+
+    Cada arquivo tem o mesmo resultado da análise individual (analyze_file): issues do próprio arquivo,
+    cache por arquivo, 'on_file_done' a cada arquivo e None para os que falharam ou ficaram fora do tempo limite.
+    Arquivos já no cache não são enviados; se a chamada agrupada falhar, os arquivos são analisados um a um.
+    """
+    start_time = time.time()
+    files_project = [convert_path_to_project(project_path=project_path, file_path=file_path) for file_path in file_paths]
+    results: List[Optional[dict]] = [None] * len(file_paths)
+
+    if should_stop(start_time, deadline, cancel_event):
+        if skipped_files is not None:
+            skipped_files.extend(files_project)
+        return results
+
+    # Arquivos que precisam do LLM: (posição no pacote, chave do cache)
+    pending = []
+    for position, (file_path, file_path_project) in enumerate(zip(file_paths, files_project)):
+        file_start = time.time()
+        cache_key = None
+        if ANALYSIS_CACHE_ENABLED:
+            with log_context(file=file_path_project):
+                try:
+                    cache_key = analysis_cache_key(file_path, file_path_project, issues_list)
+                except OSError as e:
+                    logging.error(f"Erro ao analisar {file_path}: {str(e)}")
+                    continue
+                cached_issues = analysis_cache.get(cache_key)
+                if cached_issues is not None:
+                    if cache_stats:
+                        cache_stats.hit()
+                    logging.info(f"♻️ Análise do arquivo '{file_path_project}' obtida do cache")
+                    results[position] = finish_file(file_path_project, {"analysis": cached_issues}, time.time() - file_start, file_indexes[position], total_files, on_file_done)
+                    continue
+            if cache_stats:
+                cache_stats.miss()
+        pending.append((position, cache_key))
+
+    if len(pending) > 1:
+        system_prompt = prompt(files_project[0]) if callable(prompt) else prompt
+        pending_files = [files_project[position] for position, _ in pending]
+        llm_start = time.time()
+        with log_context(file=f"{pending_files[0]} (+{len(pending_files) - 1} arquivos)"):
+            logging.info(f"📦 Analisando {len(pending_files)} arquivos pequenos em uma única chamada: {pending_files}")
+            pack_result = llm_integration.analyze_pack_with_ollama(system_prompt, [file_paths[position] for position, _ in pending], project_path, issues_list, deadline)
+
+        if "error" not in pack_result:
+            if pack_stats:
+                pack_stats.pack(len(pending), pack_result["unattributed"])
+            # O tempo da chamada é dividido entre os arquivos do pacote
+            duration = (time.time() - llm_start) / len(pending)
+            for position, cache_key in pending:
+                analysis = pack_result["files"][files_project[position]]
+                with log_context(file=files_project[position]):
+                    if cache_key:
+                        save_to_cache(cache_key, analysis, project_path)
+                    results[position] = finish_file(files_project[position], analysis, duration, file_indexes[position], total_files, on_file_done)
+            return results
+
+        # Análise interrompida pelo tempo limite: os arquivos contam como não analisados
+        if deadline is not None and time.time() >= deadline:
+            logging.warning(f"⏱️ Tempo limite atingido durante a análise agrupada de {len(pending)} arquivos")
+            if skipped_files is not None:
+                skipped_files.extend(files_project[position] for position, _ in pending)
+            return results
+
+        logging.warning(f"Análise agrupada de {len(pending)} arquivos falhou, analisando os arquivos um a um")
+        if pack_stats:
+            pack_stats.fallback()
+
+    # Um único arquivo fora do cache (ou a chamada agrupada falhou): análise individual.
+    # O cache deste arquivo já foi contado acima, por isso o analyze_file não recebe o cache_stats.
+    for position, _ in pending:
+        results[position] = analyze_file(prompt, file_paths[position], project_path, issues_list, file_indexes[position], total_files, on_file_done, None, deadline, skipped_files, cancel_event)
+    return results
+
+
+def analyze_project_files(prompt: SystemPrompt, project_files: List[str], project_path: str, issues_list: dict, max_workers: int = ANALYZE_MAX_WORKERS, on_file_done: Optional[Callable[[str, dict, float], None]] = None, cache_stats: Optional[CacheStats] = None, deadline: Optional[float] = None, skipped_files: Optional[List[str]] = None, pack_stats: Optional[PackStats] = None, cancel_event: Optional[threading.Event] = None) -> List[dict]:
+    """
+    Analisa todos os arquivos do projeto, até 'max_workers' análises ao mesmo tempo.
+    Arquivos pequenos são analisados em pacotes (ver plan_file_units), uma chamada ao LLM por pacote.
+
+    O resultado mantém a mesma ordem de 'project_files', independente da ordem em que
+    as análises terminam, e arquivos que falharam não entram na lista.
+    'on_file_done' é chamado a cada arquivo concluído com (arquivo, análise, duração em segundos).
+    'cache_stats' acumula os acertos/erros do cache de análises e 'pack_stats' os pacotes analisados.
+    'deadline' limita o horário da análise; os arquivos não analisados a tempo vão para 'skipped_files',
+    assim como os que não começaram antes de 'cancel_event' ser sinalizado.
+    """
+    total_files = len(project_files)
+
+    # Lista com posição fixa para cada arquivo, garantindo resultado deterministico
+    results: List[Optional[dict]] = [None] * total_files
+
+    units = plan_file_units(prompt, project_files, project_path)
+    packed = sum(len(unit) for unit in units if len(unit) > 1)
+    if packed:
+        logging.info(f"📦 {packed} arquivos pequenos agrupados em {sum(1 for unit in units if len(unit) > 1)} pacotes ({len(units)} análises para {total_files} arquivos)")
+
+    def analyze_unit(unit: List[int]) -> List[Optional[dict]]:
+        if len(unit) == 1:
+            index = unit[0]
+            return [analyze_file(prompt, project_files[index], project_path, issues_list, index + 1, total_files, on_file_done, cache_stats, deadline, skipped_files, cancel_event)]
+        return analyze_pack(prompt, [project_files[index] for index in unit], project_path, issues_list, [index + 1 for index in unit], total_files, on_file_done, cache_stats, deadline, skipped_files, pack_stats, cancel_event)
+
+    max_workers = max(1, min(max_workers, len(units) or 1))
+
+    # Sem paralelismo, processa na mesma thread (comportamento original)
+    if max_workers == 1:
+        for unit in units:
+            for index, analysis in zip(unit, analyze_unit(unit)):
+                results[index] = analysis
+    else:
+        logging.info(f"Analisando {total_files} arquivos com até {max_workers} análises simultâneas")
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analyze") as executor:
+            futures = {
+                # Cada unidade executa com uma cópia do contexto (job_id dos logs) de quem iniciou a análise
+                executor.submit(contextvars.copy_context().run, analyze_unit, unit): unit
+                for unit in units
+            }
+            for future in as_completed(futures):
+                for index, analysis in zip(futures[future], future.result()):
+                    results[index] = analysis
+
+    return [analysis for analysis in results if analysis is not None]
@@ -0,0 +1,158 @@
+from config import ANALYZE_STREAM_QUEUE_SIZE, ANALYZE_STREAM_DISCONNECT_CHECK_SECONDS
+from core.pipeline import AnalysisCancelledError
+from utils.fast_json import dumps
+from utils.issue_fingerprint import issue_fingerprint
+from concurrent.futures import Future, TimeoutError
+from fastapi import Request
+from typing import AsyncIterator, Callable, Iterator, Optional
+import threading
+import asyncio
+import logging
+
+# Formatos do /analyze/stream
+NDJSON = "ndjson"
+SSE = "sse"
+
+MEDIA_TYPES = {NDJSON: "application/x-ndjson", SSE: "text/event-stream"}
+
+
+def encode_record(record: dict, stream_format: str) -> bytes:
+    """Uma linha JSON (NDJSON) ou um evento "event: <type>" com o JSON em "data" (server-sent events)"""
+    data = dumps(record)
+    if stream_format == SSE:
+        return b"event: " + record["type"].encode("utf-8") + b"\ndata: " + data + b"\n\n"
+    return data + b"\n"
+
+
+def stream_issue(issue: dict, file_path: str) -> dict:
+    """Issue já tratada pelo sanitize_analysis, com o caminho no projeto e o fingerprint (sem validar novamente)"""
+    issue_file = str(issue.get("file") or "").replace("\\", "/")
+    if not issue_file or issue_file.endswith("/" + file_path):
+        issue_file = file_path
+    issue = {**issue, "file": issue_file}
+    issue.setdefault("fingerprint", issue_fingerprint(issue))
+    return issue
+
+
+def file_record(file_path: str, analysis: dict, duration: Optional[float]) -> dict:
+    record = {
+        "type": "file",
+        "file": file_path,
+        "duration": round(duration, 3) if duration is not None else None,
+        "issues": [stream_issue(issue, file_path) for issue in analysis.get("analysis", []) if isinstance(issue, dict)]
+    }
+    if "error" in analysis:
+        record["error"] = analysis["error"]
+    return record
+
+
+def stored_file_records(response: dict) -> Iterator[dict]:
+    """Registros por arquivo de um resultado reaproveitado do histórico (nenhum arquivo passa pelo on_file_done)"""
+    issues_by_file = {}
+    for issue in response.get("analysis", []):
+        issues_by_file.setdefault(issue.get("file") or "", []).append(issue)
+    for file_path, issues in issues_by_file.items():
+        yield file_record(file_path, {"analysis": issues}, None)
+
+
+def final_record(response: dict) -> dict:
+    return {
+        "type": "statistics",
+        "partial": bool(response.get("partial")),
+        "total_issues": len(response.get("analysis", [])),
+        "statistics": response.get("statistics")
+    }
+
+
+class AnalysisStream:
+    """
+    Resultado do /analyze em streaming (NDJSON ou server-sent events).
+
+    A análise é executada por run() no analysis_executor e envia o progresso (on_files_listed/on_file_done)
+    para o event loop já serializado, na ordem: "files" (quantidade de arquivos), um "file" a cada arquivo
+    concluído com as issues do arquivo e, no final, "statistics" (estatísticas da análise) ou "error".
+
+    A fila tem até ANALYZE_STREAM_QUEUE_SIZE registros: com a fila cheia a thread da análise espera o cliente ler.
+    Quando o cliente desconecta, 'cancelled' é sinalizado e a análise para de iniciar novos arquivos.
+
+    As issues de cada arquivo são enviadas como foram geradas; a remoção de repetidas e os ids das
+    issues já conhecidas valem para o resultado final, salvo no histórico (statistics.result_store.run_id).
+    """
+
+    def __init__(self, stream_format: str = NDJSON, queue_size: int = ANALYZE_STREAM_QUEUE_SIZE):
+        self.format = stream_format
+        self.media_type = MEDIA_TYPES[stream_format]
+        self.cancelled = threading.Event()
+        self._loop = asyncio.get_running_loop()
+        self._queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=queue_size)
+
+    def _put(self, chunk: Optional[bytes]):
+        """Adiciona na fila a partir da thread da análise, esperando enquanto a fila estiver cheia"""
+        if self.cancelled.is_set():
+            return
+        try:
+            put = asyncio.run_coroutine_threadsafe(self._queue.put(chunk), self._loop)
+        except RuntimeError:
+            # Event loop encerrado (API desligando), não há mais para quem enviar
+            self.cancelled.set()
+            return
+        while True:
+            try:
+                put.result(timeout=ANALYZE_STREAM_DISCONNECT_CHECK_SECONDS)
+                return
+            except TimeoutError:
+                # Cliente desconectado com a fila cheia: ninguém vai ler o registro
+                if self.cancelled.is_set():
+                    put.cancel()
+                    return
+
+    def send(self, record: dict):
+        # A serialização acontece na thread que gerou o registro, fora do event loop
+        self._put(encode_record(record, self.format))
+
+    def on_files_listed(self, total: int):
+        self.send({"type": "files", "total_files": total})
+
+    def on_file_done(self, file_path: str, analysis: dict, duration: float):
+        self.send(file_record(file_path, analysis, duration))
+
+    def run(self, analyze: Callable[..., dict], request):
+        """
+        Executa a análise (run_analysis) na thread do executor, envia o registro final e encerra o streaming.
+        Não retorna o resultado: depois do registro final as issues não ficam em memória.
+        """
+        try:
+            response = analyze(request, self.on_files_listed, self.on_file_done, self.cancelled)
+            if (response.get("statistics") or {}).get("result_store", {}).get("reused"):
+                for record in stored_file_records(response):
+                    self.send(record)
+            self.send(final_record(response))
+        except AnalysisCancelledError as e:
+            logging.info(f"Streaming encerrado: {e}")
+        except Exception as e:
+            logging.error(f"Erro durante análise: {str(e)}", exc_info=e)
+            self.send({"type": "error", "detail": str(e)})
+        finally:
+            self._put(None)
+
+    async def chunks(self, request: Request, future: Future) -> AsyncIterator[bytes]:
+        """Registros para o StreamingResponse; 'future' é a execução de run() no analysis_executor"""
+        finished = False
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(self._queue.get(), timeout=ANALYZE_STREAM_DISCONNECT_CHECK_SECONDS)
+                except asyncio.TimeoutError:
+                    # Análise cancelada antes de começar (API desligando) ou cliente desconectado
+                    if future.cancelled() or await request.is_disconnected():
+                        return
+                    continue
+                if chunk is None:
+                    finished = True
+                    return
+                yield chunk
+        finally:
+            # Cliente desconectado (ou streaming cancelado pelo servidor): a análise não tem mais para quem enviar
+            if not finished:
+                logging.warning("Cliente do /analyze/stream desconectou, interrompendo a análise")
+                self.cancelled.set()
@@ -0,0 +1,85 @@
+from config import EXECUTOR_ANALYSIS_WORKERS, EXECUTOR_PDF_WORKERS, EXECUTOR_QUEUE_SIZE
+from utils.metrics import Gauge
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List
+import contextvars
+import threading
+import asyncio
+import logging
+
+
+class ExecutorBusyError(Exception):
+    """Todos os workers do executor ocupados e a fila cheia, a requisição deve ser enviada novamente mais tarde"""
+
+
+class BoundedExecutor:
+    """
+    Pool de threads com fila limitada para o trabalho bloqueante chamado pelos endpoints
+    (bibliotecas síncronas, CPU, GitPython...), mantendo o event loop da API livre.
+
+    No máximo 'workers' tarefas são executadas ao mesmo tempo e 'queue_size' aguardam;
+    acima disso submit() falha imediatamente com ExecutorBusyError.
+    """
+
+    def __init__(self, name: str, workers: int, queue_size: int = EXECUTOR_QUEUE_SIZE):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.pending = 0 # Tarefas executando ou aguardando
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorBusyError(f"Executor '{self.name}' ocupado ({self.workers} em execução e {self.queue_size} aguardando), tente novamente mais tarde")
+
+        with self._lock:
+            self.pending += 1
+
+        # Copia o contexto (contextvars) de quem chamou para a thread do executor
+        context = contextvars.copy_context()
+        try:
+            future = self._executor.submit(context.run, fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Executa 'fn' no executor e aguarda o resultado sem bloquear o event loop"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"name": self.name, "workers": self.workers, "queue_size": self.queue_size, "pending": self.pending}
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Análises do /analyze (git, varredura do projeto, chamadas ao Ollama e ao SonarQube)
+analysis_executor = BoundedExecutor("analysis", EXECUTOR_ANALYSIS_WORKERS)
+# Processamento dos PDFs do /upload-pdf (PyMuPDF, OCR com pytesseract e descrição das imagens)
+pdf_executor = BoundedExecutor("pdf", EXECUTOR_PDF_WORKERS)
+
+EXECUTORS: List[BoundedExecutor] = [analysis_executor, pdf_executor]
+
+EXECUTOR_PENDING = Gauge(
+    "executor_pending",
+    "Tarefas executando ou aguardando em cada executor",
+    lambda: {(executor.name,): executor.pending for executor in EXECUTORS},
+    ["executor"]
+)
+
+
+def shutdown_executors():
+    for executor in EXECUTORS:
+        executor.shutdown()
+    logging.info("Executores finalizados")
@@ -0,0 +1,177 @@
+from config import JOBS_WORKERS, JOBS_QUEUE_SIZE, JOBS_HISTORY_SIZE
+from utils.http_client import get_client
+from utils.logging_setup import log_context
+from models.schemas import AnalyzeRequest
+from collections import OrderedDict
+from typing import Callable, Optional
+import threading
+import logging
+import queue
+import uuid
+import time
+
+# Status possíveis de um job
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """Fila de jobs cheia, a requisição deve ser enviada novamente mais tarde"""
+
+
+class AnalysisJob:
+    """Estado de uma análise executada em segundo plano"""
+
+    def __init__(self, request: AnalyzeRequest):
+        self.id = str(uuid.uuid4())
+        self.request = request
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.project_total_files: Optional[int] = None
+        self.file_durations = []
+        self.partial_analysis = []
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        # Os arquivos terminam em threads diferentes, então o progresso precisa de lock
+        self._lock = threading.Lock()
+
+    def set_total_files(self, total: int):
+        with self._lock:
+            self.project_total_files = total
+
+    def add_file_result(self, file_path: str, analysis: dict, duration: float):
+        with self._lock:
+            self.file_durations.append({"file": file_path, "duration": round(duration, 2)})
+            self.partial_analysis.extend(analysis.get("analysis", []))
+
+    def status_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "sonar_project_key": self.request.sonar_project_key,
+                "project_git_url": self.request.project_git_url,
+                "project_git_branch": self.request.project_git_branch,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "progress": {
+                    "files_done": len(self.file_durations),
+                    "project_total_files": self.project_total_files,
+                    "file_durations": list(self.file_durations)
+                },
+                "error": self.error
+            }
+
+    def partial_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "files_done": len(self.file_durations),
+                "project_total_files": self.project_total_files,
+                "analysis": list(self.partial_analysis)
+            }
+
+
+class JobManager:
+    """
+    Executa análises em segundo plano com uma fila limitada.
+
+    Até 'workers' jobs são executados ao mesmo tempo; quando a fila está cheia, novos jobs
+    são recusados, evitando sobrecarregar o servidor Ollama compartilhado.
+    """
+
+    def __init__(self, run_fn: Callable[..., dict], workers: int = JOBS_WORKERS, queue_size: int = JOBS_QUEUE_SIZE, history_size: int = JOBS_HISTORY_SIZE):
+        self.run_fn = run_fn
+        self.workers = workers
+        self.history_size = history_size
+        self._queue: "queue.Queue[AnalysisJob]" = queue.Queue(maxsize=queue_size)
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Inicia as threads que consomem a fila de jobs"""
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"analysis-job-{index + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"✅ {self.workers} worker(s) de jobs de análise iniciados")
+
+    def submit(self, request: AnalyzeRequest) -> AnalysisJob:
+        """Adiciona uma análise na fila e retorna o job criado"""
+        job = AnalysisJob(request)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune_history()
+
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise JobQueueFullError(f"Fila de análises cheia ({self._queue.maxsize} jobs aguardando)")
+
+        logging.info(f"Job {job.id} adicionado na fila ({request.project_git_url} - {request.project_git_branch})")
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_size(self) -> int:
+        return self._queue.qsize()
+
+    def _prune_history(self):
+        # Remove os jobs finalizados mais antigos, mantendo no máximo 'history_size'
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in (JOB_COMPLETED, JOB_FAILED)]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                with log_context(job_id=job.id):
+                    self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, job: AnalysisJob):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        logging.info(f"=== Iniciando job {job.id} ===")
+
+        try:
+            job.result = self.run_fn(job.request, on_files_listed=job.set_total_files, on_file_done=job.add_file_result)
+            job.status = JOB_COMPLETED
+            logging.info(f"✅ Job {job.id} concluído")
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+            logging.error(f"❌ Job {job.id} falhou: {e}", exc_info=True)
+        finally:
+            job.finished_at = time.time()
+
+        if job.request.callback_url:
+            notify_callback(job)
+
+
+def notify_callback(job: AnalysisJob):
+    """Envia o resultado do job para a callback_url informada na requisição"""
+    payload = job.status_dict()
+    payload["result"] = job.result
+    try:
+        response = get_client("webhook").post(job.request.callback_url, json=payload)
+        response.raise_for_status()
+        logging.info(f"Callback do job {job.id} enviada para {job.request.callback_url}")
+    except Exception as e:
+        logging.error(f"❌ Erro ao enviar callback do job {job.id} para {job.request.callback_url}: {e}")
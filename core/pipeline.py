@@ -0,0 +1,395 @@
+from utils.git_integration import get_head_commit, get_changed_files
+from utils.repo_cache import repo_cache
+from utils.analysis_state import load_analysis_state, save_analysis_state
+from utils.json_treatment import convert_analysis_to_sonarqube
+from models.schemas import AnalyzeRequest
+from core.analysis import consolidate_analysis, get_project_scan, convert_path_to_project
+from core.sonar_integration import get_sonar_issues
+from core.sonar_publisher import sonar_publisher, SonarPublication, PUBLISH_FINISHED, PUBLISH_SUCCEEDED
+from core.analysis_runner import analyze_project_files, PackStats
+from core.scheduler import prioritize_files
+from utils import llm_integration
+from utils.analysis_cache import CacheStats
+from utils.result_store import result_store
+from utils.issue_fingerprint import issue_fingerprint
+from config import SONAR_TOKEN, SONAR_URL, SONAR_PUBLISH_ONLY_ISSUE_FILES, MODEL_CODING_ANALYZE, RESULT_STORE_REUSE
+from typing import Callable, List, Optional, Set, Tuple
+from pathlib import Path
+import threading
+import logging
+import os
+import json
+import time
+
+
+class AnalysisCancelledError(Exception):
+    """Análise interrompida por quem pediu (ex.: cliente do /analyze/stream desconectou); o resultado é descartado"""
+
+
+def select_incremental_files(project_path: str, project_files: List[str], head_commit: str, state: Optional[dict]) -> Tuple[List[str], List[dict], dict]:
+    """
+    Seleciona somente os arquivos adicionados/modificados desde o último commit analisado.
+
+    :param state: última análise salva do repositório/branch (load_analysis_state)
+    :return: (arquivos para analisar, issues mantidas dos arquivos não alterados, estatísticas)
+             Caso não exista uma análise anterior válida, retorna todos os arquivos (análise completa).
+    """
+    if not state or not state.get("commit"):
+        logging.info("Nenhuma análise anterior encontrada, executando análise completa")
+        return project_files, [], {"mode": "full", "reason": "sem análise anterior", "head_commit": head_commit}
+
+    base_commit = state["commit"]
+    diff = get_changed_files(project_path, base_commit, head_commit)
+    if diff is None:
+        return project_files, [], {"mode": "full", "reason": f"commit base {base_commit} não encontrado", "head_commit": head_commit}
+
+    changed = set(diff["changed"])
+    deleted = set(diff["deleted"])
+
+    # Arquivos atuais do projeto no formato "src/arquivo.py"
+    current_files = {convert_path_to_project(project_path=project_path, file_path=file_path): file_path for file_path in project_files}
+
+    files_to_analyze = [file_path for file_project, file_path in current_files.items() if file_project in changed]
+
+    # Issues de arquivos não alterados continuam valendo; de arquivos removidos (ou que não são mais analisados) são descartadas
+    carried_issues = [
+        issue for issue in state.get("analysis", [])
+        if isinstance(issue, dict) and issue.get("file") in current_files and issue.get("file") not in changed
+    ]
+
+    logging.info(
+        f"Análise incremental {base_commit[:8]}..{head_commit[:8]}: {len(files_to_analyze)} arquivos alterados, "
+        f"{len(deleted)} removidos, {len(carried_issues)} issues mantidas"
+    )
+
+    return files_to_analyze, carried_issues, {
+        "mode": "incremental",
+        "base_commit": base_commit,
+        "head_commit": head_commit,
+        "changed_files": len(files_to_analyze),
+        "deleted_files": len(deleted),
+        "carried_forward_issues": len(carried_issues)
+    }
+
+
+def run_analysis(
+    request: AnalyzeRequest,
+    on_files_listed: Optional[Callable[[int], None]] = None,
+    on_file_done: Optional[Callable[[str, dict, float], None]] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> dict:
+    """
+    Executa a análise completa de um projeto: clone, análise de cada arquivo com o LLM e envio para o SonarQube.
+
+    :param request: Dados da requisição de análise
+    :param on_files_listed: Chamado com a quantidade total de arquivos que serão analisados
+    :param on_file_done: Chamado a cada arquivo concluído com (arquivo, análise, duração em segundos)
+    :param cancel_event: Quando sinalizado, os arquivos que ainda não começaram não são analisados e a análise
+                         termina com AnalysisCancelledError (sem salvar o resultado nem enviar ao SonarQube)
+    :return: json consolidado com todas as issues e estatísticas
+    """
+    logging.info("=== INICIANDO ANALISE ===")
+
+    # Inicio Timer
+    start_time = time.time() 
+
+    # Commit já analisado com o mesmo modelo e versão do prompt: responde com o resultado salvo, sem clonar nem chamar o LLM
+    if not request.force:
+        stored = find_stored_analysis(request, start_time)
+        if stored is not None:
+            if on_files_listed:
+                on_files_listed(0)
+            return stored
+
+    # Obtendo o repositorio Git: worktree próprio desta análise, a partir do cache de repositórios
+    project_path = repo_cache.checkout(repo_url=request.project_git_url, branch=request.project_git_branch)
+
+    # O worktree é removido ao final, ou pelo envio para o SonarQube quando ele terminar
+    published = False
+    try:
+        response = analyze_checkout(request, project_path, start_time, on_files_listed, on_file_done, cancel_event)
+        published = publish_to_sonar(request, project_path, response)
+        return response
+    finally:
+        if not published:
+            repo_cache.release(project_path)
+
+
+def find_stored_analysis(request: AnalyzeRequest, start_time: float) -> Optional[dict]:
+    """
+    Resultado salvo no histórico (utils/result_store.py) para o commit atual da branch,
+    com o mesmo modelo, versão do prompt e projeto do SonarQube. None se precisar analisar.
+
+    Sem novo envio somente quando as issues da execução são as que estão no SonarQube (envio com sucesso e
+    nenhum envio mais novo do projeto) ou o envio dela ainda está na fila. Caso contrário (envio com falha,
+    substituído, de outro commit depois ou SonarQube configurado após a execução), as issues salvas são
+    enviadas novamente, sem chamar o LLM.
+    """
+    if not RESULT_STORE_REUSE:
+        return None
+    # Sem nenhuma execução do repositório não vale consultar o remoto
+    if not result_store.has_runs(request.project_git_url, MODEL_CODING_ANALYZE, llm_integration.PROMPT_VERSION, request.sonar_project_key):
+        return None
+
+    commit = repo_cache.remote_head(request.project_git_url, request.project_git_branch)
+    if not commit:
+        return None
+    run = result_store.find_run(request.project_git_url, commit, MODEL_CODING_ANALYZE, llm_integration.PROMPT_VERSION, request.sonar_project_key)
+    if run is None:
+        return None
+
+    logging.info(f"♻️ Commit {commit[:8]} já analisado (execução {run['run_id']}), respondendo com o resultado salvo")
+    statistics = run["statistics"]
+    statistics["result_store"] = {"run_id": run["run_id"], "reused": True, "analyzed_at": run["created_at"], "original_total_time": run["duration_seconds"]}
+    statistics.pop("sonar_publish", None)
+    response = {"analysis": run["analysis"], "partial": False, "statistics": statistics}
+
+    # SonarQube não configurado: não há envio (publish_to_sonar registra o aviso nas análises)
+    if SONAR_URL and SONAR_TOKEN:
+        publication = sonar_publisher.get(run["sonar_publish_id"]) if run["sonar_publish_id"] else None
+        if run["sonar_published"]:
+            statistics["sonar_publish"] = {"publish_id": run["sonar_publish_id"], "status": PUBLISH_SUCCEEDED, "reused": True}
+        elif publication is not None and publication.status not in PUBLISH_FINISHED:
+            statistics["sonar_publish"] = {"publish_id": publication.id, "status": publication.status, "reused": True}
+        elif not republish_stored_run(request, commit, response):
+            return None
+
+    statistics["total_time"] = f"{time.time() - start_time:.2f} segundos"
+    return response
+
+
+def republish_stored_run(request: AnalyzeRequest, commit: str, response: dict) -> bool:
+    """
+    Envia novamente para o SonarQube as issues de uma execução salva: baixa o commit (o sonar-scanner
+    precisa dos arquivos) e coloca o envio na fila, sem chamar o LLM.
+
+    :return: False se a branch mudou de commit desde a consulta (precisa analisar)
+    """
+    logging.info(f"Issues da execução {response['statistics']['result_store']['run_id']} não estão no SonarQube, enviando novamente")
+    project_path = repo_cache.checkout(repo_url=request.project_git_url, branch=request.project_git_branch)
+
+    published = False
+    try:
+        if get_head_commit(project_path) != commit:
+            logging.info(f"Branch '{request.project_git_branch}' mudou de commit desde a consulta, analisando novamente")
+            return False
+        published = publish_to_sonar(request, project_path, response)
+        return published
+    finally:
+        if not published:
+            repo_cache.release(project_path)
+
+
+def publish_to_sonar(request: AnalyzeRequest, project_path: str, response: dict) -> bool:
+    """
+    Grava o external-issues.json no projeto e coloca o envio para o SonarQube na fila (core/sonar_publisher.py),
+    sem esperar o sonar-scanner. O id do envio vai em statistics.sonar_publish e o status do envio é
+    registrado na execução salva no histórico (statistics.result_store.run_id).
+
+    :return: True se o envio foi para a fila (o worktree será removido quando o envio terminar)
+    """
+    # Verificar se as variaveis de ambiente do SonarQube estão configuradas, se não, nem tenta executar a parte de integração com SonarQube
+    if SONAR_URL == "":
+        print("Ignorando etapa de integração com o SonarQube. Defina a URL do SonarQube na variável de ambiente SONAR_URL")
+        logging.warning("Ignorando etapa de integração com o SonarQube. Defina a URL do SonarQube na variável de ambiente SONAR_URL")
+        return False
+    elif SONAR_TOKEN == "":
+        print("Ignorando etapa de integração com o SonarQube. Defina o Token do SonarQube na variável de ambiente SONAR_TOKEN")
+        logging.warning("Ignorando etapa de integração com o SonarQube. Defina o Token do SonarQube na variável de ambiente SONAR_TOKEN")
+        return False
+
+    # Converter o json padrão para o json que o SonarQube aceita
+    json_sonarqube = convert_analysis_to_sonarqube(response['analysis'])
+
+    # Adicionar o arquivo json no projeto
+    # Salvar o arquivo das issues no diretorio do projeto
+    json_issues_path = Path(project_path) / "external-issues.json"
+    with open(json_issues_path, 'w', encoding='utf-8') as f:
+        json.dump(json_sonarqube, f, ensure_ascii=False)
+
+    inclusions = None
+    if SONAR_PUBLISH_ONLY_ISSUE_FILES:
+        inclusions = sorted({issue["file"] for issue in response["analysis"] if issue.get("file")})
+
+    # Status do envio na execução salva: somente execuções com envio concluído são reaproveitadas sem novo envio
+    on_status = None
+    run_id = (response["statistics"].get("result_store") or {}).get("run_id")
+    if run_id:
+        def on_status(publication: SonarPublication):
+            result_store.set_publish_status(run_id, publication.id, publication.status)
+
+    # Integração com o sonarqube para enviar as issues, executada em segundo plano
+    publication = sonar_publisher.submit(
+        project_key=request.sonar_project_key,
+        project_dir=Path(project_path),
+        total_issues=len(response["analysis"]),
+        inclusions=inclusions,
+        cleanup=lambda: repo_cache.release(project_path),
+        on_status=on_status
+    )
+    response["statistics"]["sonar_publish"] = {"publish_id": publication.id, "status": publication.status}
+    return True
+
+
+def analyze_checkout(
+    request: AnalyzeRequest,
+    project_path: str,
+    start_time: float,
+    on_files_listed: Optional[Callable[[int], None]] = None,
+    on_file_done: Optional[Callable[[str, dict, float], None]] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> dict:
+    """Analisa o projeto já baixado em 'project_path' (ver run_analysis)"""
+    # Commit que está sendo analisado (base para a próxima análise incremental)
+    head_commit = get_head_commit(project_path)
+
+    # Obtendo a estrutura e os arquivos do projeto em uma única varredura (reaproveitada entre requisições do mesmo commit)
+    project_scan, project_tree = get_project_scan(project_path, head_commit)
+
+    # Prompt fixo (instruções + estrutura do projeto), igual para todos os arquivos e reaproveitado pelo cache do Ollama
+    if project_tree.fits_budget:
+        prompt = llm_integration.build_system_prompt(project_tree.encode())
+    else:
+        # Estrutura maior que PROJECT_TREE_TOKEN_BUDGET: cada pasta recebe a estrutura resumida a partir dela
+        # (arquivos da mesma pasta continuam com o mesmo prompt fixo)
+        logging.info("Estrutura do projeto maior que PROJECT_TREE_TOKEN_BUDGET, resumindo as pastas distantes de cada arquivo")
+        prompt = lambda file_path_project: llm_integration.build_system_prompt(project_tree.encode(os.path.dirname(file_path_project)))
+
+    # Obtendo todos os arquivos do projeto
+    project_files = project_scan.absolute_files(project_path)
+
+    # Última análise salva deste repositório/branch (análise incremental e ids das issues já reportadas)
+    previous_state = load_analysis_state(request.project_git_url, request.project_git_branch, request.sonar_project_key)
+
+    # Na análise incremental, somente os arquivos alterados desde a última análise são enviados ao LLM
+    carried_issues = []
+    incremental_stats = {"mode": "full", "head_commit": head_commit}
+    if request.incremental:
+        project_files, carried_issues, incremental_stats = select_incremental_files(project_path, project_files, head_commit, previous_state)
+
+    files_name = ""
+
+    # Obtendo todos os arquivos que serão processados
+    for file_path in project_files:
+        file_path = convert_path_to_project(project_path=project_path, file_path=file_path)
+        files_name += f"{file_path}\n"
+
+    # Remover o ultimo "\n"
+    files_name = files_name.rstrip('\n')
+
+    # Adicionando o número de linhas a esquerda do texto para auxiliar a quantidade de arquivos
+    files_name_lines = files_name.split('\n')
+    files_name = '\n'.join(f'{idx + 1:>4} | {line}' for idx, line in enumerate(files_name_lines))
+
+    # Adicionando log 
+    logging.info(f"====Arquivos que serão analisados====\n{files_name}\n=====================================")
+    logging.info("=== RESPOSTA BRUTA ===")
+
+    # Ignorar a etapa de buscar issues do SonarQube caso não estejam configuradas as variáveis de ambiente do SonarQube
+    issues_list = {"analysis": []}
+    if SONAR_URL == "":
+        print("Ignorando etapa de integração com o SonarQube. Defina a URL do SonarQube na variável de ambiente SONAR_URL")
+        logging.warning("Ignorando etapa de integração com o SonarQube. Defina a URL do SonarQube na variável de ambiente SONAR_URL")
+    elif SONAR_TOKEN == "":
+        print("Ignorando etapa de integração com o SonarQube. Defina o Token do SonarQube na variável de ambiente SONAR_TOKEN")
+        logging.warning("Ignorando etapa de integração com o SonarQube. Defina o Token do SonarQube na variável de ambiente SONAR_TOKEN")
+    else:
+        # Obtendo issues que foiram enocntradas pelo modelo salvo no sonar
+        issues_list = get_sonar_issues(project_key=request.sonar_project_key)
+
+    # Com tempo limite, os arquivos mais prioritários são analisados primeiro
+    deadline = None
+    if request.time_budget_seconds:
+        deadline = start_time + request.time_budget_seconds
+        project_files = prioritize_files(project_path, project_files, issues_list)
+
+    # Informando quantos arquivos serão analisados (usado no progresso dos jobs)
+    if on_files_listed:
+        on_files_listed(len(project_files))
+
+    # Tempo e quantidade de issues de cada arquivo, salvos no histórico das análises
+    file_timings: List[dict] = []
+    # Arquivos com a análise concluída sem erro (falha do LLM, circuito aberto... não contam como analisados)
+    analyzed_files: Set[str] = set()
+
+    def record_file(file_path: str, analysis: dict, duration: float):
+        file_timings.append({"file": file_path, "seconds": round(duration, 3), "issues": len(analysis.get("analysis", []))})
+        if "error" not in analysis:
+            analyzed_files.add(file_path)
+        if on_file_done:
+            on_file_done(file_path, analysis, duration)
+
+    # Processar cada arquivo (ou pacote de arquivos pequenos) individualmente, até ANALYZE_MAX_WORKERS ao mesmo tempo
+    cache_stats = CacheStats()
+    pack_stats = PackStats()
+    skipped_files: List[str] = []
+    all_analysis = analyze_project_files(prompt=prompt, project_files=project_files, project_path=project_path, issues_list=issues_list, on_file_done=record_file, cache_stats=cache_stats, deadline=deadline, skipped_files=skipped_files, pack_stats=pack_stats, cancel_event=cancel_event)
+
+    if cancel_event is not None and cancel_event.is_set():
+        raise AnalysisCancelledError(f"análise cancelada, {len(project_files) - len(skipped_files)} de {len(project_files)} arquivos analisados")
+
+    # Arquivos não analisados dentro do tempo limite, na ordem de prioridade
+    skipped_set = set(skipped_files)
+    files_project = [convert_path_to_project(project_path=project_path, file_path=file_path) for file_path in project_files]
+    partial = bool(skipped_files)
+    if partial:
+        skipped_files = [file_path for file_path in files_project if file_path in skipped_set]
+        logging.warning(f"⏱️ Tempo limite de {request.time_budget_seconds}s atingido, {len(skipped_files)} arquivos não foram analisados")
+
+    # Arquivos cuja análise falhou: ficam para a próxima análise, como os que ficaram fora do tempo limite
+    failed_files = [file_path for file_path in files_project if file_path not in analyzed_files and file_path not in skipped_set]
+    if failed_files:
+        logging.warning(f"❌ A análise de {len(failed_files)} arquivos falhou: {failed_files}")
+
+    # Mantendo as issues da análise anterior dos arquivos não analisados
+    not_analyzed = skipped_set | set(failed_files)
+    if not_analyzed and previous_state:
+        carried_issues += [issue for issue in previous_state.get("analysis", []) if isinstance(issue, dict) and issue.get("file") in not_analyzed]
+
+    # Juntando todas as respostas do LLM que está na lista para um unico json
+    response = consolidate_analysis(
+        analysis_list=all_analysis,
+        start_time=start_time,
+        project_path=project_path,
+        extra_statistics={"cache": cache_stats.to_dict(), "packing": pack_stats.to_dict(), "incremental": incremental_stats, "ignored_files": project_scan.skipped_summary()},
+        # Issues da análise anterior e do SonarQube: as que forem reportadas novamente mantêm o id
+        previous_issues=(previous_state or {}).get("analysis", []) + issues_list.get("analysis", [])
+    )
+
+    # Com arquivos que falharam o resultado também é parcial: não é reaproveitado do histórico (find_run)
+    response["partial"] = partial or bool(failed_files)
+    if failed_files:
+        response["statistics"]["failed_files"] = failed_files
+    if request.time_budget_seconds:
+        response["statistics"]["time_budget_seconds"] = request.time_budget_seconds
+        response["statistics"]["skipped_files"] = skipped_files
+
+    # Mantendo as issues dos arquivos que não foram alterados desde a última análise
+    if carried_issues:
+        # Análises salvas antes dos fingerprints não possuem o campo
+        for issue in carried_issues:
+            issue.setdefault("fingerprint", issue_fingerprint(issue))
+        response["analysis"].extend(carried_issues)
+        response["statistics"]["total_issues_found"] = len(response["analysis"])
+
+    # Salvando o commit analisado e as issues para a próxima análise incremental
+    # (análise parcial ou com falhas não é salva: a próxima análise incremental ainda precisa dos arquivos que ficaram de fora)
+    if not partial and not failed_files:
+        save_analysis_state(request.project_git_url, request.project_git_branch, request.sonar_project_key, head_commit, response["analysis"])
+
+    # Salvando a execução no histórico (consulta, comparação entre execuções e resposta imediata de análises repetidas)
+    run_id = result_store.save_run(
+        repo_url=request.project_git_url, branch=request.project_git_branch, commit=head_commit, model=MODEL_CODING_ANALYZE,
+        prompt_version=llm_integration.PROMPT_VERSION, sonar_project_key=request.sonar_project_key, incremental=request.incremental,
+        response=response, file_timings=file_timings, duration=round(time.time() - start_time, 3)
+    )
+    if run_id:
+        response["statistics"]["result_store"] = {"run_id": run_id, "reused": False}
+
+    # Adicionando LOG (o json completo somente em DEBUG, evitando uma cópia em texto de todas as issues)
+    logging.info(f"=== RESPOSTA VALIDADA === {len(response['analysis'])} issues")
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(response)
+
+    return response
+    
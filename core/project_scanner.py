@@ -0,0 +1,221 @@
+from config import (
+    IGNORED_FOLDERS, IGNORED_FILES, ACCEPTED_EXTENSIONS,
+    SCAN_MAX_FILE_KB, SCAN_RESPECT_GITIGNORE, SCAN_VENDORED_FOLDERS, SCAN_SKIPPED_SAMPLE_SIZE
+)
+from utils.metrics import SCAN_SECONDS
+from fnmatch import fnmatchcase
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import re
+
+# Motivos para um arquivo não ser analisado
+SKIP_GITIGNORE = "gitignore"
+SKIP_VENDORED = "vendored"
+SKIP_LOCKFILE = "lockfile"
+SKIP_TOO_LARGE = "too_large"
+SKIP_BINARY = "binary"
+SKIP_MINIFIED = "minified"
+SKIP_GENERATED = "generated"
+
+# Bytes lidos do início do arquivo para as verificações de conteúdo
+SNIFF_BYTES = 8192
+
+LOCKFILE_NAMES = {
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb",
+    "poetry.lock", "Pipfile.lock", "uv.lock", "composer.lock", "Gemfile.lock", "Cargo.lock",
+    "go.sum", "mix.lock", "pubspec.lock", "packages.lock.json", "gradle.lockfile"
+}
+
+MINIFIED_NAME_PATTERN = re.compile(r"[.-](min|bundle|chunk)\.(js|mjs|cjs|css)$|\.js\.map$", re.IGNORECASE)
+GENERATED_NAME_PATTERN = re.compile(
+    r"(_pb2(_grpc)?\.pyi?|\.pb\.(go|cc|h)|\.g\.dart|\.freezed\.dart|\.generated\.\w+|\.designer\.cs|\.g\.cs|_generated\.\w+)$",
+    re.IGNORECASE
+)
+GENERATED_HEADER_PATTERN = re.compile(rb"@generated|do not edit|auto-generated|autogenerated|generated by", re.IGNORECASE)
+
+
+class GitignoreRule:
+    """Uma linha de um .gitignore (suporte mínimo: *, ?, **, negação com "!", "/" no início e no final)"""
+
+    def __init__(self, base: str, line: str):
+        self.base = base
+        self.negate = line.startswith("!")
+        if self.negate:
+            line = line[1:]
+        self.dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        # Padrão com "/" (exceto no final) é relativo à pasta do .gitignore; sem "/" vale para qualquer nível
+        self.anchored = "/" in line
+        self.pattern = line.lstrip("/")
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return False
+            rel_path = rel_path[len(self.base) + 1:]
+        if self.anchored:
+            return fnmatchcase(rel_path, self.pattern) or (self.pattern.startswith("**/") and fnmatchcase(rel_path, self.pattern[3:]))
+        return fnmatchcase(rel_path.rsplit("/", 1)[-1], self.pattern)
+
+
+def load_gitignore(dir_path: str, base: str) -> List[GitignoreRule]:
+    """Lê o .gitignore da pasta, caso exista"""
+    try:
+        with open(os.path.join(dir_path, ".gitignore"), "r", encoding="utf-8", errors="ignore") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+
+    rules = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        rules.append(GitignoreRule(base, line))
+    return rules
+
+
+def is_gitignored(rules: List[GitignoreRule], rel_path: str, is_dir: bool) -> bool:
+    # A última regra que combina com o caminho decide (regras com "!" voltam a incluir)
+    ignored = False
+    for rule in rules:
+        if rule.matches(rel_path, is_dir):
+            ignored = not rule.negate
+    return ignored
+
+
+def classify_file(name: str, path: str, size: int) -> Optional[str]:
+    """
+    Verifica (com heurísticas baratas) se um arquivo candidato deve ficar fora da análise.
+
+    :return: motivo (SKIP_*) ou None caso o arquivo deva ser analisado
+    """
+    if name in LOCKFILE_NAMES or name.endswith(".lock"):
+        return SKIP_LOCKFILE
+    if SCAN_MAX_FILE_KB > 0 and size > SCAN_MAX_FILE_KB * 1024:
+        return SKIP_TOO_LARGE
+    if MINIFIED_NAME_PATTERN.search(name):
+        return SKIP_MINIFIED
+    if GENERATED_NAME_PATTERN.search(name):
+        return SKIP_GENERATED
+
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+    except OSError:
+        return None
+
+    if b"\x00" in head:
+        return SKIP_BINARY
+    if GENERATED_HEADER_PATTERN.search(head[:1024]):
+        return SKIP_GENERATED
+
+    # Arquivo minificado: poucas linhas muito longas
+    lines = head.split(b"\n")
+    if len(head) >= 2048 and (len(head) / len(lines) > 300 or max(len(line) for line in lines) > 2000):
+        return SKIP_MINIFIED
+
+    return None
+
+
+class ProjectScan:
+    """
+    Resultado da varredura do projeto.
+
+    tree: estrutura no formato {"name", "type", "children"/"size"} (ver ProjectTreeEncoder)
+    files: arquivos que serão analisados, relativos ao projeto ("src/app.py")
+    skipped: arquivos/pastas que ficaram fora da análise, com o motivo ({"file", "reason"})
+    """
+
+    def __init__(self, tree: Dict, files: List[str], skipped: List[Dict[str, str]]):
+        self.tree = tree
+        self.files = files
+        self.skipped = skipped
+
+    def absolute_files(self, project_path: str) -> List[str]:
+        return [os.path.join(project_path, *file_path.split("/")) for file_path in self.files]
+
+    def skipped_summary(self, sample_size: int = SCAN_SKIPPED_SAMPLE_SIZE) -> dict:
+        """
+        Totais por motivo e uma amostra de até 'sample_size' arquivos ignorados.
+        Vai em todas as respostas do /analyze e no histórico, por isso não inclui a lista completa (que fica no log).
+        """
+        reasons: Dict[str, int] = {}
+        for item in self.skipped:
+            reasons[item["reason"]] = reasons.get(item["reason"], 0) + 1
+        return {"total": len(self.skipped), "reasons": reasons, "sample": self.skipped[:max(0, sample_size)]}
+
+
+def scan_project(project_path: str) -> ProjectScan:
+    """
+    Percorre o projeto uma única vez (os.scandir), gerando a estrutura do projeto e a lista de arquivos para análise.
+
+    Ficam fora da estrutura: IGNORED_FOLDERS, IGNORED_FILES, o que o .gitignore ignora e as pastas de
+    dependências (SCAN_VENDORED_FOLDERS). Ficam fora da análise (mas aparecem na estrutura): arquivos ocultos,
+    extensões fora de ACCEPTED_EXTENSIONS, lockfiles, binários, minificados, gerados e maiores que SCAN_MAX_FILE_KB.
+    """
+    skipped: List[Dict[str, str]] = []
+    files: List[str] = []
+
+    def scan_dir(dir_path: str, rel_dir: str, rules: List[GitignoreRule]) -> Dict:
+        if SCAN_RESPECT_GITIGNORE:
+            rules = rules + load_gitignore(dir_path, rel_dir)
+
+        structure = {"name": os.path.basename(dir_path), "type": "directory", "children": []}
+
+        try:
+            entries: List[Tuple[str, os.DirEntry]] = sorted((entry.name, entry) for entry in os.scandir(dir_path))
+        except OSError as e:
+            logging.warning(f"Não foi possível ler a pasta {dir_path}: {e}")
+            return structure
+
+        for name, entry in entries:
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            is_dir = entry.is_dir(follow_symlinks=False)
+
+            if is_dir:
+                if name in IGNORED_FOLDERS or name == ".git":
+                    continue
+                if name in SCAN_VENDORED_FOLDERS:
+                    skipped.append({"file": f"{rel_path}/", "reason": SKIP_VENDORED})
+                    continue
+                if rules and is_gitignored(rules, rel_path, True):
+                    skipped.append({"file": f"{rel_path}/", "reason": SKIP_GITIGNORE})
+                    continue
+                structure["children"].append(scan_dir(entry.path, rel_path, rules))
+                continue
+
+            if name in IGNORED_FILES or entry.is_symlink():
+                continue
+            if rules and is_gitignored(rules, rel_path, False):
+                skipped.append({"file": rel_path, "reason": SKIP_GITIGNORE})
+                continue
+
+            size = entry.stat(follow_symlinks=False).st_size
+            structure["children"].append({"name": name, "type": "file", "size": size})
+
+            # Arquivos ocultos e de outros formatos só aparecem na estrutura
+            if name.startswith(".") or not name.endswith(ACCEPTED_EXTENSIONS):
+                continue
+
+            reason = classify_file(name, entry.path, size)
+            if reason:
+                skipped.append({"file": rel_path, "reason": reason})
+            else:
+                files.append(rel_path)
+
+        return structure
+
+    with SCAN_SECONDS.time():
+        tree = scan_dir(str(project_path), "", [])
+    scan = ProjectScan(tree, files, skipped)
+
+    if skipped:
+        logging.info(f"Varredura do projeto: {len(files)} arquivos para análise, {len(skipped)} ignorados {scan.skipped_summary(0)['reasons']}")
+        # Lista completa somente no log (a resposta do /analyze leva apenas uma amostra)
+        logging.info("Arquivos ignorados:\n" + "\n".join(f"  ({item['reason']}) {item['file']}" for item in skipped))
+
+    return scan
@@ -0,0 +1,48 @@
+from config import SCHEDULER_CHURN_DAYS, SCHEDULER_EXTENSION_WEIGHTS
+from utils.git_integration import get_file_churn
+from utils.json_treatment import get_issues_by_file
+from core.analysis import convert_path_to_project
+from typing import Dict, List
+import logging
+import math
+import os
+
+
+def file_priority(churn: int, sonar_issues: int, size: int, extension_weight: float) -> float:
+    """
+    Valor esperado de analisar o arquivo por custo de análise.
+
+    Arquivos alterados com frequência e com issues já conhecidas têm mais chance de ter problemas;
+    arquivos grandes demoram mais (mais tokens), então o tamanho reduz a prioridade gradualmente.
+    """
+    value = extension_weight * (1 + math.log1p(churn) + math.log1p(sonar_issues))
+    cost = math.sqrt(1 + size / (16 * 1024))
+    return value / cost
+
+
+def prioritize_files(project_path: str, project_files: List[str], issues_list: dict) -> List[str]:
+    """
+    Ordena os arquivos pela prioridade de análise (ver file_priority), usada quando a análise
+    tem tempo limite: os arquivos mais importantes são analisados primeiro.
+    """
+    churn = get_file_churn(project_path, SCHEDULER_CHURN_DAYS)
+
+    priorities: Dict[str, float] = {}
+    for file_path in project_files:
+        file_path_project = convert_path_to_project(project_path=project_path, file_path=file_path)
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            size = 0
+        extension = os.path.splitext(file_path)[1].lower()
+        priorities[file_path] = file_priority(
+            churn=churn.get(file_path_project, 0),
+            sonar_issues=len(get_issues_by_file(analysis=issues_list, file_path=file_path_project)),
+            size=size,
+            extension_weight=SCHEDULER_EXTENSION_WEIGHTS.get(extension, 1.0)
+        )
+
+    # sorted é estável: arquivos com a mesma prioridade mantêm a ordem original
+    ordered = sorted(project_files, key=lambda file_path: priorities[file_path], reverse=True)
+    logging.info(f"Arquivos ordenados por prioridade (alterações nos últimos {SCHEDULER_CHURN_DAYS} dias, issues do SonarQube, tamanho e extensão)")
+    return ordered
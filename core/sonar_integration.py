@@ -1,61 +1,159 @@
-from config import SONAR_URL, SONAR_TOKEN, SONAR_ENGINE_ID, SONAR_RULES_ID
-from typing import List, Dict
+from config import SONAR_URL, SONAR_TOKEN, SONAR_ENGINE_ID, SONAR_RULES_ID, SONAR_FETCH_WORKERS, SONAR_ISSUES_CACHE_TTL, SONAR_SCANNER_TIMEOUT
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
 from pathlib import Path
-import requests
+from utils.http_client import get_client
+from utils.json_treatment import index_issues_by_file
 import subprocess
+import threading
+import math
+import time
 import platform
 import os
 import logging
 
-def get_sonar_issues(project_key: str) -> List[Dict]:
+# Limites da API /api/issues/search: no máximo 500 issues por página e 10.000 resultados no total
+SONAR_PAGE_SIZE = 500
+SONAR_MAX_RESULTS = 10000
+
+# Issues já buscadas por projeto: {project_key: {"issues": {...}, "fetched_at": ..., "analysis_date": ...}}
+_issues_cache: Dict[str, dict] = {}
+_issues_cache_lock = threading.Lock()
+
+
+def simplify_sonar_issue(issue: dict) -> dict:
+    """Converte uma issue da API do SonarQube para o formato simplificado usado no prompt"""
+    return {
+        "id": issue["key"],
+        "severity": issue["severity"],
+        "category": issue["rule"],
+        "description": issue["message"],
+        "file": issue["component"].split(":")[-1],
+        "line": (
+            str(start_line) if (start_line := issue.get("textRange", {}).get("startLine", issue.get("line")))
+            == (end_line := issue.get("textRange", {}).get("endLine", issue.get("line")))
+            else f"{start_line}-{end_line}"
+        ),
+        "recommendation": "**sem recommendation, gere uma de acordo com as informações da issues**"
+    }
+
+
+def _fetch_issues_page(project_key: str, page: int) -> dict:
+    response = get_client("sonar").get(
+        f"{SONAR_URL}/api/issues/search",
+        params={
+            "componentKeys": project_key,
+            "rules": f"external_{SONAR_ENGINE_ID}:{SONAR_RULES_ID}",
+            "ps": SONAR_PAGE_SIZE,
+            "p": page
+        },
+        auth=(SONAR_TOKEN, "")
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def get_last_analysis_date(project_key: str) -> Optional[str]:
+    """Data da última análise do projeto no SonarQube (muda a cada envio do sonar-scanner)"""
+    try:
+        response = get_client("sonar").get(
+            f"{SONAR_URL}/api/components/show",
+            params={"component": project_key},
+            auth=(SONAR_TOKEN, ""),
+            retry=False
+        )
+        response.raise_for_status()
+        return response.json().get("component", {}).get("analysisDate")
+    except Exception as e:
+        logging.warning(f"Não foi possível obter a data da última análise do projeto '{project_key}' no SonarQube: {e}")
+        return None
+
+
+def fetch_sonar_issues(project_key: str) -> List[Dict]:
+    """
+    Busca todas as páginas de issues do projeto.
+    A primeira página informa o total; as demais são buscadas ao mesmo tempo (até SONAR_FETCH_WORKERS).
     """
-    Obtém issues do SonarQube filtrados por severidade
-    
+    first_page = _fetch_issues_page(project_key, 1)
+    issues = list(first_page.get("issues", []))
+
+    total = first_page.get("paging", {}).get("total", first_page.get("total", len(issues)))
+    if total > SONAR_MAX_RESULTS:
+        logging.warning(f"Projeto '{project_key}' possui {total} issues no SonarQube, somente as primeiras {SONAR_MAX_RESULTS} serão consideradas")
+    total_pages = math.ceil(min(total, SONAR_MAX_RESULTS) / SONAR_PAGE_SIZE)
+
+    if total_pages > 1:
+        with ThreadPoolExecutor(max_workers=max(1, min(SONAR_FETCH_WORKERS, total_pages - 1)), thread_name_prefix="sonar-issues") as executor:
+            # executor.map mantém a ordem das páginas
+            for page in executor.map(lambda page: _fetch_issues_page(project_key, page), range(2, total_pages + 1)):
+                issues.extend(page.get("issues", []))
+
+    return [simplify_sonar_issue(issue) for issue in issues]
+
+
+def invalidate_sonar_issues(project_key: str):
+    """Descarta as issues em cache do projeto (ex.: depois de enviar novas issues com o sonar-scanner)"""
+    with _issues_cache_lock:
+        _issues_cache.pop(project_key, None)
+
+
+def get_sonar_issues(project_key: str) -> Dict[str, List[Dict]]:
+    """
+    Obtém as issues externas (enviadas por este agente) do projeto no SonarQube
+
+    As issues ficam em cache por SONAR_ISSUES_CACHE_TTL segundos. Depois desse tempo, se a data da
+    última análise do projeto não mudou, o cache é renovado sem buscar as issues novamente.
+
     Args:
         project_key: Chave do projeto no SonarQube
-        scope: Nível de severidade (critical, major, etc.)
-    
+
     Returns:
-        Lista de issues no formato simplificado
+        {"analysis": [issues no formato simplificado], "by_file": {arquivo: [issues do arquivo]}}
     """
+    with _issues_cache_lock:
+        cached = _issues_cache.get(project_key)
+
+    if cached and time.time() - cached["fetched_at"] < SONAR_ISSUES_CACHE_TTL:
+        logging.info(f"♻️ Issues do SonarQube do projeto '{project_key}' obtidas do cache")
+        return cached["issues"]
+
+    analysis_date = get_last_analysis_date(project_key) if SONAR_ISSUES_CACHE_TTL > 0 else None
+    if cached and analysis_date and analysis_date == cached["analysis_date"]:
+        logging.info(f"♻️ Projeto '{project_key}' sem nova análise no SonarQube desde {analysis_date}, mantendo as issues em cache")
+        with _issues_cache_lock:
+            cached["fetched_at"] = time.time()
+        return cached["issues"]
+
     try:
-        response = requests.get(
-            f"{SONAR_URL}/api/issues/search",
-            params={
-                "componentKeys": project_key,
-                "rules": f"external_{SONAR_ENGINE_ID}:{SONAR_RULES_ID}"
-            },
-            auth=(SONAR_TOKEN, "")
-        )
-        
-        response.raise_for_status()
-        
-        # Simplifica a resposta do Sonar
-        return {
-            "analysis": [
-                {
-                    "id": issue["key"],
-                    "severity": issue["severity"],
-                    "category": issue["rule"],
-                    "description": issue["message"],
-                    "file": issue["component"].split(":")[-1],
-                    "line": (
-                        str(start_line) if (start_line := issue.get("textRange", {}).get("startLine", issue.get("line")))
-                        == (end_line := issue.get("textRange", {}).get("endLine", issue.get("line")))
-                        else f"{start_line}-{end_line}"
-                    ),
-                    "recommendation": "**sem recommendation, gere uma de acordo com as informações da issues**"
-                }
-                for issue in response.json().get("issues", [])
-            ]
-        }
-    
+        start_time = time.time()
+        analysis = fetch_sonar_issues(project_key)
+        issues = {"analysis": analysis, "by_file": index_issues_by_file(analysis)}
+        logging.info(f"Issues do SonarQube do projeto '{project_key}': {len(analysis)} em {time.time() - start_time:.2f}s")
+
     except Exception as e:
         logging.error(f"Erro ao buscar issues do SonarQube: {str(e)}")
-        return []
-    
+        return {"analysis": []}
 
-def run_sonar_scanner(project_key: str, project_dir: Path):
+    if SONAR_ISSUES_CACHE_TTL > 0:
+        with _issues_cache_lock:
+            _issues_cache[project_key] = {"issues": issues, "fetched_at": time.time(), "analysis_date": analysis_date}
+
+    return issues
+
+
+# sonar.inclusions que não corresponde a nenhum arquivo (SONAR_PUBLISH_ONLY_ISSUE_FILES em uma análise sem issues):
+# as issues externas anteriores são fechadas, mas o SonarQube fica sem nenhum arquivo indexado
+NO_FILES_INCLUSION = "__nenhum_arquivo__"
+
+
+def run_sonar_scanner(project_key: str, project_dir: Path, inclusions: Optional[List[str]] = None) -> int:
+    """
+    Executa o sonar-scanner no diretório do projeto para importar o external-issues.json.
+
+    :param inclusions: arquivos enviados para análise do SonarQube; None = todo o projeto,
+                       lista vazia = nenhum arquivo (análise sem issues)
+    :return: código de saída do sonar-scanner (0 = sucesso)
+    """
     # Detecta o sistema operacional
     sistema = platform.system()
 
@@ -82,25 +180,35 @@ def run_sonar_scanner(project_key: str, project_dir: Path):
         logging.error(f"❌ SonarScanner não encontrado em {scanner_path}")
         raise FileNotFoundError(f"❌ SonarScanner não encontrado em {scanner_path}")
 
+    command = [
+        scanner_path,
+        f"-Dsonar.projectKey={project_key}",
+        f"-Dsonar.sources=.",
+        f"-Dsonar.host.url={SONAR_URL}",
+        f"-Dsonar.token={SONAR_TOKEN}",
+        f"-Dsonar.externalIssuesReportPaths=external-issues.json",
+    ]
+    if inclusions is not None:
+        command.append(f"-Dsonar.inclusions={','.join(inclusions) or NO_FILES_INCLUSION}")
+
     try:
         # Executando o sonar-scanner para enviar as issues para o SonarQube
         result = subprocess.run(
-            [
-                scanner_path,
-                f"-Dsonar.projectKey={project_key}",
-                f"-Dsonar.sources=.",
-                f"-Dsonar.host.url={SONAR_URL}",
-                f"-Dsonar.token={SONAR_TOKEN}",
-                f"-Dsonar.externalIssuesReportPaths=external-issues.json",
-            ],
+            command,
             capture_output=True,
             text=True,
             check=True,
+            timeout=SONAR_SCANNER_TIMEOUT,
             cwd=str(project_dir) # Informando em qual diretorio que será executado o comando
         )
 
         # Adicionando LOG se tudo correr bem
         logging.info(f"✅ Saída: {result.stdout}")
+
+        # Novas issues enviadas, a próxima análise precisa buscá-las novamente
+        invalidate_sonar_issues(project_key)
+        return result.returncode
     except subprocess.CalledProcessError as e:
         # Adicionando LOG de erro
-        logging.error(f"❌ Erro: {e.stderr}")
\ No newline at end of file
+        logging.error(f"❌ Erro: {e.stderr}")
+        return e.returncode
\ No newline at end of file
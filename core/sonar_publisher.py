@@ -0,0 +1,201 @@
+from config import SONAR_PUBLISH_WORKERS, SONAR_PUBLISH_HISTORY_SIZE
+from core.sonar_integration import run_sonar_scanner
+from utils.metrics import Gauge
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import threading
+import logging
+import queue
+import uuid
+import time
+
+# Status possíveis de um envio para o SonarQube
+PUBLISH_QUEUED = "queued"
+PUBLISH_RUNNING = "running"
+PUBLISH_SUCCEEDED = "succeeded"
+PUBLISH_FAILED = "failed"
+PUBLISH_SUPERSEDED = "superseded" # Substituído por um envio mais novo do mesmo projeto antes de começar
+
+PUBLISH_FINISHED = (PUBLISH_SUCCEEDED, PUBLISH_FAILED, PUBLISH_SUPERSEDED)
+
+
+class SonarPublication:
+    """Envio das issues de uma análise para o SonarQube (execução do sonar-scanner)"""
+
+    def __init__(self, project_key: str, project_dir: Path, total_issues: int, inclusions: Optional[List[str]] = None,
+                 cleanup: Optional[Callable[[], None]] = None, on_status: Optional[Callable[["SonarPublication"], None]] = None):
+        self.id = str(uuid.uuid4())
+        self.project_key = project_key
+        self.project_dir = project_dir
+        self.inclusions = inclusions
+        self.total_issues = total_issues
+        self.cleanup = cleanup
+        self.on_status = on_status
+        self.status = PUBLISH_QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.exit_code: Optional[int] = None
+        self.superseded_by: Optional[str] = None
+        self.error: Optional[str] = None
+
+    def status_dict(self) -> dict:
+        return {
+            "publish_id": self.id,
+            "status": self.status,
+            "sonar_project_key": self.project_key,
+            "total_issues": self.total_issues,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration": round(self.finished_at - self.started_at, 2) if self.started_at and self.finished_at else None,
+            "exit_code": self.exit_code,
+            "superseded_by": self.superseded_by,
+            "error": self.error
+        }
+
+    def run_cleanup(self):
+        # Ex.: remover o worktree da análise, que precisa existir até o fim do sonar-scanner
+        if not self.cleanup:
+            return
+        try:
+            self.cleanup()
+        except Exception as e:
+            logging.warning(f"Erro ao liberar os arquivos do envio {self.id} para o SonarQube: {e}")
+        self.cleanup = None
+
+    def notify_status(self):
+        # Ex.: registrar o status do envio na execução salva no histórico (utils/result_store.py)
+        if not self.on_status:
+            return
+        try:
+            self.on_status(self)
+        except Exception as e:
+            logging.warning(f"Erro ao registrar o status do envio {self.id} para o SonarQube: {e}")
+
+
+class SonarPublisher:
+    """
+    Executa o sonar-scanner em segundo plano, com fila e workers próprios, para que a resposta
+    da análise não espere o envio para o SonarQube.
+
+    Envios do mesmo projeto que ainda estão na fila são agrupados: somente o mais novo é executado
+    (ele já contém todas as issues atuais do projeto) e os anteriores ficam como "superseded".
+    """
+
+    def __init__(self, workers: int = SONAR_PUBLISH_WORKERS, history_size: int = SONAR_PUBLISH_HISTORY_SIZE):
+        self.workers = workers
+        self.history_size = history_size
+        # A fila guarda a chave do projeto; o envio a executar é o mais novo em _pending
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending: Dict[str, SonarPublication] = {}
+        self._publications: "OrderedDict[str, SonarPublication]" = OrderedDict()
+        # Um sonar-scanner por projeto de cada vez, mesmo com vários workers
+        self._project_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Inicia as threads que executam o sonar-scanner"""
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"sonar-publisher-{index + 1}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logging.info(f"✅ {self.workers} worker(s) de envio para o SonarQube iniciados")
+
+    def submit(self, project_key: str, project_dir: Path, total_issues: int, inclusions: Optional[List[str]] = None,
+               cleanup: Optional[Callable[[], None]] = None, on_status: Optional[Callable[[SonarPublication], None]] = None) -> SonarPublication:
+        """
+        Adiciona o envio na fila. 'project_dir' precisa conter o external-issues.json e continuar
+        existindo até o fim do envio; 'cleanup' é chamado quando ele não for mais necessário.
+        'on_status' é chamado a cada mudança de status (queued, running e o status final), na ordem.
+        """
+        self.start()
+        publication = SonarPublication(project_key, project_dir, total_issues, inclusions, cleanup, on_status)
+        # Antes de entrar na fila, para que o status final nunca seja registrado antes do "queued"
+        publication.notify_status()
+
+        with self._lock:
+            self._publications[publication.id] = publication
+            self._prune_history()
+            superseded = self._pending.get(project_key)
+            self._pending[project_key] = publication
+            if superseded is not None:
+                superseded.status = PUBLISH_SUPERSEDED
+                superseded.superseded_by = publication.id
+                superseded.finished_at = time.time()
+            else:
+                self._queue.put(project_key)
+
+        if superseded is not None:
+            logging.info(f"Envio {superseded.id} do projeto '{project_key}' substituído pelo envio {publication.id}")
+            superseded.notify_status()
+            superseded.run_cleanup()
+
+        logging.info(f"Envio {publication.id} para o SonarQube adicionado na fila ({project_key}, {total_issues} issues)")
+        return publication
+
+    def get(self, publish_id: str) -> Optional[SonarPublication]:
+        with self._lock:
+            return self._publications.get(publish_id)
+
+    def history(self) -> List[dict]:
+        with self._lock:
+            return [publication.status_dict() for publication in reversed(self._publications.values())]
+
+    def queue_size(self) -> int:
+        return self._queue.qsize()
+
+    def _prune_history(self):
+        # Remove os envios finalizados mais antigos, mantendo no máximo 'history_size'
+        finished = [publish_id for publish_id, publication in self._publications.items() if publication.status in PUBLISH_FINISHED]
+        for publish_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._publications[publish_id]
+
+    def _project_lock(self, project_key: str) -> threading.Lock:
+        with self._lock:
+            return self._project_locks.setdefault(project_key, threading.Lock())
+
+    def _worker(self):
+        while True:
+            project_key = self._queue.get()
+            try:
+                with self._project_lock(project_key):
+                    with self._lock:
+                        publication = self._pending.pop(project_key, None)
+                    if publication is not None:
+                        self._run(publication)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, publication: SonarPublication):
+        publication.status = PUBLISH_RUNNING
+        publication.started_at = time.time()
+        publication.notify_status()
+        logging.info(f"=== Iniciando envio {publication.id} para o SonarQube ({publication.project_key}) ===")
+
+        try:
+            publication.exit_code = run_sonar_scanner(project_key=publication.project_key, project_dir=publication.project_dir, inclusions=publication.inclusions)
+            publication.status = PUBLISH_SUCCEEDED if publication.exit_code == 0 else PUBLISH_FAILED
+        except Exception as e:
+            publication.error = str(e)
+            publication.status = PUBLISH_FAILED
+            logging.error(f"❌ Envio {publication.id} para o SonarQube falhou: {e}")
+        finally:
+            publication.finished_at = time.time()
+            publication.notify_status()
+            publication.run_cleanup()
+
+        logging.info(
+            f"Envio {publication.id} para o SonarQube finalizado: {publication.status} "
+            f"(código de saída {publication.exit_code}) em {publication.finished_at - publication.started_at:.2f}s"
+        )
+
+
+sonar_publisher = SonarPublisher()
+
+SONAR_PUBLISH_QUEUE_SIZE = Gauge("sonar_publish_queue_size", "Envios para o SonarQube aguardando na fila", sonar_publisher.queue_size)
@@ -1,21 +1,30 @@
-from utils.git_integration import clone_repo
-from utils.json_treatment import convert_analysis_to_sonarqube
 from utils.pdf_reader import extract_text_and_images
-from utils.embedding import get_embedding
-from utils.chroma_client import add_to_chroma, query_chroma, delete_from_chroma
-from utils import llm_integration
+from utils.embedding import aget_embedding
+from utils.chroma_client import connect_chroma, add_to_chroma, query_chroma, delete_from_chroma
+from utils.http_client import close_async_clients
+from utils.logging_setup import setup_logging, shutdown_logging, log_context
+from utils.metrics import Gauge, render_metrics
 from utils.check import check_environment_variables
+from utils.result_store import result_store
+from utils import ollama_client
+from utils.ollama_router import get_router
 from models.schemas import AnalyzeRequest, AnalysisResponse
-from core.analysis import get_project_files, consolidate_analysis, generate_project_tree, convert_path_to_project
-from core.sonar_integration import get_sonar_issues, run_sonar_scanner
-from config import OLLAMA_URL, CHUNK_SIZE, CHUNK_OVERLAP, MODEL_CHAT, LOGS_DIR, SONAR_TOKEN, SONAR_URL
-from pathlib import Path
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from core.pipeline import run_analysis
+from core.analysis_stream import AnalysisStream, NDJSON
+from core.jobs import JobManager, JobQueueFullError, JOB_COMPLETED, JOB_FAILED
+from core.sonar_publisher import sonar_publisher
+from core.executors import EXECUTORS, analysis_executor, pdf_executor, shutdown_executors, ExecutorBusyError
+from config import CHUNK_SIZE, CHUNK_OVERLAP, MODEL_CHAT
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from contextlib import asynccontextmanager
-import requests
+from typing import Optional
 import logging
-import json
-import time
+import uuid
+
+# Gerenciador dos jobs de análise executados em segundo plano
+job_manager = JobManager(run_fn=run_analysis)
+Gauge("analysis_jobs_queue_size", "Jobs de análise aguardando na fila", job_manager.queue_size)
 
 # Verificar se as variaveis importante estão configuradas!
 @asynccontextmanager
@@ -23,24 +32,25 @@ async def lifespan(app: FastAPI):
     # 🚀 Checagem no startup
     check_environment_variables()
     print("✔️ Variáveis de ambiente validadas. API iniciando.")
+    await connect_chroma()
+    # Iniciando os workers dos jobs de análise
+    job_manager.start()
+    # Iniciando os workers de envio para o SonarQube
+    sonar_publisher.start()
     yield
-    # 🧹 Aqui seria o shutdown se quisesse
+    # 🧹 Encerrando executores e conexões assíncronas
+    shutdown_executors()
+    await close_async_clients()
+    result_store.close()
     print("🛑 API sendo desligada.")
+    shutdown_logging()
 
 
 # Passando o lifespan para ele executar antes de iniciar a aplicação
 app = FastAPI(lifespan=lifespan)
 
-# Criando diretorio log
-Path(LOGS_DIR).mkdir(parents=True, exist_ok=True)
-
-# Configuração básica de logging
-logging.basicConfig(
-    filename='logs/analysis.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    force=True  # <- sobrescreve qualquer configuração anterior de logging
-)
+# Logging com fila (não bloqueia as requisições), rotação e registros em JSON (ver utils/logging_setup.py)
+setup_logging()
 
 #Enviar arquivo para a base de dados
 @app.post("/upload-pdf")
@@ -49,10 +59,10 @@ async def upload_pdf(file: UploadFile = File(...), description: str = Form(...))
         file_name = file.filename
 
         # Remove dados antigos do arquivo, se existirem
-        delete_from_chroma(file_name)
+        await delete_from_chroma(file_name)
 
-        # extrair conteudo do pdf e transformar em texto para a base de dados
-        content = extract_text_and_images(file.file, file_name, description)
+        # extrair conteudo do pdf e transformar em texto para a base de dados (PyMuPDF, OCR e llava são bloqueantes, executados no pdf_executor)
+        content = await pdf_executor.run(extract_text_and_images, file.file, file_name, description)
         
         if not content.strip():
             return {"error": "Não foi possível extrair texto do PDF."}
@@ -64,18 +74,20 @@ async def upload_pdf(file: UploadFile = File(...), description: str = Form(...))
         
         # Convertendo o conteudo do chunk para embedding e armazenando na base de dados
         for idx, chunk in enumerate(chunks):
-            embedding = get_embedding(chunk)
-            add_to_chroma(f"{file_name}_chunk_{idx}", chunk, embedding, file_name)
+            embedding = await aget_embedding(chunk)
+            await add_to_chroma(f"{file_name}_chunk_{idx}", chunk, embedding, file_name)
         
         return {"status": f"PDF '{file_name}' processado e salvo no ChromaDB"}
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except:
         return {"status": f"Erro ao enviar o arquivo '{file_name}' para a base de dados."}
 
 # Perguntar para obter respostar de acordo com as informações da base de dados
 @app.post("/ask")
 async def ask_question(question: str = Form(...)):
-    question_embedding = get_embedding(question)
-    results = query_chroma(question_embedding)
+    question_embedding = await aget_embedding(question)
+    results = await query_chroma(question_embedding)
     
     context = "\n\n".join(results["documents"][0])
     
@@ -115,200 +127,138 @@ async def ask_question(question: str = Form(...)):
 
     💡 Responda de forma completa e clara em português:
     """
-    response = requests.post(f"{OLLAMA_URL}/api/generate", json={
+    response = await ollama_client.agenerate({
         "model": MODEL_CHAT,
-        "prompt": prompt,
-        "stream": False
+        "prompt": prompt
     })
-    response.raise_for_status()
-    answer = response.json()["response"]
+    if response["done_reason"] == ollama_client.DONE_DEADLINE:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Tempo máximo de resposta do modelo atingido")
+    answer = response["response"]
     return {"answer": answer}
 
 
 @app.get("/health")
 async def health():
-    return {"status": "API rodando"}
+    return {
+        "status": "API rodando",
+        "ollama_nodes": get_router().status(),
+        "executors": [executor.status() for executor in EXECUTORS]
+    }
+
+
+# Métricas no formato do Prometheus (latências do git, da varredura, do Ollama e do ChromaDB, tokens, filas...)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.post("/analyze", response_model=AnalysisResponse)
 async def analyze_code(request: AnalyzeRequest):
     try:
-        logging.info("=== INICIANDO ANALISE ===")
-
-        # Inicio Timer
-        start_time = time.time() 
-
-        # Clonando repositorio Git
-        project_path = clone_repo(repo_url=request.project_git_url, branch=request.project_git_branch)
-
-        # Obtendo a estrutura do projeto
-        project_struct = generate_project_tree(project_path)
-
-        # Prompt para o modelo LLM entender oque é para fazer com o codigo fornecido
-        prompt = f"""
-🚨 SUA TAREFA:
-Você é um analista de código sênior altamente especializado. Sua missão é analisar criticamente o código fornecido e IDENTIFICAR problemas de forma clara, objetiva e direta.
-
-⚠️ O QUE VOCÊ **NÃO DEVE FAZER**:
-- 🚫 NÃO gere documentação.
-- 🚫 NÃO descreva funcionalidades.
-- 🚫 NÃO explique como a função ou o componente funciona.
-- 🚫 NÃO gere steps, passos ou fluxogramas.
-- 🚫 NÃO gere tabelas.
-- 🚫 NÃO explique parâmetros, tipos, props ou métodos.
-- 🚫 NÃO descreva comportamentos esperados do código.
-- 🚫 NÃO elogie o código.
-- 🚫 NÃO sugira melhorias que envolvam estética, padrões, boas práticas ou comentários.
-- 🚫 NÃO gere nenhum texto fora do JSON.
-
-⚠️ O QUE VOCÊ DEVE FAZER:
-- ✔️ Identificar problemas de:
-  - Qualidade de código
-  - Bugs
-  - Erros de lógica
-  - Vulnerabilidades de segurança
-  - Problemas de performance
-  - Problemas de manutenibilidade
-  - Problemas de confiabilidade
-- ✔️ Indicar o arquivo e a linha exata ou intervalo onde o problema ocorre.
-- ✔️ Sugerir uma solução prática e direta no campo `"recommendation"`.
-
-Respostas em português!!
-
-🟧 FORMATO OBRIGATÓRIO DA RESPOSTA — EXCLUSIVAMENTE ASSIM:
-- Um **array JSON** contendo objetos com os seguintes campos obrigatórios:
-
-[
-  {{
-    "id": "string",
-    "severity": "MINOR|MAJOR|HIGH|CRITICAL|BLOCKER|INFO",
-    "category": "CODE_QUALITY|BUG|LOGIC|SECURITY|PERFORMANCE|MAINTAINABILITY|RELIABILITY",
-    "description": "string",
-    "file": "string",
-    "line": "string",
-    "recommendation": "string"
-  }}
-]
-
-🟧 EXEMPLO DE COMO INFORMAR LINHAS:
-- Para uma única linha: "line": "10"
-- Para um intervalo: "line": "10-15"
-
-🛑 NÃO inclua nenhuma chave externa como "issues", "problems", "data" ou qualquer outro wrapper.
-🛑 NÃO inclua comentários, descrições adicionais, texto fora do JSON.
-🛑 SE NÃO HOUVER PROBLEMAS NO CÓDIGO, retorne um array vazio: []. Nada além disso.
-
-====== Estrutura do projeto ======
-{project_struct}
-====== Fim da estrutura do projeto ======
-
-"""
-        # Obtendo todos os arquivos do projeto
-        project_files = get_project_files(project_path)
-
-        # Criando lista vazia onde será armazenada todos os resultados do LLM
-        all_analysis = []
-
-        files_count = 0
-        project_total_files = len(project_files)
-        files_name = ""
-
-        # Obtendo todos os arquivos que serão processados
-        for file_path in project_files:
-            file_path = convert_path_to_project(project_path=project_path, file_path=file_path)
-            files_name += f"{file_path}\n"
-
-        # Remover o ultimo "\n"
-        files_name = files_name.rstrip('\n')
-
-        # Adicionando o número de linhas a esquerda do texto para auxiliar a quantidade de arquivos
-        files_name_lines = files_name.split('\n')
-        files_name = '\n'.join(f'{idx + 1:>4} | {line}' for idx, line in enumerate(files_name_lines))
-
-        # Adicionando log 
-        logging.info(f"====Arquivos que serão analisados====\n{files_name}\n=====================================")
-        logging.info("=== RESPOSTA BRUTA ===")
-
-        # Ignorar a etapa de buscar issues do SonarQube caso não estejam configuradas as variáveis de ambiente do SonarQube
-        issues_list = []
-        if SONAR_URL == "":
-            print("Ignorando etapa de integração com o SonarQube. Defina a URL do SonarQube na variável de ambiente SONAR_URL")
-            logging.warning("Ignorando etapa de integração com o SonarQube. Defina a URL do SonarQube na variável de ambiente SONAR_URL")
-        elif SONAR_TOKEN == "":
-            print("Ignorando etapa de integração com o SonarQube. Defina o Token do SonarQube na variável de ambiente SONAR_TOKEN")
-            logging.warning("Ignorando etapa de integração com o SonarQube. Defina o Token do SonarQube na variável de ambiente SONAR_TOKEN")
-        else:
-            # Obtendo issues que foiram enocntradas pelo modelo salvo no sonar
-            issues_list = get_sonar_issues(project_key=request.sonar_project_key)
-
-        # Processar cada arquivo individualmente
-        # for file_path in project_files[:1]:  # Limita a 3 arquivos para teste
-        for file_path in project_files:  # Analisar todos os arquivos do projeto
-
-            # Inicio Timer
-            start_time_current_file = time.time() 
-
-            # Contador do arquivos atual
-            files_count += 1            
-            try:
-                logging.info(f"=== Iniciando Validação do arquivo {file_path} ===\n=== Arquivos {files_count}/{project_total_files} ===")
-                
-                # Analisar com Ollama
-                analysis = llm_integration.analyze_with_ollama(prompt=prompt, file_path=file_path, project_path=project_path, analysis=issues_list)
-
-                # Adicionando json gerado pelo LLM na lista
-                all_analysis.append(analysis)
-
-                #Adicionando LOG
-                logging.info(json.dumps(analysis, indent=2))
-
-                # Obtendo o tempo atual para calcular o tempo levado para processar o arquivo
-                end_time = time.time()  # Fim do timer
-                duration = end_time - start_time_current_file  # Tempo decorrido em segundos
-
-                # Convertendo o diretorio do arquivo para ficar mais legivel
-                file_path = convert_path_to_project(project_path=project_path, file_path=file_path)
-
-                # Adicionando LOG do tempo da analise
-                logging.info(f"✅ Análise do arquivo '{file_path}' concluída em {duration:.2f} segundos")
-                
-            except Exception as e:
-                logging.error(f"Erro ao analisar {file_path}: {str(e)}")
-        
-        # Juntando todas as respostas do LLM que está na lista para um unico json
-        response = consolidate_analysis(analysis_list=all_analysis, start_time=start_time, project_path=project_path)
-
-        # Verificar se as variaveis de ambiente do SonarQube estão configuradas, se não, nem tenta executar a parte de integração com SonarQube
-        if SONAR_URL == "":
-            print("Ignorando etapa de integração com o SonarQube. Defina a URL do SonarQube na variável de ambiente SONAR_URL")
-            logging.warning("Ignorando etapa de integração com o SonarQube. Defina a URL do SonarQube na variável de ambiente SONAR_URL")
-        elif SONAR_TOKEN == "":
-            print("Ignorando etapa de integração com o SonarQube. Defina o Token do SonarQube na variável de ambiente SONAR_TOKEN")
-            logging.warning("Ignorando etapa de integração com o SonarQube. Defina o Token do SonarQube na variável de ambiente SONAR_TOKEN")
-        else:
-            # Converter o json padrão para o json que o SonarQube aceita
-            json_sonarqube = convert_analysis_to_sonarqube(response['analysis'])   
-
-            # Adicionar o arquivo json no projeto
-            # Salvar o arquivo das issues no diretorio do projeto
-            json_issues_path = Path(project_path) / "external-issues.json"
-            with open(json_issues_path, 'w', encoding='utf-8') as f:
-                json.dump(json_sonarqube, f, ensure_ascii=False)
-
-            # Integração com o sonarqube para enviar as issues
-            run_sonar_scanner(project_key=request.sonar_project_key, project_dir=Path(project_path))
-
-        # Adicionando LOG
-        logging.info("=== RESPOSTA VALIDADA ===")
-        logging.info(response)
-
-        return response
-        
+        # Git, varredura e chamadas ao LLM são bloqueantes, executados no analysis_executor
+        # O id identifica os logs desta análise, assim como o id do job nas análises em segundo plano
+        with log_context(job_id=f"sync-{uuid.uuid4().hex[:12]}"):
+            return await analysis_executor.run(run_analysis, request)
+
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         logging.error(f"Erro durante análise: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Análise com o resultado em streaming (NDJSON ou server-sent events): as issues de cada arquivo são
+# enviadas assim que o arquivo termina e, no final, as estatísticas (ver core/analysis_stream.py)
+@app.post("/analyze/stream")
+async def analyze_code_stream(request: AnalyzeRequest, http_request: Request, stream_format: str = Query(default=NDJSON, alias="format", pattern="^(ndjson|sse)$")):
+    stream = AnalysisStream(stream_format)
+    try:
+        with log_context(job_id=f"stream-{uuid.uuid4().hex[:12]}"):
+            future = analysis_executor.submit(stream.run, run_analysis, request)
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+    return StreamingResponse(stream.chunks(http_request, future), media_type=stream.media_type)
+
+
+# Inicia uma análise em segundo plano e retorna o id do job imediatamente
+@app.post("/analyze/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_analysis_job(request: AnalyzeRequest):
+    try:
+        job = job_manager.submit(request)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+    return {"job_id": job.id, "status": job.status, "queue_size": job_manager.queue_size()}
+
+
+def get_job_or_404(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job '{job_id}' não encontrado")
+    return job
+
+
+# Status e progresso do job (arquivos concluídos e tempo de cada arquivo)
+@app.get("/analyze/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    return get_job_or_404(job_id).status_dict()
+
+
+# Issues encontradas até o momento, antes do job terminar
+@app.get("/analyze/jobs/{job_id}/partial")
+async def get_analysis_job_partial(job_id: str):
+    return get_job_or_404(job_id).partial_dict()
+
+
+# Resultado final do job, disponível somente após a conclusão
+@app.get("/analyze/jobs/{job_id}/result", response_model=AnalysisResponse)
+async def get_analysis_job_result(job_id: str):
+    job = get_job_or_404(job_id)
+    if job.status == JOB_FAILED:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=job.error)
+    if job.status != JOB_COMPLETED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job '{job_id}' ainda não finalizado (status: {job.status})")
+    return job.result
+
+
+# Histórico das análises (utils/result_store.py): execuções salvas por repositório, branch, commit e modelo
+@app.get("/analyze/runs")
+async def list_analysis_runs(repo_url: Optional[str] = None, branch: Optional[str] = None, commit: Optional[str] = None,
+                             sonar_project_key: Optional[str] = None, limit: int = Query(default=50, ge=1, le=1000)):
+    return {"runs": result_store.list_runs(repo_url=repo_url, branch=branch, commit=commit, sonar_project_key=sonar_project_key, limit=limit)}
+
+
+# Comparação de duas execuções: issues novas, corrigidas e mantidas
+@app.get("/analyze/runs/diff")
+async def diff_analysis_runs(base: str, head: str):
+    diff = result_store.diff_runs(base, head)
+    if diff is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Execução '{base}' ou '{head}' não encontrada")
+    return diff
+
+
+@app.get("/analyze/runs/{run_id}")
+async def get_analysis_run(run_id: str):
+    run = result_store.get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Execução '{run_id}' não encontrada")
+    return run
+
+
+# Envios para o SonarQube (sonar-scanner executado em segundo plano após cada análise)
+@app.get("/sonar/publications")
+async def list_sonar_publications():
+    return {"queue_size": sonar_publisher.queue_size(), "publications": sonar_publisher.history()}
+
+
+@app.get("/sonar/publications/{publish_id}")
+async def get_sonar_publication(publish_id: str):
+    publication = sonar_publisher.get(publish_id)
+    if publication is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Envio '{publish_id}' não encontrado")
+    return publication.status_dict()
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -7,6 +7,10 @@ class AnalyzeRequest(BaseModel):
     sonar_project_key: str
     project_git_url: str
     project_git_branch: str = "master" # Opcional na requisição, valor default e 'master'
+    incremental: bool = False # Opcional, analisa somente os arquivos alterados desde o último commit analisado
+    callback_url: Optional[str] = None # Opcional, URL notificada (POST) quando um job de análise terminar
+    time_budget_seconds: Optional[float] = Field(default=None, gt=0) # Opcional, tempo máximo da análise; os arquivos mais prioritários são analisados primeiro
+    force: bool = False # Opcional, analisa novamente mesmo que o commit já tenha um resultado salvo no histórico
 
 class IssueCategory(str, Enum):
     SECURITY = "SECURITY"
@@ -18,6 +22,9 @@ class IssueCategory(str, Enum):
     LOGIC = "LOGIC"
     OTHER = "OTHER"
 
+# Severidades aceitas nas issues
+ISSUE_SEVERITIES = ['MINOR', 'LOW', 'MAJOR', 'MEDIUM', 'HIGH', 'CRITICAL', 'BLOCKER', 'INFO']
+
 class CodeIssue(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     severity: str  # Validaremos abaixo
@@ -26,11 +33,12 @@ class CodeIssue(BaseModel):
     file: str
     line: Optional[str] = None
     recommendation: str
+    fingerprint: Optional[str] = None # Identificador estável (arquivo, linhas, categoria e descrição), usado para reconhecer a issue entre análises
 
     @field_validator('severity')
     def validate_severity(cls, validate):
         validate = validate.upper()
-        if validate not in ['MINOR','LOW','MAJOR', 'MEDIUM', 'HIGH', 'CRITICAL', 'BLOCKER','INFO']:
+        if validate not in ISSUE_SEVERITIES:
             return 'MEDIUM'  # Valor padrão se inválido
         return validate
     
@@ -48,8 +56,23 @@ class CodeIssue(BaseModel):
             }
             return category_map.get(validate, IssueCategory.OTHER)
 
+def issue_list_json_schema() -> dict:
+    """
+    JSON schema da resposta do modelo de análise: array de CodeIssue com todos os campos obrigatórios,
+    severity e category restritas aos valores válidos. O fingerprint é calculado pela API e fica de fora.
+    Enviado no "format" do Ollama (saída estruturada), na mesma ordem de campos do prompt.
+    """
+    properties = {name: {"type": "string"} for name in CodeIssue.model_fields if name != "fingerprint"}
+    properties["severity"] = {"type": "string", "enum": ISSUE_SEVERITIES}
+    properties["category"] = {"type": "string", "enum": [category.value for category in IssueCategory]}
+    return {
+        "type": "array",
+        "items": {"type": "object", "properties": properties, "required": list(properties)}
+    }
+
 class AnalysisResponse(BaseModel):
     analysis: List[CodeIssue] = []
+    partial: bool = False # True quando o time_budget_seconds acabou antes de analisar todos os arquivos
     statistics: Optional[dict] = None
     
     # Método correto para serialização no Pydantic v2+
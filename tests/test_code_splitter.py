@@ -0,0 +1,58 @@
+from utils.code_splitter import estimate_tokens, split_code_windows
+
+
+def window_tokens(lines, window):
+    start, end = window
+    return sum(estimate_tokens(f"{idx + 1:>4} | {lines[idx]}\n") for idx in range(start, end))
+
+
+def test_small_file_is_a_single_window():
+    lines = ["x = 1"] * 10
+    assert split_code_windows(lines, max_tokens=1000, overlap_lines=20) == [(0, 10)]
+
+
+def test_windows_cover_file_within_budget():
+    lines = [f"valor_{idx} = {idx}" for idx in range(500)]
+    windows = split_code_windows(lines, max_tokens=300, overlap_lines=20)
+
+    assert windows[0][0] == 0
+    assert windows[-1][1] == len(lines)
+    for (start, end), (next_start, _) in zip(windows, windows[1:]):
+        # Sem buracos entre os trechos e sempre avançando
+        assert start < next_start <= end
+    for window in windows:
+        assert window_tokens(lines, window) <= 300
+
+
+def test_overlap_repeats_last_lines_of_previous_window():
+    lines = ["a = 1"] * 1000
+    windows = split_code_windows(lines, max_tokens=300, overlap_lines=20)
+    for (_, end), (next_start, _) in zip(windows, windows[1:]):
+        assert end - next_start == 20
+
+
+def test_overlap_limited_to_less_than_half_window():
+    # Trechos de ~5 linhas: a sobreposição de 20 linhas faria cada trecho avançar uma única linha
+    lines = ["x" * 100] * 200
+    windows = split_code_windows(lines, max_tokens=200, overlap_lines=20)
+    for (start, end), (next_start, _) in zip(windows, windows[1:]):
+        assert next_start - start > (end - start) / 2
+    assert len(windows) < 80
+
+
+def test_line_larger_than_budget_still_advances():
+    lines = ["y" * 3000, "z = 1", "w = 2"]
+    windows = split_code_windows(lines, max_tokens=100, overlap_lines=20)
+    assert windows[0] == (0, 1)
+    assert windows[-1][1] == len(lines)
+
+
+def test_cuts_at_top_level_definitions():
+    lines = []
+    for function in range(20):
+        lines.append(f"def funcao_{function}():")
+        lines.extend(f"    valor = {line}" for line in range(15))
+        lines.append("")
+    windows = split_code_windows(lines, max_tokens=400, overlap_lines=0)
+    for start, _ in windows[1:]:
+        assert lines[start].startswith("def ")
@@ -0,0 +1,65 @@
+"""Circuit breaker do UpstreamClient quando a chamada de teste (half_open) termina com um erro que não é de conexão"""
+import asyncio
+
+import httpx
+import pytest
+import requests
+
+from utils.http_client import UpstreamClient, CIRCUIT_CLOSED, CIRCUIT_OPEN
+
+
+class FakeResponse:
+    status_code = 200
+
+
+@pytest.fixture
+def client():
+    client = UpstreamClient("teste", timeout=(1, 1), retries=0)
+    client.breaker.failure_threshold = 1
+    client.breaker.reset_timeout = 0
+    # Circuito aberto com o reset_timeout já passado: a próxima chamada é a chamada de teste
+    client.breaker.record_failure()
+    assert client.breaker.state == CIRCUIT_OPEN
+    return client
+
+
+def fail_with(error: BaseException):
+    def send(*args, **kwargs):
+        raise error
+    return send
+
+
+def test_probe_with_read_error_reopens_circuit(client, monkeypatch):
+    monkeypatch.setattr(client.session, "request", fail_with(requests.exceptions.ChunkedEncodingError("corpo cortado")))
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.request("GET", "http://upstream/teste")
+    assert client.breaker.state == CIRCUIT_OPEN
+
+    # O circuito não fica preso em half_open: uma nova chamada de teste é liberada e fecha o circuito
+    monkeypatch.setattr(client.session, "request", lambda *args, **kwargs: FakeResponse())
+    assert client.request("GET", "http://upstream/teste").status_code == 200
+    assert client.breaker.state == CIRCUIT_CLOSED
+
+
+def test_cancelled_async_probe_releases_circuit(client, monkeypatch):
+    async def cancelled(*args, **kwargs):
+        raise asyncio.CancelledError()
+
+    async def ok(*args, **kwargs):
+        return httpx.Response(200)
+
+    async def run():
+        session = client._get_async_session()
+        monkeypatch.setattr(session, "send", cancelled)
+        with pytest.raises(asyncio.CancelledError):
+            await client.arequest("GET", "http://upstream/teste")
+        assert client.breaker.state == CIRCUIT_OPEN
+        # Cancelamento não conta como falha: o circuito continua com uma única falha registrada
+        assert client.breaker.failures == 1
+
+        monkeypatch.setattr(session, "send", ok)
+        assert (await client.arequest("GET", "http://upstream/teste")).status_code == 200
+        assert client.breaker.state == CIRCUIT_CLOSED
+        await client.aclose()
+
+    asyncio.run(run())
@@ -0,0 +1,120 @@
+import json
+
+from utils.json_treatment import JsonCompletionTracker, JsonRepairStats, extract_json, salvage_issues, scan_json
+
+
+def issue(number: int, **fields) -> dict:
+    return {
+        "id": f"issue-{number}",
+        "severity": "MAJOR",
+        "category": "BUG",
+        "description": f"Problema {number}",
+        "file": "src/app.py",
+        "line": str(number),
+        "recommendation": "Corrigir",
+        **fields
+    }
+
+
+def test_valid_json_is_parsed_directly():
+    issues = [issue(1), issue(2)]
+    parsed, result = salvage_issues(json.dumps(issues))
+    assert parsed == issues
+    assert result == {"method": "parsed", "recovered": 2, "lost": 0}
+
+
+def test_empty_array():
+    assert salvage_issues("[]") == ([], {"method": "parsed", "recovered": 0, "lost": 0})
+
+
+def test_wrapper_object_and_markdown_fence():
+    text = "```json\n" + json.dumps({"issues": [issue(1)]}) + "\n```"
+    parsed, result = salvage_issues(text)
+    assert parsed == [issue(1)]
+    assert result["method"] == "parsed"
+
+
+def test_truncated_response_keeps_complete_issues():
+    text = json.dumps([issue(1), issue(2), issue(3)])
+    truncated = text[:text.index('"issue-3"') + 20]
+    parsed, result = salvage_issues(truncated)
+    assert parsed == [issue(1), issue(2)]
+    assert result == {"method": "repaired", "recovered": 2, "lost": 1}
+
+
+def test_text_around_json_and_trailing_commas():
+    text = "Segue a análise:\n[" + json.dumps(issue(1)) + ", " + json.dumps(issue(2))[:-1] + ",},]\nFim."
+    parsed, result = salvage_issues(text)
+    assert parsed == [issue(1), issue(2)]
+    assert result["method"] == "repaired"
+    assert result["lost"] == 0
+
+
+def test_unescaped_newline_inside_string():
+    text = json.dumps([issue(1)]).replace("Problema 1", "Problema\n1")
+    parsed, result = salvage_issues(text)
+    assert parsed[0]["description"] == "Problema\n1"
+    assert result["recovered"] == 1
+
+
+def test_missing_closing_bracket():
+    text = json.dumps([issue(1), issue(2)])[:-1]
+    parsed, result = salvage_issues(text)
+    assert parsed == [issue(1), issue(2)]
+    assert result == {"method": "repaired", "recovered": 2, "lost": 0}
+
+
+def test_unclosed_issue_is_lost():
+    # Sem o "}" não é possível saber se a issue estava completa
+    text = json.dumps([issue(1), issue(2)])[:-2]
+    parsed, result = salvage_issues(text)
+    assert parsed == [issue(1)]
+    assert result == {"method": "repaired", "recovered": 1, "lost": 1}
+
+
+def test_double_encoded_truncated_response():
+    text = json.dumps(json.dumps([issue(1), issue(2)]))
+    truncated = text[:text.index("issue-2")]
+    parsed, result = salvage_issues(truncated)
+    assert parsed == [issue(1)]
+    assert result["method"] == "repaired"
+
+
+def test_nested_objects_are_not_separate_issues():
+    nested = issue(1, extra={"description": "interno"})
+    parsed, _ = salvage_issues("Resposta: " + json.dumps([nested]) + " ...")
+    assert parsed == [nested]
+
+
+def test_nothing_usable():
+    parsed, result = salvage_issues("Não encontrei problemas no código.")
+    assert parsed is None
+    assert result["method"] == "failed"
+
+
+def test_scan_json_counts_lost_items_only_inside_arrays():
+    result = scan_json('{"issues": [' + json.dumps(issue(1)) + ', {"id": "cortada", "desc')
+    assert [found["id"] for found in result["issues"]] == ["issue-1"]
+    assert result["lost"] == 1
+
+
+def test_extract_json_uses_the_scanner():
+    assert extract_json("texto [1, 2,] texto") == [1, 2]
+
+
+def test_repair_stats():
+    stats = JsonRepairStats()
+    stats.add({"method": "parsed", "recovered": 3, "lost": 0})
+    assert stats.to_dict() is None
+
+    stats.add({"method": "repaired", "recovered": 2, "lost": 1})
+    stats.add({"method": "failed", "recovered": 0, "lost": 2}, interrupted=True)
+    assert stats.to_dict() == {"responses_repaired": 1, "responses_failed": 1, "issues_recovered": 2, "issues_lost": 3}
+    assert stats.interrupted
+
+
+def test_completion_tracker_ignores_brackets_inside_strings():
+    tracker = JsonCompletionTracker()
+    chunks = ['[{"description": "usa ]', ' e }"', ', "line": "1"}', "]", " texto depois"]
+    assert [tracker.feed(chunk) for chunk in chunks[:3]] == [False, False, False]
+    assert tracker.feed(chunks[3])
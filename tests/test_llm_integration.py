@@ -0,0 +1,65 @@
+"""Prompt de análise de um arquivo (utils/llm_integration.py), sem chamar o Ollama"""
+import pytest
+import requests
+
+from utils import llm_integration
+
+
+def test_file_prompt_uses_project_path(tmp_path, monkeypatch):
+    project_path = tmp_path / "worktree-3f2a9c1d"
+    (project_path / "src").mkdir(parents=True)
+    (project_path / "src" / "app.py").write_text("print('oi')\n")
+
+    prompts = []
+    monkeypatch.setattr(llm_integration, "request_analysis", lambda prompt, full_prompt, deadline, repair_stats: prompts.append(full_prompt) or [])
+
+    llm_integration.analyze_with_ollama("prompt fixo", str(project_path / "src" / "app.py"), str(project_path), {"analysis": []})
+
+    assert len(prompts) == 1
+    assert "--- Arquivo: src/app.py ---" in prompts[0]
+    assert str(project_path) not in prompts[0]
+
+
+def http_error(status_code: int, body: str) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body.encode("utf-8")
+    return requests.HTTPError(f"{status_code} Client Error", response=response)
+
+
+class FakeChat:
+    """ollama_client.chat falso: a primeira chamada com o schema no "format" falha com 'error'"""
+
+    def __init__(self, error: requests.HTTPError):
+        self.error = error
+        self.formats = []
+
+    def __call__(self, payload, deadline_seconds=None, stop_on_json=False):
+        self.formats.append(payload["format"])
+        if self.error is not None and payload["format"] != "json":
+            error, self.error = self.error, None
+            raise error
+        return {"content": "[]", "done_reason": "stop"}
+
+
+def test_schema_rejected_retries_only_that_call_with_json(monkeypatch):
+    monkeypatch.setattr(llm_integration, "OLLAMA_STRUCTURED_OUTPUT", True)
+    chat = FakeChat(http_error(400, '{"error": "invalid format: expected \\"json\\" or a JSON schema"}'))
+    monkeypatch.setattr(llm_integration.ollama_client, "chat", chat)
+
+    llm_integration.call_analysis_model("sistema", "arquivo", 60)
+    llm_integration.call_analysis_model("sistema", "arquivo", 60)
+
+    schema = llm_integration.ANALYSIS_OUTPUT_SCHEMA
+    # A chamada seguinte volta a enviar o schema: o fallback não vale para o processo todo
+    assert chat.formats == [schema, "json", schema]
+
+
+def test_other_bad_request_is_not_retried(monkeypatch):
+    monkeypatch.setattr(llm_integration, "OLLAMA_STRUCTURED_OUTPUT", True)
+    chat = FakeChat(http_error(400, '{"error": "model \\"inexistente\\" not found, try pulling it first"}'))
+    monkeypatch.setattr(llm_integration.ollama_client, "chat", chat)
+
+    with pytest.raises(requests.HTTPError):
+        llm_integration.call_analysis_model("sistema", "arquivo", 60)
+    assert chat.formats == [llm_integration.ANALYSIS_OUTPUT_SCHEMA]
@@ -0,0 +1,120 @@
+"""Seleção de servidor, failover e circuit breaker do OllamaRouter com dois servidores Ollama falsos (HTTP local)"""
+import time
+
+import pytest
+import requests
+
+from benchmarks.fake_servers import FakeOllama, send_json
+from utils.http_client import CIRCUIT_CLOSED, CIRCUIT_OPEN
+from utils.ollama_router import NoOllamaNodeAvailable, OllamaRouter
+
+EMBEDDING = {"model": "modelo", "prompt": "texto"}
+
+
+class LoadedOllama(FakeOllama):
+    """Servidor falso que informa o modelo como carregado no /api/ps"""
+
+    def _ps(self, handler, match, body: bytes):
+        send_json(handler, {"models": [{"name": "modelo"}]})
+
+
+def embedding_calls(server: FakeOllama) -> int:
+    return server.snapshot_calls().get("POST /api/embeddings", 0)
+
+
+@pytest.fixture
+def servers():
+    started = [FakeOllama(ttft=0.5).start(), FakeOllama(ttft=0.5).start()]
+    yield started
+    for server in started:
+        try:
+            server.stop()
+        except Exception:
+            pass
+
+
+@pytest.fixture
+def router(servers):
+    router = OllamaRouter([server.url for server in servers], refresh_seconds=0)
+    for node in router.nodes:
+        node.client.breaker.failure_threshold = 2
+        # Longo o suficiente para o circuito continuar aberto mesmo com a máquina lenta; os testes encurtam quando precisam
+        node.client.breaker.reset_timeout = 30
+    return router
+
+
+def test_busy_node_gets_no_new_calls(servers, router):
+    # Uma geração lenta em andamento ocupa um dos servidores
+    with router.stream("POST", "/api/chat", model="modelo", json={"model": "modelo", "messages": []}, stream=True) as response:
+        busy = next(node for node in router.nodes if node.outstanding == 1)
+        idle_server = next(server for server in servers if server.url != busy.url)
+
+        for _ in range(3):
+            assert router.request("POST", "/api/embeddings", model="modelo", json=EMBEDDING).status_code == 200
+        assert embedding_calls(idle_server) == 3
+        response.content
+
+    assert all(node.outstanding == 0 for node in router.nodes)
+
+
+def test_loaded_model_is_preferred(servers, router):
+    router.nodes[1].loaded_models.add("modelo")
+    for _ in range(3):
+        router.request("POST", "/api/embeddings", model="modelo", json=EMBEDDING)
+    assert embedding_calls(servers[1]) == 3
+    assert embedding_calls(servers[0]) == 0
+
+
+def test_failover_opens_and_closes_circuit(servers, router):
+    down, up = servers
+    down_node = next(node for node in router.nodes if node.url == down.url)
+    # Com o modelo carregado, o servidor que vai cair é sempre o preferido
+    down_node.loaded_models.add("modelo")
+    port = down.port
+    down.stop()
+
+    # Todas as chamadas funcionam pelo outro servidor, e o servidor fora do ar sai da rotação
+    for _ in range(6):
+        assert router.request("POST", "/api/embeddings", model="modelo", json=EMBEDDING).status_code == 200
+    assert embedding_calls(up) == 6
+    assert down_node.client.breaker.state == CIRCUIT_OPEN
+    assert not down_node.is_available()
+    node = router.pick("modelo")
+    router.release(node)
+    assert node.url == up.url
+
+    # O servidor volta: depois do reset_timeout o /api/ps de teste fecha o circuito
+    restarted = LoadedOllama(port=port).start()
+    servers[0] = restarted
+    down_node.client.breaker.reset_timeout = 0.05
+    time.sleep(0.1)
+    for node in router.nodes:
+        router.refresh_node(node)
+    assert down_node.client.breaker.state == CIRCUIT_CLOSED
+    assert down_node.is_available()
+
+    # E ele volta a receber as chamadas (é o único com o modelo carregado segundo o /api/ps)
+    for _ in range(3):
+        assert router.request("POST", "/api/embeddings", model="modelo", json=EMBEDDING).status_code == 200
+    assert embedding_calls(restarted) == 3
+    assert embedding_calls(up) == 6
+
+
+def test_all_nodes_down_raises(servers, router):
+    for server in servers:
+        server.stop()
+    # Falha de conexão do último servidor tentado ou NoOllamaNodeAvailable (subclasse de ConnectionError)
+    with pytest.raises(requests.ConnectionError):
+        router.request("POST", "/api/embeddings", model="modelo", json=EMBEDDING)
+    # Todos os servidores foram tentados antes de desistir, e nenhum ficou com a chamada em andamento
+    assert all(node.client.breaker.failures >= 1 for node in router.nodes)
+    assert all(node.outstanding == 0 for node in router.nodes)
+
+
+def test_no_available_node_raises_documented_error(servers, router):
+    for node in router.nodes:
+        for _ in range(node.client.breaker.failure_threshold):
+            node.client.breaker.record_failure()
+    with pytest.raises(NoOllamaNodeAvailable):
+        router.request("POST", "/api/embeddings", model="modelo", json=EMBEDDING)
+    assert sum(embedding_calls(server) for server in servers) == 0
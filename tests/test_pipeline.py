@@ -0,0 +1,110 @@
+"""run_analysis com um repositório git local e o LLM substituído (arquivos com falha na análise)"""
+from git import Repo
+import pytest
+
+from core import pipeline, project_scanner, analysis_runner
+from models.schemas import AnalyzeRequest
+from utils import analysis_state, llm_integration
+from utils.analysis_state import load_analysis_state, save_analysis_state
+from utils.result_store import ResultStore
+
+
+def issue(file_path: str, description: str) -> dict:
+    return {"severity": "MAJOR", "category": "BUG", "description": description, "file": file_path, "line": "1", "recommendation": "corrigir"}
+
+
+class FakeLLM:
+    """analyze_with_ollama falso: 'failing' são os arquivos ("a.py") em que a chamada falha"""
+
+    def __init__(self):
+        self.failing = set()
+        self.calls = []
+
+    def __call__(self, prompt, file_path, project_path, analysis, deadline=None):
+        file_path_project = file_path.replace("\\", "/").rsplit("/", 1)[-1]
+        self.calls.append(file_path_project)
+        if file_path_project in self.failing:
+            return {"analysis": [], "error": "Ollama fora do ar"}
+        return {"analysis": [issue(file_path_project, f"problema novo em {file_path_project}")]}
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = Repo.init(tmp_path / "repo")
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "teste")
+        config.set_value("user", "email", "teste@teste")
+    for name in ("a.py", "b.py"):
+        (tmp_path / "repo" / name).write_text(f"print('{name}')\n")
+    repo.index.add(["a.py", "b.py"])
+    repo.index.commit("primeiro")
+    return repo
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = ResultStore(path=str(tmp_path / "results.db"), max_runs=0, enabled=True)
+    monkeypatch.setattr(pipeline, "result_store", store)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def llm(monkeypatch, tmp_path, repo, store):
+    fake = FakeLLM()
+    monkeypatch.setattr(llm_integration, "analyze_with_ollama", fake)
+    monkeypatch.setattr(project_scanner, "ACCEPTED_EXTENSIONS", (".py",))
+    monkeypatch.setattr(analysis_runner, "ANALYSIS_CACHE_ENABLED", False)
+    monkeypatch.setattr(analysis_runner, "PACK_SMALL_FILES", False)
+    monkeypatch.setattr(analysis_state, "ANALYSIS_STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setattr(pipeline, "SONAR_URL", "")
+    monkeypatch.setattr(pipeline, "RESULT_STORE_REUSE", True)
+    monkeypatch.setattr(pipeline.repo_cache, "checkout", lambda repo_url, branch: repo.working_dir)
+    monkeypatch.setattr(pipeline.repo_cache, "release", lambda project_path: None)
+    monkeypatch.setattr(pipeline.repo_cache, "remote_head", lambda repo_url, branch: repo.head.commit.hexsha)
+    return fake
+
+
+def test_failed_file_keeps_previous_issues_and_state(repo, llm):
+    request = AnalyzeRequest(sonar_project_key="projeto", project_git_url="repo-falha", incremental=True)
+    first_commit = repo.head.commit.hexsha
+    previous = [issue("a.py", "problema antigo em a.py"), issue("b.py", "problema antigo em b.py")]
+    save_analysis_state(request.project_git_url, request.project_git_branch, request.sonar_project_key, first_commit, previous)
+
+    with open(f"{repo.working_dir}/a.py", "a") as f:
+        f.write("print('alterado')\n")
+    repo.index.add(["a.py"])
+    repo.index.commit("segundo")
+
+    llm.failing = {"a.py"}
+    response = pipeline.run_analysis(request)
+
+    descriptions = sorted(item["description"] for item in response["analysis"])
+    assert descriptions == ["problema antigo em a.py", "problema antigo em b.py"]
+    # O estado não avança: a próxima análise incremental ainda precisa do a.py
+    assert load_analysis_state(request.project_git_url, request.project_git_branch, request.sonar_project_key)["commit"] == first_commit
+
+
+def test_failed_run_is_not_reused(repo, llm, store):
+    request = AnalyzeRequest(sonar_project_key="projeto", project_git_url="repo-reuso")
+
+    llm.failing = {"a.py"}
+    response = pipeline.run_analysis(request)
+    assert response["partial"] is True
+    assert response["statistics"]["failed_files"] == ["a.py"]
+    assert store.find_run(request.project_git_url, repo.head.commit.hexsha, pipeline.MODEL_CODING_ANALYZE, llm_integration.PROMPT_VERSION, "projeto") is None
+
+    # Ollama de volta: o commit é analisado novamente em vez de responder com o resultado salvo
+    llm.failing = set()
+    llm.calls.clear()
+    response = pipeline.run_analysis(request)
+    assert sorted(llm.calls) == ["a.py", "b.py"]
+    assert response["partial"] is False
+    assert response["statistics"]["result_store"]["reused"] is False
+
+    # Agora sim o resultado completo é reaproveitado
+    llm.calls.clear()
+    response = pipeline.run_analysis(request)
+    assert llm.calls == []
+    assert response["statistics"]["result_store"]["reused"] is True
+    assert len(response["analysis"]) == 2
@@ -0,0 +1,17 @@
+from core.project_scanner import ProjectScan
+
+
+def test_skipped_summary_has_totals_and_capped_sample():
+    skipped = [{"file": f"dist/app_{index}.min.js", "reason": "minified"} for index in range(5000)]
+    skipped += [{"file": "package-lock.json", "reason": "lockfile"}]
+    summary = ProjectScan({}, [], skipped).skipped_summary(sample_size=20)
+
+    assert summary["total"] == 5001
+    assert summary["reasons"] == {"minified": 5000, "lockfile": 1}
+    assert summary["sample"] == skipped[:20]
+    assert "files" not in summary
+
+
+def test_skipped_summary_without_sample():
+    summary = ProjectScan({}, [], [{"file": "a.png", "reason": "binary"}]).skipped_summary(sample_size=0)
+    assert summary == {"total": 1, "reasons": {"binary": 1}, "sample": []}
@@ -0,0 +1,34 @@
+"""Remoção dos espelhos do RepoCache quando o cache passa do limite"""
+from utils.repo_cache import RepoCache
+
+
+def make_mirror(cache: RepoCache, name: str):
+    mirror_path = cache.mirrors_dir / name
+    mirror_path.mkdir(parents=True)
+    (mirror_path / "objeto").write_bytes(b"x" * 1024)
+    return mirror_path
+
+
+def test_unused_mirror_is_evicted(tmp_path):
+    cache = RepoCache(base_dir=str(tmp_path), max_bytes=1)
+    mirror_path = make_mirror(cache, "repo-1.git")
+    cache._evict()
+    assert not mirror_path.exists()
+
+
+def test_mirror_registered_during_eviction_is_kept(tmp_path, monkeypatch):
+    cache = RepoCache(base_dir=str(tmp_path), max_bytes=1)
+    mirror_path = make_mirror(cache, "repo-1.git")
+
+    # Um checkout termina (registra o worktree) depois da lista de espelhos em uso e antes da remoção
+    original_lock = cache._mirror_lock
+
+    def mirror_lock(path):
+        lock = original_lock(path)
+        with cache._lock:
+            cache._active_worktrees[str(tmp_path / "worktrees" / "repo-1-abc")] = path
+        return lock
+
+    monkeypatch.setattr(cache, "_mirror_lock", mirror_lock)
+    cache._evict()
+    assert mirror_path.exists()
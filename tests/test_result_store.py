@@ -0,0 +1,72 @@
+from utils.result_store import ResultStore
+import pytest
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(path=str(tmp_path / "results.db"), max_runs=0, enabled=True)
+    yield store
+    store.close()
+
+
+def save(store: ResultStore, commit: str) -> str:
+    response = {"analysis": [{"file": "a.py", "fingerprint": commit}], "partial": False, "statistics": {}}
+    return store.save_run(
+        repo_url="repo", branch="main", commit=commit, model="modelo", prompt_version="1", sonar_project_key="projeto",
+        incremental=False, response=response, file_timings=[]
+    )
+
+
+def find(store: ResultStore, commit: str) -> dict:
+    return store.find_run("repo", commit, "modelo", "1", "projeto")
+
+
+def test_run_without_publish_is_not_published(store):
+    save(store, "c1")
+    run = find(store, "c1")
+    assert run["sonar_publish_status"] is None
+    assert run["sonar_published"] is False
+
+
+@pytest.mark.parametrize("status", ["failed", "superseded", "running"])
+def test_only_succeeded_publish_counts(store, status):
+    run_id = save(store, "c1")
+    store.set_publish_status(run_id, "p1", "queued")
+    store.set_publish_status(run_id, "p1", status)
+    assert find(store, "c1")["sonar_published"] is False
+
+    store.set_publish_status(run_id, "p1", "succeeded")
+    assert find(store, "c1")["sonar_published"] is True
+
+
+def test_newer_publish_of_the_project_replaces_the_run(store):
+    first = save(store, "c1")
+    store.set_publish_status(first, "p1", "queued")
+    store.set_publish_status(first, "p1", "succeeded")
+    second = save(store, "c2")
+    store.set_publish_status(second, "p2", "queued")
+
+    assert find(store, "c1")["sonar_published"] is False
+
+    # Envio mais novo com falha: o SonarQube continua com as issues da primeira execução
+    store.set_publish_status(second, "p2", "failed")
+    assert find(store, "c1")["sonar_published"] is True
+
+
+def test_status_of_a_replaced_publish_is_ignored(store):
+    run_id = save(store, "c1")
+    store.set_publish_status(run_id, "p1", "queued")
+    store.set_publish_status(run_id, "p2", "queued")
+    store.set_publish_status(run_id, "p1", "superseded")
+
+    run = find(store, "c1")
+    assert (run["sonar_publish_id"], run["sonar_publish_status"]) == ("p2", "queued")
+
+
+def test_unreadable_database_returns_empty(tmp_path):
+    path = tmp_path / "results.db"
+    path.write_bytes(b"isto nao e um banco sqlite" * 100)
+    store = ResultStore(path=str(path), enabled=True)
+    assert store.list_runs() == []
+    assert store.get_run("qualquer") is None
+    assert store.find_run("repo", "c1", "modelo", "1", "projeto") is None
@@ -0,0 +1,129 @@
+from config import ANALYSIS_CACHE_ENABLED, ANALYSIS_CACHE_DIR, ANALYSIS_CACHE_MAX_MB, MODEL_CODING_ANALYZE, NUM_CTX
+from pathlib import Path
+from typing import List, Optional
+import threading
+import hashlib
+import logging
+import json
+import os
+
+
+class CacheStats:
+    """Contadores de acertos/erros do cache em uma execução do /analyze"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"enabled": ANALYSIS_CACHE_ENABLED, "hits": self.hits, "misses": self.misses}
+
+
+class AnalysisCache:
+    """
+    Cache em disco do resultado da análise de cada arquivo.
+
+    A chave é o hash do conteúdo do arquivo junto com tudo que altera a resposta do LLM
+    (modelo, versão do prompt, NUM_CTX e as issues do SonarQube do arquivo).
+    Quando o tamanho total passa de 'max_bytes', as entradas usadas há mais tempo são removidas.
+    """
+
+    def __init__(self, cache_dir: str = ANALYSIS_CACHE_DIR, max_mb: float = ANALYSIS_CACHE_MAX_MB):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+
+    @staticmethod
+    def build_key(file_content: bytes, prompt_version: str, file_issues: List[dict], model: str = MODEL_CODING_ANALYZE, num_ctx: int = NUM_CTX) -> str:
+        digest = hashlib.sha256()
+        digest.update(hashlib.sha256(file_content).digest())
+        digest.update(f"|{model}|{prompt_version}|{num_ctx}|".encode("utf-8"))
+        digest.update(json.dumps(file_issues, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        # Sub-diretório com os 2 primeiros caracteres para não ter milhares de arquivos na mesma pasta
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                issues = json.load(f)
+            # Atualiza a data de acesso para a remoção por LRU
+            os.utime(path, None)
+            return issues
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Entrada inválida no cache ({path}), ignorando: {e}")
+            return None
+
+    def set(self, key: str, issues: List[dict]):
+        path = self._entry_path(key)
+        data = json.dumps(issues, ensure_ascii=False).encode("utf-8")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Escreve em arquivo temporário e renomeia, para outra thread nunca ler um json pela metade
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            previous_size = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.warning(f"Erro ao salvar análise no cache ({path}): {e}")
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._disk_usage()
+            else:
+                self._total_bytes += len(data) - previous_size
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _disk_usage(self) -> int:
+        return sum(entry.stat().st_size for entry in self.cache_dir.glob("*/*.json"))
+
+    def _evict(self):
+        # Remove as entradas usadas há mais tempo até ficar em 90% do limite
+        entries = []
+        for entry in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+
+        target = int(self.max_bytes * 0.9)
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in entries:
+            if total <= target:
+                break
+            try:
+                entry.unlink()
+                total -= size
+                removed += 1
+            except FileNotFoundError:
+                continue
+
+        self._total_bytes = total
+        logging.info(f"🗑️ Cache de análises: {removed} entradas removidas ({total / 1024 / 1024:.1f} MB em uso)")
+
+
+# Instância única compartilhada entre as análises
+analysis_cache = AnalysisCache()
@@ -0,0 +1,53 @@
+from config import ANALYSIS_STATE_DIR
+from pathlib import Path
+from typing import Optional
+import threading
+import hashlib
+import logging
+import json
+import os
+
+# Evita duas análises do mesmo projeto escrevendo o estado ao mesmo tempo
+_lock = threading.Lock()
+
+
+def _state_path(repo_url: str, branch: str, sonar_project_key: str) -> Path:
+    key = hashlib.sha256(f"{repo_url}|{branch}|{sonar_project_key}".encode("utf-8")).hexdigest()
+    return Path(ANALYSIS_STATE_DIR) / f"{key}.json"
+
+
+def load_analysis_state(repo_url: str, branch: str, sonar_project_key: str) -> Optional[dict]:
+    """
+    Retorna o estado da última análise do repositório/branch/projeto do SonarQube:
+    {"commit": "<sha analisado>", "analysis": [issues]}, ou None se ainda não existir.
+    """
+    path = _state_path(repo_url, branch, sonar_project_key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Estado da última análise inválido ({path}), ignorando: {e}")
+        return None
+
+
+def save_analysis_state(repo_url: str, branch: str, sonar_project_key: str, commit: str, analysis: list):
+    """Salva o commit analisado e as issues encontradas, base para a próxima análise incremental"""
+    path = _state_path(repo_url, branch, sonar_project_key)
+    state = {
+        "repo_url": repo_url,
+        "branch": branch,
+        "sonar_project_key": sonar_project_key,
+        "commit": commit,
+        "analysis": analysis
+    }
+    try:
+        with _lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+    except Exception as e:
+        logging.error(f"Erro ao salvar o estado da análise ({path}): {e}")
@@ -42,7 +42,7 @@ def check_environment_variables():
 # 🚩 Função para checar as variáveis de ambiente
 def check_environment_variables():
     required_vars = {
-        "OLLAMA_URL": "Defina a URL do ChromaDB na variável de ambiente CHROMADB_HOST, caso necessário defina a porta na variável CHROMADB_PORT",
+        "OLLAMA_URL": "Defina a URL do Ollama serve na variável de ambiente OLLAMA_URL (ou a lista de servidores em OLLAMA_URLS)",
         "CHROMADB_HOST": "Defina a URL do ChromaDB na variável de ambiente CHROMADB_HOST", 
         "GIT_USER": "Defina o Usuário do Git na variável de ambiente GIT_USER",
         "GIT_TOKEN": "Defina o Token do Git na variável de ambiente GIT_TOKEN",
@@ -51,6 +51,9 @@ def check_environment_variables():
     missing = []
 
     for var, error_message in required_vars.items():
+        # OLLAMA_URLS (lista de servidores) substitui o OLLAMA_URL
+        if var == "OLLAMA_URL" and os.getenv("OLLAMA_URLS"):
+            continue
         if not os.getenv(var):
             missing.append(error_message)
 
@@ -0,0 +1,95 @@
+from config import SPLIT_CHARS_PER_TOKEN, SPLIT_OVERLAP_LINES
+from typing import List, Tuple
+import re
+
+# Linhas que iniciam uma definição (função, classe, método...) nas linguagens mais comuns
+DEFINITION_PATTERN = re.compile(
+    r"^\s*(@|def |async |class |function |func |fn |pub |impl |struct |interface |enum |type |const |let |var |"
+    r"export |public |private |protected |internal |static |abstract |final |override |module |namespace |package |"
+    r"template |#include|#define)"
+)
+
+# Linhas que continuam o bloco anterior e não podem iniciar um trecho
+CONTINUATION_PATTERN = re.compile(r"^\s*([}\])]|else\b|elif\b|except\b|finally\b|catch\b|\.|\+|-|\*|/|&&|\|\||\?|:)")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata da quantidade de tokens de um texto (sem tokenizador do modelo)"""
+    return int(len(text) / SPLIT_CHARS_PER_TOKEN) + 1
+
+
+def _boundary_score(lines: List[str], index: int) -> int:
+    """
+    Quão bom é iniciar um trecho na linha 'index':
+    3 = definição no nível mais externo, 2 = bloco no nível mais externo,
+    1 = definição com pouca indentação (ex.: método dentro de classe), 0 = não é um limite.
+    """
+    line = lines[index]
+    if not line.strip() or CONTINUATION_PATTERN.match(line):
+        return 0
+
+    # Decorators/anotações ficam junto da definição: o limite é a primeira linha deles
+    previous = lines[index - 1] if index > 0 else ""
+    if previous.strip().startswith("@"):
+        return 0
+
+    indent = len(line) - len(line.lstrip())
+    is_definition = bool(DEFINITION_PATTERN.match(line))
+
+    if indent == 0:
+        return 3 if is_definition else 2
+    if indent <= 4 and is_definition:
+        return 1
+    return 0
+
+
+def split_code_windows(lines: List[str], max_tokens: int, overlap_lines: int = SPLIT_OVERLAP_LINES) -> List[Tuple[int, int]]:
+    """
+    Divide o arquivo em trechos que cabem em 'max_tokens', cortando preferencialmente
+    no início de funções, classes ou blocos do nível mais externo.
+
+    Cada trecho (exceto o primeiro) repete as 'overlap_lines' linhas finais do trecho anterior como contexto.
+
+    :return: lista de (linha inicial, linha final), 0-based e com o final exclusivo
+    """
+    line_tokens = [estimate_tokens(f"{idx + 1:>4} | {line}\n") for idx, line in enumerate(lines)]
+    total = len(lines)
+
+    if sum(line_tokens) <= max_tokens:
+        return [(0, total)]
+
+    windows = []
+    start = 0
+    while start < total:
+        # Maior trecho possível a partir de 'start' dentro do limite de tokens
+        limit = start
+        used = 0
+        while limit < total and (used + line_tokens[limit] <= max_tokens or limit == start):
+            used += line_tokens[limit]
+            limit += 1
+
+        if limit >= total:
+            windows.append((start, total))
+            break
+
+        # Procura o melhor limite na segunda metade do trecho, para não gerar trechos muito pequenos
+        end = limit
+        best_score = 0
+        minimum_end = start + max(1, (limit - start) // 2)
+        for candidate in range(limit, minimum_end, -1):
+            score = _boundary_score(lines, candidate)
+            if score > best_score:
+                best_score = score
+                end = candidate
+                if score == 3:
+                    break
+
+        windows.append((start, end))
+
+        # O próximo trecho começa um pouco antes, repetindo o final deste como contexto.
+        # A sobreposição fica abaixo da metade do trecho: com trechos de poucas linhas (linhas longas ou max_tokens pequeno)
+        # cada passo avança mais da metade do trecho, em vez de uma linha por vez
+        overlap = min(overlap_lines, (end - start - 1) // 2)
+        start = max(end - overlap, start + 1)
+
+    return windows
@@ -1,11 +1,24 @@
-import requests
-from config import OLLAMA_URL, MODEL_CHAT
+from config import MODEL_CHAT
+from utils.ollama_router import get_router
+from utils.metrics import EMBEDDING_SECONDS
 
 # Obtendo o embedding do texto para procurar ou armazenar a informação na base de dados (chroma)
 def get_embedding(text: str):
-    response = requests.post(f"{OLLAMA_URL}/api/embeddings", json={
-        "model": MODEL_CHAT,  # ou qualquer modelo
-        "prompt": text
-    })
+    with EMBEDDING_SECONDS.time(model=MODEL_CHAT):
+        response = get_router().request("POST", "/api/embeddings", model=MODEL_CHAT, json={
+            "model": MODEL_CHAT,  # ou qualquer modelo
+            "prompt": text
+        })
+    response.raise_for_status()
+    return response.json()["embedding"]
+
+
+# Versão assíncrona, usada pelos endpoints sem bloquear o event loop
+async def aget_embedding(text: str):
+    with EMBEDDING_SECONDS.time(model=MODEL_CHAT):
+        response = await get_router().arequest("POST", "/api/embeddings", model=MODEL_CHAT, json={
+            "model": MODEL_CHAT,
+            "prompt": text
+        })
     response.raise_for_status()
     return response.json()["embedding"]
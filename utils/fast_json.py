@@ -0,0 +1,14 @@
+import json
+
+# orjson (requirements.txt): bem mais rápido para serializar muitas issues, com o json da biblioteca padrão como alternativa
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value) -> bytes:
+    """JSON compacto em UTF-8 (sem escapar acentos); tipos desconhecidos viram texto"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
@@ -3,12 +3,33 @@ import shutil
 from git import Repo, GitCommandError
 from urllib.parse import urlparse, urlunparse
 from config import GIT_USER, GIT_TOKEN, GIT_PROJECT_TEMP
+from typing import Dict, List, Optional
 import logging
 
+def build_auth_url(repo_url: str) -> str:
+    """
+    Insere usuário e token na URL para autenticação.
+    Somente URLs http(s) recebem as credenciais (ex.: file:// e ssh são usadas sem alteração).
+    """
+    parsed_url = urlparse(repo_url)
+    if parsed_url.scheme not in ("http", "https") or not GIT_TOKEN:
+        return repo_url
+
+    netloc = f"{GIT_USER}:{GIT_TOKEN}@{parsed_url.netloc}"
+    return urlunparse((
+        parsed_url.scheme,
+        netloc,
+        parsed_url.path,
+        parsed_url.params,
+        parsed_url.query,
+        parsed_url.fragment
+    ))
+
 # Baixar um repositorio em uma pasta temporaria
 def clone_repo(repo_url: str, dest_dir: str = GIT_PROJECT_TEMP, branch: str = "master") -> str:
     """
     Clona o repositório git na pasta destino com autenticação via token.
+    O /analyze usa o cache de repositórios (utils/repo_cache.py), que permite análises simultâneas.
 
     :param repo_url: URL HTTPS do repositório (ex: https://github.com/usuario/projeto.git)
     :param dest_dir: pasta local para clonar (pode ser temporária)
@@ -19,15 +40,7 @@ def clone_repo(repo_url: str, dest_dir: str = GIT_PROJECT_TEMP, branch: str = "m
 
     # Insere usuário e token na URL para autenticação
     parsed_url = urlparse(repo_url)
-    netloc = f"{GIT_USER}:{GIT_TOKEN}@{parsed_url.netloc}"
-    auth_repo_url = urlunparse((
-        parsed_url.scheme,
-        netloc,
-        parsed_url.path,
-        parsed_url.params,
-        parsed_url.query,
-        parsed_url.fragment
-    ))
+    auth_repo_url = build_auth_url(repo_url)
 
     # Obtendo o nome do projeto, para criar o sub-diretorio com o nome do projeto
     repo_name = os.path.basename(parsed_url.path).replace(".git", "")
@@ -60,4 +73,68 @@ def clone_repo(repo_url: str, dest_dir: str = GIT_PROJECT_TEMP, branch: str = "m
 
 def remove_clone_repo(dir_repo: str) -> str:
     if os.path.exists(dir_repo):
-        shutil.rmtree(dir_repo)
\ No newline at end of file
+        shutil.rmtree(dir_repo)
+
+def get_head_commit(repo_path: str) -> str:
+    """Retorna o SHA do commit atual (HEAD) do repositório"""
+    return Repo(repo_path).head.commit.hexsha
+
+
+def get_changed_files(repo_path: str, base_commit: str, head_commit: str = "HEAD") -> Optional[Dict[str, List[str]]]:
+    """
+    Lista os arquivos alterados entre 'base_commit' e 'head_commit'.
+
+    :return: {"changed": [...], "deleted": [...]} com caminhos relativos ao repositório (separados por "/"),
+             ou None caso o commit base não exista mais no histórico (ex.: force push)
+    """
+    repo = Repo(repo_path)
+
+    # Verificando se o commit base ainda existe no repositório
+    try:
+        repo.git.cat_file("-e", f"{base_commit}^{{commit}}")
+    except GitCommandError:
+        logging.warning(f"Commit base {base_commit} não encontrado no repositório, será feita a análise completa")
+        return None
+
+    # -M detecta arquivos renomeados (o nome antigo conta como removido e o novo como alterado)
+    diff_output = repo.git.diff("--name-status", "-M", base_commit, head_commit)
+
+    changed, deleted = [], []
+    for line in diff_output.splitlines():
+        parts = line.split("\t")
+        if len(parts) < 2:
+            continue
+        status = parts[0][0]
+
+        if status in ("R", "C"):
+            if status == "R":
+                deleted.append(parts[1])
+            changed.append(parts[2])
+        elif status == "D":
+            deleted.append(parts[1])
+        else:
+            # A (adicionado), M (modificado), T (tipo alterado)
+            changed.append(parts[1])
+
+    return {"changed": changed, "deleted": deleted}
+
+
+def get_file_churn(repo_path: str, since_days: int = 90) -> Dict[str, int]:
+    """
+    Quantidade de commits que alteraram cada arquivo nos últimos 'since_days' dias.
+
+    :return: {"src/app.py": 12, ...} (vazio caso não seja possível ler o histórico)
+    """
+    try:
+        # Somente os nomes dos arquivos de cada commit, sem o conteúdo (funciona no clone parcial)
+        log_output = Repo(repo_path).git.log(f"--since={since_days}.days", "--name-only", "--format=", "--no-renames")
+    except GitCommandError as e:
+        logging.warning(f"Não foi possível obter o histórico de alterações do repositório: {e}")
+        return {}
+
+    churn: Dict[str, int] = {}
+    for line in log_output.splitlines():
+        line = line.strip()
+        if line:
+            churn[line] = churn.get(line, 0) + 1
+    return churn
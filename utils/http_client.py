@@ -0,0 +1,288 @@
+from config import (
+    HTTP_POOL_MAXSIZE, HTTP_RETRIES, HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX,
+    CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_RESET_SECONDS,
+    OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT, SONAR_TIMEOUT, JOBS_CALLBACK_TIMEOUT
+)
+from utils.metrics import Gauge
+from requests.adapters import HTTPAdapter
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+import threading
+import requests
+import asyncio
+import logging
+import httpx
+import random
+import time
+
+# Estados do circuit breaker
+CIRCUIT_CLOSED = "closed" # Chamadas liberadas
+CIRCUIT_OPEN = "open" # Upstream fora do ar, chamadas falham imediatamente
+CIRCUIT_HALF_OPEN = "half_open" # Uma chamada de teste liberada para verificar se o upstream voltou
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """O upstream está com o circuito aberto (muitas falhas seguidas), a chamada nem foi enviada"""
+
+
+class CircuitBreaker:
+    """
+    Depois de 'failure_threshold' falhas seguidas o circuito abre e as chamadas falham imediatamente.
+    Após 'reset_timeout' segundos uma chamada de teste é liberada; se funcionar, o circuito fecha.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_BREAKER_FAILURES, reset_timeout: float = CIRCUIT_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        """Indica se uma chamada seria liberada, sem alterar o estado do circuito"""
+        with self._lock:
+            if self.state == CIRCUIT_OPEN:
+                return time.time() - self.opened_at >= self.reset_timeout
+            return True
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CIRCUIT_CLOSED:
+                return True
+            if self.state == CIRCUIT_OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                # Libera somente uma chamada de teste
+                self.state = CIRCUIT_HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CIRCUIT_CLOSED:
+                logging.info(f"✅ Circuito '{self.name}' fechado, upstream respondendo novamente")
+            self.state = CIRCUIT_CLOSED
+            self.failures = 0
+
+    def record_aborted(self):
+        """
+        Chamada interrompida sem resultado do upstream (ex.: cancelada pelo cliente): não conta como falha,
+        mas se era a chamada de teste o circuito volta a aberto e a próxima chamada é o novo teste.
+        """
+        with self._lock:
+            if self.state == CIRCUIT_HALF_OPEN:
+                self.state = CIRCUIT_OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == CIRCUIT_HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != CIRCUIT_OPEN:
+                    logging.error(f"❌ Circuito '{self.name}' aberto após {self.failures} falhas seguidas")
+                self.state = CIRCUIT_OPEN
+                self.opened_at = time.time()
+
+
+def to_httpx_timeout(timeout) -> httpx.Timeout:
+    """Converte o timeout no formato do requests ((conexão, leitura) ou número) para o httpx"""
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+class UpstreamClient:
+    """
+    Cliente HTTP de um upstream (Ollama, SonarQube...), com pool de conexões keep-alive,
+    timeout padrão, novas tentativas com backoff exponencial e circuit breaker.
+
+    request() é síncrono (requests) e arequest() assíncrono (httpx), para uso direto nos endpoints
+    sem bloquear o event loop; os dois compartilham o mesmo circuit breaker.
+    """
+
+    def __init__(self, name: str, timeout: Tuple[float, float], retries: int = HTTP_RETRIES, pool_maxsize: int = HTTP_POOL_MAXSIZE):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = CircuitBreaker(name)
+        # Chamadas em andamento (métrica upstream_in_flight)
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, pool_block=False)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.pool_maxsize = pool_maxsize
+        # Criado na primeira chamada assíncrona, dentro do event loop da API
+        self.async_session: Optional[httpx.AsyncClient] = None
+
+    @contextmanager
+    def _track_in_flight(self):
+        with self._in_flight_lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._in_flight_lock:
+                self.in_flight -= 1
+
+    def request(self, method: str, url: str, retry: bool = True, **kwargs) -> requests.Response:
+        """
+        Envia a requisição tentando novamente em erros de conexão, timeout e respostas 5xx.
+        A resposta final (inclusive 4xx/5xx) é retornada; quem chama decide usar raise_for_status().
+        """
+        with self._track_in_flight():
+            return self._request(method, url, retry, **kwargs)
+
+    def _request(self, method: str, url: str, retry: bool, **kwargs) -> requests.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Upstream '{self.name}' indisponível (circuito aberto), tente novamente mais tarde")
+
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = 1 + (self.retries if retry else 0)
+
+        # Qualquer saída sem resultado registrado (erro fora dos tratados, cancelamento) também atualiza o circuito,
+        # senão uma chamada de teste (half_open) deixaria o circuito bloqueado para sempre
+        try:
+            for attempt in range(1, attempts + 1):
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt >= attempts:
+                        self.breaker.record_failure()
+                        raise
+                    logging.warning(f"Falha de conexão com '{self.name}' ({e}), tentativa {attempt}/{attempts}")
+                else:
+                    if response.status_code < 500:
+                        self.breaker.record_success()
+                        return response
+                    if attempt >= attempts:
+                        self.breaker.record_failure()
+                        return response
+                    logging.warning(f"'{self.name}' respondeu {response.status_code}, tentativa {attempt}/{attempts}")
+                    response.close()
+
+                self._sleep_backoff(attempt)
+        except (requests.ConnectionError, requests.Timeout):
+            # Já registrado como falha na última tentativa
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.record_aborted()
+            raise
+
+    async def arequest(self, method: str, url: str, retry: bool = True, stream: bool = False, **kwargs) -> httpx.Response:
+        """
+        Versão assíncrona do request(). Com 'stream' o corpo não é lido e a resposta precisa
+        ser fechada por quem chamou (await response.aclose()).
+        """
+        with self._track_in_flight():
+            return await self._arequest(method, url, retry, stream, **kwargs)
+
+    async def _arequest(self, method: str, url: str, retry: bool, stream: bool, **kwargs) -> httpx.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Upstream '{self.name}' indisponível (circuito aberto), tente novamente mais tarde")
+
+        timeout = to_httpx_timeout(kwargs.pop("timeout", self.timeout))
+        attempts = 1 + (self.retries if retry else 0)
+
+        # Qualquer saída sem resultado registrado (erro fora dos tratados, cancelamento) também atualiza o circuito,
+        # senão uma chamada de teste (half_open) deixaria o circuito bloqueado para sempre
+        try:
+            for attempt in range(1, attempts + 1):
+                try:
+                    request = self._get_async_session().build_request(method, url, timeout=timeout, **kwargs)
+                    response = await self._get_async_session().send(request, stream=stream)
+                except httpx.TransportError as e:
+                    if attempt >= attempts:
+                        self.breaker.record_failure()
+                        raise
+                    logging.warning(f"Falha de conexão com '{self.name}' ({e}), tentativa {attempt}/{attempts}")
+                else:
+                    if response.status_code < 500:
+                        self.breaker.record_success()
+                        return response
+                    if attempt >= attempts:
+                        self.breaker.record_failure()
+                        return response
+                    logging.warning(f"'{self.name}' respondeu {response.status_code}, tentativa {attempt}/{attempts}")
+                    await response.aclose()
+
+                await asyncio.sleep(self.backoff_delay(attempt))
+        except httpx.TransportError:
+            # Já registrado como falha na última tentativa
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.record_aborted()
+            raise
+
+    def _get_async_session(self) -> httpx.AsyncClient:
+        if self.async_session is None:
+            limits = httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize)
+            self.async_session = httpx.AsyncClient(limits=limits, timeout=to_httpx_timeout(self.timeout))
+        return self.async_session
+
+    async def aclose(self):
+        if self.async_session is not None:
+            await self.async_session.aclose()
+            self.async_session = None
+
+    @staticmethod
+    def backoff_delay(attempt: int) -> float:
+        # Backoff exponencial com jitter ("full jitter"), evitando que todas as threads tentem ao mesmo tempo
+        delay = min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** (attempt - 1)))
+        return random.uniform(0, delay)
+
+    @staticmethod
+    def _sleep_backoff(attempt: int):
+        time.sleep(UpstreamClient.backoff_delay(attempt))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+# Timeout padrão (conexão, leitura) de cada upstream
+UPSTREAM_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    "ollama": (OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT),
+    "sonar": (OLLAMA_CONNECT_TIMEOUT, SONAR_TIMEOUT),
+    "webhook": (OLLAMA_CONNECT_TIMEOUT, JOBS_CALLBACK_TIMEOUT),
+}
+
+_clients: Dict[str, UpstreamClient] = {}
+_clients_lock = threading.Lock()
+
+
+def _in_flight_by_upstream() -> dict:
+    with _clients_lock:
+        return {(name,): client.in_flight for name, client in _clients.items()}
+
+
+UPSTREAM_IN_FLIGHT = Gauge("upstream_in_flight", "Chamadas HTTP em andamento por upstream (Ollama, SonarQube, webhooks)", _in_flight_by_upstream, ["upstream"])
+
+
+def get_client(name: str, timeout: Optional[Tuple[float, float]] = None) -> UpstreamClient:
+    """Retorna o cliente compartilhado do upstream, criando na primeira chamada"""
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = UpstreamClient(name, timeout or UPSTREAM_TIMEOUTS.get(name, (OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)))
+            _clients[name] = client
+        return client
+
+
+async def close_async_clients():
+    """Fecha as conexões assíncronas dos upstreams (desligamento da API)"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,147 @@
+from config import ISSUE_DEDUP_SIMILARITY, ISSUE_MATCH_LINE_DISTANCE
+from typing import Dict, List, Optional, Set, Tuple
+import unicodedata
+import hashlib
+import re
+
+# Palavras sem significado para comparar descrições (português e inglês)
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "de", "da", "do", "das", "dos", "em", "na", "no", "nas", "nos", "e", "ou",
+    "que", "para", "por", "com", "sem", "se", "ao", "aos", "pode", "podem", "esta", "este", "isso", "essa", "esse",
+    "linha", "linhas", "arquivo", "codigo", "funcao", "metodo", "variavel",
+    "the", "an", "of", "in", "on", "and", "or", "to", "for", "with", "is", "are", "be", "this", "that", "it",
+    "line", "lines", "file", "code", "function", "method", "variable"
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9_]+")
+
+
+def normalize_description(description: str) -> str:
+    """Descrição sem acentos, pontuação, números de linha e palavras sem significado ("Variável 'x' não usada" -> "nao usada x")"""
+    text = unicodedata.normalize("NFKD", str(description or "")).encode("ascii", "ignore").decode("ascii").lower()
+    words = [word for word in WORD_PATTERN.findall(text) if word not in STOPWORDS and not word.isdigit()]
+    return " ".join(sorted(set(words)))
+
+
+def parse_line_span(line) -> Tuple[int, int]:
+    """Linha da issue ("10", "10-15", " 15 - 10 ") como (início, fim); (0, 0) se não for possível identificar"""
+    numbers = [int(number) for number in re.findall(r"\d+", str(line or ""))[:2]]
+    if not numbers:
+        return 0, 0
+    start, end = numbers[0], numbers[-1]
+    return min(start, end), max(start, end)
+
+
+def issue_fingerprint(issue: dict) -> str:
+    """Identificador estável da issue: arquivo, linhas, categoria e descrição normalizada"""
+    start, end = parse_line_span(issue.get("line"))
+    key = "|".join([
+        str(issue.get("file", "")).replace("\\", "/"),
+        f"{start}-{end}",
+        str(issue.get("category", "")).upper().strip(),
+        normalize_description(issue.get("description", ""))
+    ])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _similarity(words_a: Set[str], words_b: Set[str]) -> float:
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def _line_distance(span_a: Tuple[int, int], span_b: Tuple[int, int]) -> int:
+    """0 quando os intervalos se sobrepõem, senão a quantidade de linhas entre eles"""
+    return max(0, max(span_a[0], span_b[0]) - min(span_a[1], span_b[1]))
+
+
+class _IssueKey:
+    """Dados usados na comparação, calculados uma vez por issue"""
+
+    def __init__(self, issue: dict):
+        self.issue = issue
+        self.file = str(issue.get("file", "")).replace("\\", "/")
+        self.category = str(issue.get("category", "")).upper().strip()
+        self.span = parse_line_span(issue.get("line"))
+        self.words = set(normalize_description(issue.get("description", "")).split())
+        self.fingerprint = issue.get("fingerprint") or issue_fingerprint(issue)
+
+    def is_similar(self, other: "_IssueKey", max_line_distance: int, same_category: bool = True) -> bool:
+        if self.file != other.file:
+            return False
+        if same_category and self.category != other.category:
+            return False
+        if _line_distance(self.span, other.span) > max_line_distance:
+            return False
+        return _similarity(self.words, other.words) >= ISSUE_DEDUP_SIMILARITY
+
+
+def deduplicate_issues(issues: List[dict]) -> Tuple[List[dict], int]:
+    """
+    Remove issues repetidas da mesma análise: mesmo fingerprint, ou mesmo arquivo e categoria,
+    linhas sobrepostas e descrição parecida. A primeira ocorrência é mantida.
+
+    :return: (issues com o campo "fingerprint", quantidade removida)
+    """
+    kept: List[_IssueKey] = []
+    by_file: Dict[str, List[_IssueKey]] = {}
+    fingerprints: Set[str] = set()
+    removed = 0
+
+    for issue in issues:
+        if not isinstance(issue, dict):
+            continue
+        key = _IssueKey(issue)
+        if key.fingerprint in fingerprints or any(key.is_similar(other, 0) for other in by_file.get(key.file, [])):
+            removed += 1
+            continue
+        issue["fingerprint"] = key.fingerprint
+        fingerprints.add(key.fingerprint)
+        kept.append(key)
+        by_file.setdefault(key.file, []).append(key)
+
+    return [key.issue for key in kept], removed
+
+
+def match_previous_issues(issues: List[dict], previous_issues: Optional[List[dict]]) -> int:
+    """
+    Mantém o id (e o fingerprint) das issues já reportadas em análises anteriores ou já existentes no SonarQube.
+    A issue é a mesma quando tem o mesmo fingerprint ou descrição parecida no mesmo arquivo, até
+    ISSUE_MATCH_LINE_DISTANCE linhas de distância (o código pode ter mudado de lugar).
+
+    :return: quantidade de issues reconhecidas
+    """
+    if not previous_issues:
+        return 0
+
+    previous_by_fingerprint: Dict[str, dict] = {}
+    previous_by_file: Dict[str, List[_IssueKey]] = {}
+    for previous in previous_issues:
+        if not isinstance(previous, dict) or not previous.get("id"):
+            continue
+        key = _IssueKey(previous)
+        previous_by_fingerprint.setdefault(key.fingerprint, previous)
+        previous_by_file.setdefault(key.file, []).append(key)
+
+    used: Set[int] = set()
+    matched = 0
+    for issue in issues:
+        key = _IssueKey(issue)
+        previous = previous_by_fingerprint.get(key.fingerprint)
+        if previous is None or id(previous) in used:
+            # Issues do SonarQube têm a regra no lugar da categoria, então a categoria não é comparada
+            previous = next(
+                (other.issue for other in previous_by_file.get(key.file, [])
+                 if id(other.issue) not in used and key.is_similar(other, ISSUE_MATCH_LINE_DISTANCE, same_category=False)),
+                None
+            )
+        if previous is None:
+            continue
+
+        used.add(id(previous))
+        issue["id"] = previous["id"]
+        if previous.get("fingerprint"):
+            issue["fingerprint"] = previous["fingerprint"]
+        matched += 1
+
+    return matched
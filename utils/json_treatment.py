@@ -1,7 +1,7 @@
 import json
-import re
 import logging
-from typing import List
+import threading
+from typing import Dict, List, Optional, Tuple, Union
 from config import SONAR_ENGINE_ID, SONAR_RULES_ID, SONAR_NOME
 
 def map_category_to_type(category: str) -> str:
@@ -89,14 +89,31 @@ def convert_analysis_to_sonarqube(analysis: List[dict]) -> dict:
 
 
 # Retorna todas as Issues que tenham um "file" especifico
-def get_issues_by_file(analysis: List[dict], file_path: str) -> List[dict]:
+def index_issues_by_file(analysis: List[dict]) -> Dict[str, List[dict]]:
     """
-    Retorna todas as issues que pertencem ao arquivo informado.
+    Agrupa as issues pelo arquivo, montado uma única vez por análise.
 
     :param analysis: Lista de issues.
+    :return: {"public/index.html": [issues do arquivo], ...}
+    """
+    index: Dict[str, List[dict]] = {}
+    for issue in analysis:
+        index.setdefault(issue.get('file'), []).append(issue)
+    return index
+
+def get_issues_by_file(analysis: Union[List[dict], dict], file_path: str) -> List[dict]:
+    """
+    Retorna todas as issues que pertencem ao arquivo informado.
+
+    :param analysis: Lista de issues, ou o dict do get_sonar_issues (com o índice "by_file", sem percorrer a lista).
     :param file_path: Caminho do arquivo (ex.: 'public/index.html').
     :return: Lista de issues filtradas.
     """
+    if isinstance(analysis, dict):
+        index = analysis.get("by_file")
+        if index is not None:
+            return index.get(file_path, [])
+        analysis = analysis.get("analysis", [])
     return [issue for issue in analysis if issue.get('file') == file_path]
 
 def extract_analysis_json(response_text: str):
@@ -138,20 +155,216 @@ def extract_analysis_json(response_text: str):
         return []
 
 def extract_json(text):
+    """Primeiro valor JSON (objeto ou array) do texto, ignorando o que vier antes/depois; None se não houver"""
     try:
         # Primeiro, tenta carregar diretamente
         return json.loads(text)
     except json.JSONDecodeError:
-        # Se falhar, tenta extrair o conteúdo entre os primeiros colchetes
-        matches = re.findall(r"\{.*\}|\[.*\]", text, re.DOTALL)
-        for match in matches:
-            try:
-                return json.loads(match)
-            except json.JSONDecodeError:
+        pass
+    for value in scan_json(text)["values"]:
+        try:
+            return json.loads(value, strict=False)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+# Campos que identificam um objeto de issue na resposta do modelo
+ISSUE_FIELDS = ("id", "severity", "category", "description", "file", "line", "recommendation")
+OPENING = {"}": "{", "]": "["}
+CLOSING = {"{": "}", "[": "]"}
+
+
+def _strip_trailing_comma(out: List[str]):
+    """Remove a vírgula antes do fechamento ("[1, 2,]" -> "[1, 2]")"""
+    index = len(out) - 1
+    while index >= 0 and out[index] in " \t\r\n":
+        index -= 1
+    if index >= 0 and out[index] == ",":
+        del out[index:]
+
+
+def scan_json(text: str) -> dict:
+    """
+    Percorre o texto uma única vez, acompanhando colchetes/chaves (fora das strings), e corrige os defeitos
+    comuns das respostas do LLM enquanto copia o JSON:
+    - quebras de linha e caracteres de controle sem escape dentro das strings;
+    - vírgula antes do fechamento;
+    - fechamento faltando ("{... ]" vira "{... }]") e fechamentos sem abertura (descartados).
+
+    Texto fora do JSON (explicações antes/depois) é ignorado. Objetos dentro de arrays (ou no nível principal)
+    são candidatos a issue: os completos e válidos são recuperados, os cortados (resposta interrompida)
+    ou inválidos são contados como perdidos.
+
+    :return: {"values": [valores JSON completos do nível principal, já corrigidos],
+              "issues": [objetos de issue completos], "lost": quantidade de objetos perdidos}
+    """
+    out: List[str] = []
+    # Cada item: [abertura, posição em 'out', abertura do valor pai ("" no nível principal)]
+    stack: List[list] = []
+    values: List[str] = []
+    # (início, fim, objeto) dos objetos de issue completos
+    candidates: List[tuple] = []
+    lost = 0
+    in_string = escape = False
+
+    for char in text:
+        if not stack:
+            # Fora do JSON: texto do modelo, aguardando a abertura de um valor
+            if char in "[{":
+                stack.append([char, len(out), ""])
+                out.append(char)
+            continue
+
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            elif char < " ":
+                # Caractere de controle sem escape (ex.: quebra de linha dentro da descrição)
+                out.append({"\n": "\\n", "\r": "\\r", "\t": "\\t"}.get(char, f"\\u{ord(char):04x}"))
                 continue
+            out.append(char)
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in "[{":
+            stack.append([char, len(out), stack[-1][0]])
+        elif char in "]}":
+            if not any(entry[0] == OPENING[char] for entry in stack):
+                continue
+            # Fecha também os valores que ficaram abertos antes deste fechamento
+            while True:
+                opening, start, parent = stack.pop()
+                _strip_trailing_comma(out)
+                out.append(CLOSING[opening])
+                if opening == "{" and parent != "{":
+                    try:
+                        value = json.loads("".join(out[start:]), strict=False)
+                    except json.JSONDecodeError:
+                        if parent == "[":
+                            lost += 1
+                    else:
+                        if isinstance(value, dict) and any(field in value for field in ISSUE_FIELDS):
+                            candidates.append((start, len(out), value))
+                if opening == OPENING[char]:
+                    break
+            if not stack:
+                values.append("".join(out[start:]))
+            continue
+        out.append(char)
+
+    # Resposta interrompida: objetos ainda abertos dentro de arrays foram perdidos
+    lost += sum(1 for opening, _, parent in stack if opening == "{" and parent == "[")
+
+    # Somente os objetos de nível mais alto (um objeto dentro de uma issue não é outra issue)
+    issues = []
+    outer_end = -1
+    for start, end, value in sorted(candidates, key=lambda item: (item[0], -item[1])):
+        if start < outer_end:
+            continue
+        issues.append(value)
+        outer_end = end
+
+    return {"values": values, "issues": issues, "lost": lost}
+
+
+def _as_issue_list(parsed) -> Optional[list]:
+    """Lista de issues de um JSON válido: a própria lista, uma issue única ou a primeira lista de um objeto"""
+    if isinstance(parsed, list):
+        return parsed
+    if isinstance(parsed, dict):
+        # Se for um dict, mas com a estrutura direta de uma issue, transforma em lista
+        if all(field in parsed for field in ISSUE_FIELDS):
+            return [parsed]
+        # Pega a primeira lista encontrada
+        for value in parsed.values():
+            if isinstance(value, list):
+                return value
+        return []
     return None
 
 
+def salvage_issues(text: str) -> Tuple[Optional[list], dict]:
+    """
+    Extrai a lista de issues da resposta do modelo.
+
+    Tenta o json.loads direto; se falhar, recupera todas as issues completas com o scan_json
+    (resposta cortada, texto junto do JSON, vírgulas sobrando, quebras de linha sem escape...).
+
+    :return: (issues, ou None se nada pôde ser aproveitado; {"method": "parsed"|"repaired"|"failed", "recovered": n, "lost": n})
+    """
+    cleaned = text.replace("```json", "").replace("```", "").strip()
+    try:
+        parsed = json.loads(cleaned, strict=False)
+        # JSON codificado como string ("[{\"id\": ...}]")
+        if isinstance(parsed, str):
+            parsed = json.loads(parsed, strict=False)
+        issues = _as_issue_list(parsed)
+        if issues is not None:
+            return issues, {"method": "parsed", "recovered": len(issues), "lost": 0}
+    except json.JSONDecodeError:
+        pass
+
+    result = scan_json(cleaned)
+    if not result["issues"] and '\\"' in cleaned:
+        # Aspas escapadas fora de uma string JSON (resposta duplamente codificada e cortada)
+        unescaped = scan_json(cleaned.replace('\\"', '"'))
+        if unescaped["issues"]:
+            result = unescaped
+
+    if result["issues"]:
+        return result["issues"], {"method": "repaired", "recovered": len(result["issues"]), "lost": result["lost"]}
+
+    # Nenhum objeto de issue, mas um valor completo (ex.: "Resultado: []" ou {"issues": []})
+    for value in result["values"]:
+        try:
+            issues = _as_issue_list(json.loads(value, strict=False))
+        except json.JSONDecodeError:
+            continue
+        if issues is not None:
+            return issues, {"method": "repaired", "recovered": len(issues), "lost": result["lost"]}
+
+    return None, {"method": "failed", "recovered": 0, "lost": result["lost"]}
+
+
+class JsonRepairStats:
+    """Respostas do modelo corrigidas e issues recuperadas/perdidas na análise de um arquivo"""
+
+    def __init__(self):
+        self.repaired = 0
+        self.failed = 0
+        self.recovered = 0
+        self.lost = 0
+        # Respostas interrompidas pelo tempo limite: as issues recuperadas não vão para o cache
+        self.interrupted = False
+        self._lock = threading.Lock()
+
+    def add(self, result: dict, interrupted: bool = False):
+        if interrupted:
+            self.interrupted = True
+        if result["method"] == "parsed":
+            return
+        with self._lock:
+            if result["method"] == "failed":
+                self.failed += 1
+            else:
+                self.repaired += 1
+            self.recovered += result["recovered"]
+            self.lost += result["lost"]
+
+    def to_dict(self) -> Optional[dict]:
+        """None quando todas as respostas eram JSON válido"""
+        with self._lock:
+            if not (self.repaired or self.failed):
+                return None
+            return {"responses_repaired": self.repaired, "responses_failed": self.failed, "issues_recovered": self.recovered, "issues_lost": self.lost}
+
+
 def get_default_value(field):
     # Configurações padrões do json das issues
     defaults = {
@@ -189,4 +402,45 @@ def sanitize_analysis(analysis_list):
         # Adiciona o item tratado na lista
         sanitized.append(sanitized_item)
 
-    return sanitized
\ No newline at end of file
+    return sanitized
+
+class JsonCompletionTracker:
+    """
+    Acompanha um texto JSON recebido aos poucos (streaming) e indica quando o primeiro
+    valor JSON (array ou objeto) foi completamente fechado, ignorando colchetes dentro de strings.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escape = False
+        self.complete = False
+
+    def feed(self, chunk: str) -> bool:
+        """Processa mais um pedaço do texto e retorna True se o JSON já foi concluído"""
+        if self.complete:
+            return True
+
+        for char in chunk:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+
+            if char == '"':
+                self.in_string = True
+            elif char in '[{':
+                self.depth += 1
+                self.started = True
+            elif char in ']}':
+                self.depth -= 1
+                if self.started and self.depth <= 0:
+                    self.complete = True
+                    return True
+
+        return False
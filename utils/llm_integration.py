@@ -1,23 +1,399 @@
-import requests
 import logging
-from typing import Dict, Any
-from config import OLLAMA_URL, MODEL_CODING_ANALYZE, NUM_CTX
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from config import MODEL_CODING_ANALYZE, NUM_CTX, SPLIT_RESPONSE_TOKENS, SPLIT_MAX_WORKERS, OLLAMA_DEADLINE_SECONDS, OLLAMA_STRUCTURED_OUTPUT
+import contextvars
+import requests
 import json
-from utils.json_treatment import extract_json, sanitize_analysis, get_issues_by_file
+import time
+from utils.json_treatment import salvage_issues, sanitize_analysis, get_issues_by_file, JsonRepairStats
+from utils.code_splitter import estimate_tokens, split_code_windows
+from utils import ollama_client
+from utils.logging_setup import log_prompt
+from utils.metrics import JSON_PARSE_FAILURES, JSON_SALVAGED_ISSUES
 from core.analysis import filter_false_positives, convert_path_to_project
+from models.schemas import issue_list_json_schema
+
+# Versão do template do prompt de análise, faz parte da chave do cache das análises.
+# Altere sempre que o prompt mudar, para que respostas antigas não sejam reaproveitadas.
+PROMPT_VERSION = "5"
+
+# Menor quantidade de tokens de código enviada por trecho, mesmo que o prompt seja muito grande
+MIN_CODE_TOKENS = 512
+
+# JSON schema da resposta enviado no "format" do Ollama: a geração fica restrita a um array de issues válidas
+ANALYSIS_OUTPUT_SCHEMA = issue_list_json_schema()
+
+# Instruções fixas da análise de código (início do prompt, igual para todos os arquivos)
+ANALYSIS_INSTRUCTIONS = """
+🚨 SUA TAREFA:
+Você é um analista de código sênior altamente especializado. Sua missão é analisar criticamente o código fornecido e IDENTIFICAR problemas de forma clara, objetiva e direta.
+
+⚠️ O QUE VOCÊ **NÃO DEVE FAZER**:
+- 🚫 NÃO gere documentação.
+- 🚫 NÃO descreva funcionalidades.
+- 🚫 NÃO explique como a função ou o componente funciona.
+- 🚫 NÃO gere steps, passos ou fluxogramas.
+- 🚫 NÃO gere tabelas.
+- 🚫 NÃO explique parâmetros, tipos, props ou métodos.
+- 🚫 NÃO descreva comportamentos esperados do código.
+- 🚫 NÃO elogie o código.
+- 🚫 NÃO sugira melhorias que envolvam estética, padrões, boas práticas ou comentários.
+- 🚫 NÃO gere nenhum texto fora do JSON.
+
+⚠️ O QUE VOCÊ DEVE FAZER:
+- ✔️ Identificar problemas de:
+  - Qualidade de código
+  - Bugs
+  - Erros de lógica
+  - Vulnerabilidades de segurança
+  - Problemas de performance
+  - Problemas de manutenibilidade
+  - Problemas de confiabilidade
+- ✔️ Indicar o arquivo e a linha exata ou intervalo onde o problema ocorre.
+- ✔️ Sugerir uma solução prática e direta no campo `"recommendation"`.
+
+Respostas em português!!
+
+🟧 FORMATO OBRIGATÓRIO DA RESPOSTA — EXCLUSIVAMENTE ASSIM:
+- Um **array JSON** contendo objetos com os seguintes campos obrigatórios:
+
+[
+  {
+    "id": "string",
+    "severity": "MINOR|MAJOR|HIGH|CRITICAL|BLOCKER|INFO",
+    "category": "CODE_QUALITY|BUG|LOGIC|SECURITY|PERFORMANCE|MAINTAINABILITY|RELIABILITY",
+    "description": "string",
+    "file": "string",
+    "line": "string",
+    "recommendation": "string"
+  }
+]
+
+🟧 EXEMPLO DE COMO INFORMAR LINHAS:
+- Para uma única linha: "line": "10"
+- Para um intervalo: "line": "10-15"
+
+🛑 NÃO inclua nenhuma chave externa como "issues", "problems", "data" ou qualquer outro wrapper.
+🛑 NÃO inclua comentários, descrições adicionais, texto fora do JSON.
+🛑 SE NÃO HOUVER PROBLEMAS NO CÓDIGO, retorne um array vazio: []. Nada além disso.
+
+🟧 ISSUES JÁ CONHECIDAS:
+Junto com o código podem ser enviadas issues já encontradas anteriormente no arquivo.
+Caso alguma dessas issues ainda esteja presente no código, retorne essa mesma issue exatamente como ela está, sem alterar nada.
+Se alguma dessas issues não for mais aplicável (porque o código foi alterado, corrigido ou não faz mais sentido), **não inclua essa issue no retorno**.
+Se você identificar novas issues que não estão na lista, pode adicioná-las normalmente no mesmo padrão.
+"""
+
+
+def build_system_prompt(project_struct: str) -> str:
+    """
+    Monta a parte fixa do prompt (instruções + estrutura do projeto já codificada, ver ProjectTreeEncoder).
+
+    Deve ser idêntica byte a byte para todos os arquivos da análise: assim o Ollama reaproveita
+    o cache (KV cache) dessa parte e só avalia o conteúdo de cada arquivo.
+    """
+    return f"""{ANALYSIS_INSTRUCTIONS}
+====== Estrutura do projeto ======
+{project_struct}
+====== Fim da estrutura do projeto ======
+"""
+
+
+def build_analysis_prompt(file_path: str, file_issues: list, file_content_lines: str, window: Optional[Tuple[int, int, int]] = None) -> str:
+    """
+    Monta a parte variável do prompt de um arquivo (ou de um trecho do arquivo): issues já conhecidas e o código.
+    Enviada depois do prompt fixo (build_system_prompt).
+
+    :param file_path: caminho do arquivo no projeto ("src/app.py"), o mesmo em todas as execuções (cache do prompt no Ollama)
+    :param window: (linha inicial, linha final, total de linhas) quando somente um trecho do arquivo é enviado
+    """
+    # Adicionando conteudo do arquivo lido no prompt
+    full_prompt = f"Revise se as issues listadas abaixo ainda estão presentes no código: "
+    full_prompt += f"{file_issues}\n"
+    full_prompt += f"🟧 CÓDIGO PARA ANÁLISE COM NUMERAÇÃO DE LINHAS À ESQUERDA (NÃO ANALISE ESTA INSTRUÇÃO, APENAS O CÓDIGO):\n"
+    full_prompt += f"--- Arquivo: {file_path} ---\n"
+    if window:
+        start_line, end_line, total_lines = window
+        full_prompt += f"⚠️ Este é somente um TRECHO do arquivo (linhas {start_line} a {end_line} de {total_lines}). "
+        full_prompt += f"Analise apenas este trecho e use a numeração original das linhas mostrada à esquerda.\n"
+    full_prompt += f"==========Inicio do arquivo=========\n"
+    full_prompt += f"{file_content_lines}\n==========Fim do arquivo=========\n"
+    full_prompt += f"""
+🚨 EXECUTE AGORA E RETORNE SOMENTE O JSON.
+"""
+    return full_prompt
+
+
+def build_packed_analysis_prompt(files: List[Tuple[str, list, str]]) -> str:
+    """
+    Monta a parte variável do prompt de vários arquivos pequenos analisados juntos (ver analyze_pack_with_ollama).
+    Cada arquivo vem delimitado, com as próprias issues já conhecidas e a própria numeração de linhas.
+
+    :param files: (caminho do arquivo no projeto, issues já conhecidas do arquivo, código com numeração de linhas)
+    """
+    full_prompt = f"🟧 {len(files)} ARQUIVOS PARA ANÁLISE, CADA UM COM A PRÓPRIA NUMERAÇÃO DE LINHAS À ESQUERDA (NÃO ANALISE ESTA INSTRUÇÃO, APENAS O CÓDIGO).\n"
+    full_prompt += f"Analise cada arquivo separadamente. Em cada issue, informe no campo \"file\" o caminho exatamente como aparece no delimitador 'Arquivo:' do arquivo "
+    full_prompt += f"e no campo \"line\" a linha dentro desse arquivo.\n\n"
+    for file_path, file_issues, file_content_lines in files:
+        full_prompt += f"--- Arquivo: {file_path} ---\n"
+        full_prompt += f"Revise se as issues listadas abaixo ainda estão presentes no código deste arquivo: {file_issues}\n"
+        full_prompt += f"==========Inicio do arquivo=========\n"
+        full_prompt += f"{file_content_lines}\n==========Fim do arquivo=========\n\n"
+    full_prompt += f"""🚨 EXECUTE AGORA E RETORNE SOMENTE O JSON: UM ÚNICO ARRAY COM AS ISSUES DE TODOS OS ARQUIVOS.
+"""
+    return full_prompt
+
 
-def analyze_with_ollama(prompt: str, file_path: str, project_path: str, analysis: list) -> Dict[str, Any]:
+def request_analysis(system_prompt: str, full_prompt: str, deadline: Optional[float] = None, repair_stats: Optional[JsonRepairStats] = None) -> List[dict]:
     """
-    Envia análise para o Ollama com arquivo anexo e processa a resposta
+    Envia o prompt para o modelo de análise e retorna a lista de issues (ainda não sanitizadas).
+    Erros de comunicação com o Ollama e respostas sem nenhuma issue aproveitável são propagados.
+
+    :param system_prompt: parte fixa do prompt, igual em todas as chamadas (reaproveitada pelo cache do Ollama)
+    :param full_prompt: parte variável do prompt (issues conhecidas e código do arquivo)
+    :param deadline: horário limite (time.time()) da análise; a chamada não passa desse horário
+    :param repair_stats: acumula as respostas corrigidas e as issues recuperadas/perdidas do arquivo
     """
+    deadline_seconds = OLLAMA_DEADLINE_SECONDS
+    if deadline is not None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise TimeoutError("Tempo limite da análise atingido")
+        deadline_seconds = min(deadline_seconds, remaining)
+
+    # O prompt e a resposta vão para logs/prompts.log conforme o LOG_PROMPTS (todos, amostra ou somente falhas)
+    response_data = None
+    failed = True
+    try:
+        response_data = call_analysis_model(system_prompt, full_prompt, deadline_seconds)
+        parsed, result = parse_analysis_response(response_data)
+        interrupted = response_data["done_reason"] == ollama_client.DONE_DEADLINE
+        failed = interrupted or response_data["done_reason"] == ollama_client.DONE_MAX_TOKENS or result["method"] != "parsed"
+        if repair_stats is not None:
+            repair_stats.add(result, interrupted)
+        if parsed is None:
+            raise ValueError("Resposta do modelo sem JSON aproveitável")
+    finally:
+        log_prompt(
+            MODEL_CODING_ANALYZE,
+            full_prompt,
+            response_data.get("response") if response_data else None,
+            failed,
+            response_data.get("done_reason") if response_data else None
+        )
+
+    # Removendo falsos positivos gerados
+    return filter_false_positives(parsed)
+
+
+def call_analysis_model(system_prompt: str, full_prompt: str, deadline_seconds: float) -> dict:
+    """Chama o modelo de análise e retorna a resposta do Ollama (ver ollama_client.stream_completion)"""
+    # Requisitando para o Modelo do Ollama avaliar o codigo
+    # A parte fixa vai como mensagem "system", sempre no início do contexto, e o arquivo como mensagem "user".
+    # A geração é encerrada assim que o array JSON da resposta for fechado
+    payload = {
+        "model": MODEL_CODING_ANALYZE,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": full_prompt}
+        ],
+        "format": ANALYSIS_OUTPUT_SCHEMA if OLLAMA_STRUCTURED_OUTPUT else "json",
+        "options": {
+            "temperature": 0.3,
+            "num_ctx": NUM_CTX
+        }
+    }
+    try:
+        response_data = ollama_client.chat(payload, deadline_seconds=deadline_seconds, stop_on_json=True)
+    except requests.HTTPError as e:
+        # Ollama sem suporte a saída estruturada (anterior à 0.5) recusa o schema no "format": somente esta chamada
+        # é repetida com "json"; outros erros 400 (modelo inexistente, prompt grande demais...) não mudam o "format"
+        if payload["format"] == "json" or not is_format_rejected(e):
+            raise
+        logging.warning(f"⚠️ Ollama recusou o JSON schema no 'format' ({e}), repetindo a chamada com 'format: json'")
+        response_data = ollama_client.chat({**payload, "format": "json"}, deadline_seconds=deadline_seconds, stop_on_json=True)
+
+    if response_data["done_reason"] in (ollama_client.DONE_DEADLINE, ollama_client.DONE_MAX_TOKENS):
+        logging.warning(f"Resposta do modelo incompleta ({response_data['done_reason']}), tentando aproveitar o JSON gerado")
+
+    return response_data
+
+
+def is_format_rejected(error: requests.HTTPError) -> bool:
+    """Erro 400 do Ollama causado pelo "format" (JSON schema), pela mensagem de erro da resposta"""
+    if error.response is None or error.response.status_code != 400:
+        return False
+    try:
+        message = error.response.text.lower()
+    except Exception:
+        return False
+    return "format" in message or "schema" in message
+
+
+def parse_analysis_response(response_data: dict) -> Tuple[Optional[list], dict]:
+    """
+    Converte a resposta do modelo na lista de issues (ver json_treatment.salvage_issues).
+    Com JSON inválido ou cortado, todas as issues completas são aproveitadas.
+
+    :return: (issues, ou None se nada puder ser aproveitado; {"method": "parsed"|"repaired"|"failed", "recovered": n, "lost": n})
+    """
+    text = response_data["response"] if "response" in response_data else str(response_data)
+    parsed, result = salvage_issues(text)
+
+    if result["method"] != "parsed":
+        JSON_PARSE_FAILURES.inc(result="failed" if parsed is None else "recovered")
+        JSON_SALVAGED_ISSUES.inc(result["recovered"], result="recovered")
+        JSON_SALVAGED_ISSUES.inc(result["lost"], result="lost")
+        logging.warning(f"JSON da resposta do modelo inválido: {result['recovered']} issues recuperadas, {result['lost']} perdidas")
+
+    return parsed, result
+
+
+def issue_start_line(issue: dict) -> int:
+    """Primeira linha informada na issue ("10" ou "10-15"), 0 se não for possível identificar"""
+    try:
+        return int(str(issue.get("line", "0")).split('-')[0].strip())
+    except (ValueError, AttributeError):
+        return 0
+
+
+def merge_window_issues(window_results: List[List[dict]]) -> List[dict]:
+    """Junta as issues de todos os trechos, removendo as repetidas nas linhas sobrepostas"""
+    merged = []
+    seen = set()
+    for issues in window_results:
+        for issue in issues:
+            if not isinstance(issue, dict):
+                continue
+            key = (str(issue.get("line", "")).replace(" ", ""), str(issue.get("description", "")).strip().lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(issue)
+    return merged
+
+
+def analyze_windows(prompt: str, file_path: str, file_issues: list, lines: List[str], windows: List[Tuple[int, int]], deadline: Optional[float] = None, repair_stats: Optional[JsonRepairStats] = None) -> List[dict]:
+    """Analisa cada trecho do arquivo separadamente (em paralelo até SPLIT_MAX_WORKERS) e junta as issues"""
+    total_lines = len(lines)
+
+    def analyze_window(window: Tuple[int, int]) -> List[dict]:
+        start, end = window
+        # Mantendo a numeração original das linhas no trecho
+        window_lines = '\n'.join(f'{idx + 1:>4} | {lines[idx]}' for idx in range(start, end))
+        # Somente as issues já conhecidas que estão dentro do trecho
+        window_issues = [issue for issue in file_issues if start < issue_start_line(issue) <= end]
+        full_prompt = build_analysis_prompt(file_path, window_issues, window_lines, window=(start + 1, end, total_lines))
+        return request_analysis(prompt, full_prompt, deadline, repair_stats)
+
+    if SPLIT_MAX_WORKERS > 1:
+        with ThreadPoolExecutor(max_workers=min(SPLIT_MAX_WORKERS, len(windows)), thread_name_prefix="analyze-window") as executor:
+            # Cada trecho executa com uma cópia do contexto (job e arquivo dos logs) da thread do arquivo
+            futures = [executor.submit(contextvars.copy_context().run, analyze_window, window) for window in windows]
+            window_results = [future.result() for future in futures]
+    else:
+        window_results = [analyze_window(window) for window in windows]
+
+    return merge_window_issues(window_results)
+
+
+def match_issue_file(issue_file: str, files: List[str]) -> Optional[str]:
+    """
+    Arquivo do pacote ao qual a issue pertence, pelo campo "file" da issue.
+    Aceita outro separador, "./" no início, caminho absoluto ou somente o final do caminho, desde que sem ambiguidade.
+    """
+    path = str(issue_file or "").strip().replace("\\", "/")
+    while path.startswith("./"):
+        path = path[2:]
+    if not path:
+        return None
+    if path in files:
+        return path
+
+    candidates = [file for file in files if path.endswith("/" + file) or file.endswith("/" + path)]
+    if len(candidates) == 1:
+        return candidates[0]
+
+    name = path.rsplit("/", 1)[-1]
+    candidates = [file for file in files if file.rsplit("/", 1)[-1] == name]
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def attribute_issues(issues: List[dict], files: List[str]) -> Tuple[Dict[str, List[dict]], int]:
+    """
+    Distribui as issues da análise agrupada entre os arquivos do pacote.
+
+    :return: (issues de cada arquivo, quantidade de issues sem arquivo reconhecido, descartadas)
+    """
+    issues_by_file: Dict[str, List[dict]] = {file: [] for file in files}
+    unattributed = 0
+    for issue in issues:
+        file = match_issue_file(issue.get("file"), files)
+        if file is None:
+            unattributed += 1
+            continue
+        issue["file"] = file
+        issues_by_file[file].append(issue)
+
+    if unattributed:
+        logging.warning(f"{unattributed} issues da análise agrupada sem arquivo reconhecido foram descartadas")
+    return issues_by_file, unattributed
+
+
+def analyze_pack_with_ollama(prompt: str, file_paths: List[str], project_path: str, analysis: list, deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Analisa vários arquivos pequenos em uma única chamada ao Ollama (ver build_packed_analysis_prompt).
+
+    :param prompt: parte fixa do prompt (build_system_prompt), a mesma para todos os arquivos do pacote
+    :return: {"files": {arquivo no projeto: resultado igual ao do analyze_with_ollama}, "unattributed": n},
+             ou {"error": ...} se a chamada falhar
+    """
+    repair_stats = JsonRepairStats()
+    try:
+        files = []
+        for file_path in file_paths:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+            file_path_project = convert_path_to_project(project_path=project_path, file_path=file_path)
+            file_issues = get_issues_by_file(analysis=analysis, file_path=file_path_project)
+            file_content_lines = '\n'.join(f'{idx + 1:>4} | {line}' for idx, line in enumerate(lines))
+            files.append((file_path_project, file_issues, file_content_lines))
+
+        parsed = request_analysis(prompt, build_packed_analysis_prompt(files), deadline, repair_stats)
+        issues_by_file, unattributed = attribute_issues(sanitize_analysis(parsed) if parsed else [], [file for file, _, _ in files])
+
+        results = {file: {"analysis": issues} for file, issues in issues_by_file.items()}
+        # As estatísticas do JSON corrigido são da chamada, contadas uma única vez (no primeiro arquivo)
+        if repair_stats.to_dict():
+            results[files[0][0]]["json_repair"] = repair_stats.to_dict()
+        if repair_stats.interrupted:
+            for result in results.values():
+                result["incomplete"] = True
+        return {"files": results, "unattributed": unattributed}
+
+    except Exception as e:
+        logging.error(f"Erro ao chamar Ollama (análise agrupada de {len(file_paths)} arquivos): {str(e)}")
+        return {"error": str(e)}
+
+
+def analyze_with_ollama(prompt: str, file_path: str, project_path: str, analysis: list, deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Envia análise para o Ollama com arquivo anexo e processa a resposta.
+    Arquivos que não cabem no NUM_CTX são divididos em trechos analisados separadamente.
+
+    :param prompt: parte fixa do prompt (build_system_prompt), a mesma para todos os arquivos
+    :param deadline: horário limite (time.time()) da análise, usado no time_budget_seconds do /analyze
+    """
+    # Respostas com JSON corrigido e issues recuperadas/perdidas, informadas nas estatísticas da análise
+    repair_stats = JsonRepairStats()
     try:
         # Lendo arquivo para adicionar no prompt
         with open(file_path, 'r', encoding='utf-8') as f:
             file_content = f.read()
-        
+
         # Adicionando o número de linhas a esquerda do texto para auxiliar o Modelo
         lines = file_content.split('\n')
-        file_content_lines = '\n'.join(f'{idx + 1:>4} | {line}' for idx, line in enumerate(lines))
 
         # Convertendo o formato do diretorio do arquivo
         file_path_project = convert_path_to_project(project_path=project_path, file_path=file_path)
@@ -26,105 +402,34 @@ def analyze_with_ollama(prompt: str, file_path: str, project_path: str, analysis
         logging.info(f"Arquivo: {file_path_project} | Quantidade de linhas: {len(lines)}")
 
         # Obtendo todas as issues já encontradas antes nesse arquivo
-        file_issues = get_issues_by_file(analysis=analysis['analysis'], file_path=file_path_project)
+        file_issues = get_issues_by_file(analysis=analysis, file_path=file_path_project)
 
-        # Adicionando conteudo do arquivo lido no prompt
-        full_prompt = f"{prompt}\n"
-        full_prompt += f"Além disso, revise se as issues listadas abaixo ainda estão presentes no código."
-        full_prompt += f"{file_issues}\n"
-        full_prompt += f"""
-Caso alguma dessas issues ainda esteja presente no código, retorne essa mesma issue exatamente como ela está, sem alterar nada.
-Se alguma dessas issues não for mais aplicável (porque o código foi alterado, corrigido ou não faz mais sentido), **não inclua essa issue no retorno**.
-Se você identificar novas issues que não estão na lista, pode adicioná-las normalmente no mesmo padrão.
-"""
-        full_prompt += f"🟧 CÓDIGO PARA ANÁLISE COM NUMERAÇÃO DE LINHAS À ESQUERDA (NÃO ANALISE ESTA INSTRUÇÃO, APENAS O CÓDIGO):\n"
-        full_prompt += f"--- Arquivo: {file_path} ---\n"
-        full_prompt += f"==========Inicio do arquivo=========\n"
-        full_prompt += f"{file_content_lines}\n==========Fim do arquivo=========\n"
-        full_prompt += f"""
-🚨 EXECUTE AGORA E RETORNE SOMENTE O JSON.
-🟧 ROFORÇANDO O FORMATO OBRIGATÓRIO DA RESPOSTA — EXCLUSIVAMENTE ASSIM:
-- Um **array JSON** contendo objetos com os seguintes campos obrigatórios:
+        # Tokens disponíveis para o código: contexto total menos o restante do prompt e a resposta do modelo
+        prompt_tokens = estimate_tokens(prompt + build_analysis_prompt(file_path_project, file_issues, "", window=(0, 0, 0)))
+        code_tokens = max(MIN_CODE_TOKENS, NUM_CTX - prompt_tokens - SPLIT_RESPONSE_TOKENS)
 
-[
-  {{
-    "id": "string",
-    "severity": "MINOR|MAJOR|HIGH|CRITICAL|BLOCKER|INFO",
-    "category": "CODE_QUALITY|BUG|LOGIC|SECURITY|PERFORMANCE|MAINTAINABILITY|RELIABILITY",
-    "description": "string",
-    "file": "string",
-    "line": "string",
-    "recommendation": "string"
-  }}
-]
-"""
+        windows = split_code_windows(lines, max_tokens=code_tokens)
 
-        # LOG
-        logging.info(f"=====prompt=====\n{full_prompt}\n=====fim do prompt=====\n\n")
-
-        # Requisitando para o Modelo do Ollama avaliar o codigo
-        response = requests.post(
-            f"{OLLAMA_URL}/api/generate",
-            json={
-                "model": MODEL_CODING_ANALYZE,
-                "prompt": full_prompt,
-                "format": "json",
-                "stream": False,
-                "options": {
-                    "temperature": 0.3,
-                    "num_ctx": NUM_CTX
-                }
-            }
-        )
-        response.raise_for_status()
-
-        # Extrai apenas o conteúdo da resposta do LLM
-        response_data = response.json()
-        
-        # LOG
-        # logging.info(f"===response_data===\n{response_data}\n===========")
-
-        # Tratando a resposta
-        if "response" in response_data:
-            cleaned_response = response_data["response"].replace('```json', '').replace('```', '').strip()
-
-            try:
-                parsed = json.loads(cleaned_response)
-            except Exception as e:
-                # Caso de erro, ele irá gerar um LOG e retornar o parsed vazio
-                logging.error(f"Erro no parsing do JSON: {e}")
-                cleaned_response = cleaned_response.encode('utf-8').decode('unicode_escape')
-                parsed = json.loads(cleaned_response)
+        if len(windows) == 1:
+            file_content_lines = '\n'.join(f'{idx + 1:>4} | {line}' for idx, line in enumerate(lines))
+            parsed = request_analysis(prompt, build_analysis_prompt(file_path_project, file_issues, file_content_lines), deadline, repair_stats)
         else:
-            parsed = extract_json(str(response_data)) or []
-
-        # Se vier como dict, tenta extrair listas
-        if isinstance(parsed, dict):
-            # Se for um dict, mas com a estrutura direta de uma issue, transforma em lista
-            if all(key in parsed for key in ['id', 'severity', 'category', 'description', 'file', 'line', 'recommendation']):
-                parsed = [parsed]
-            else:
-                # Pega a primeira lista encontrada
-                for v in parsed.values():
-                    if isinstance(v, list):
-                        parsed = v
-                        break
-                else:
-                    parsed = []
-         # Confirma que o resultado final é lista
-        if not isinstance(parsed, list):
-            parsed = []
-
-        # Removendo falsos positivos gerados
-        parsed = filter_false_positives(parsed)
+            logging.info(f"Arquivo {file_path_project} excede o NUM_CTX ({NUM_CTX}), dividido em {len(windows)} trechos: {[(start + 1, end) for start, end in windows]}")
+            parsed = analyze_windows(prompt, file_path_project, file_issues, lines, windows, deadline, repair_stats)
 
         # Caso o parsed não esteja vazio, ele irá cuidar que sejá um dicionario bem formado e contendo todos os campos obrigatorio
-        if parsed:
-            sanitized = sanitize_analysis(parsed)
-            return {"analysis": sanitized}
-        
-        return {"analysis": []}
+        result = {"analysis": sanitize_analysis(parsed) if parsed else []}
+        if repair_stats.to_dict():
+            result["json_repair"] = repair_stats.to_dict()
+        if repair_stats.interrupted:
+            # Resposta cortada pelo tempo limite: as issues recuperadas valem para esta execução, mas não vão para o cache
+            result["incomplete"] = True
+        return result
 
     except Exception as e:
         logging.error(f"Erro ao chamar Ollama: {str(e)}")
-        return {"analysis": []}
\ No newline at end of file
+        # 'error' indica que a análise falhou e o resultado não deve ir para o cache
+        result = {"analysis": [], "error": str(e)}
+        if repair_stats.to_dict():
+            result["json_repair"] = repair_stats.to_dict()
+        return result
@@ -0,0 +1,189 @@
+from config import (
+    LOGS_DIR, LOG_LEVEL, LOG_FORMAT, LOG_ROTATION, LOG_MAX_MB, LOG_ROTATION_WHEN, LOG_BACKUP_COUNT,
+    LOG_PROMPTS, LOG_PROMPTS_SAMPLE_RATE
+)
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+from pathlib import Path
+import threading
+import logging
+import copy
+import random
+import queue
+import json
+import time
+
+# Modos do registro dos prompts/respostas do LLM (LOG_PROMPTS)
+PROMPTS_OFF = "off" # Nunca registra
+PROMPTS_SAMPLED = "sampled" # Registra uma amostra (LOG_PROMPTS_SAMPLE_RATE) das chamadas
+PROMPTS_ON_FAILURE = "on_failure" # Registra somente as chamadas com falha (erro, resposta incompleta ou JSON inválido)
+PROMPTS_ON = "on" # Registra todas as chamadas
+
+# Identificadores da análise em andamento, adicionados em todos os registros de log da mesma thread/tarefa
+job_id_var: ContextVar[Optional[str]] = ContextVar("job_id", default=None)
+file_var: ContextVar[Optional[str]] = ContextVar("file", default=None)
+
+# Logger dos prompts/respostas, gravado em um arquivo separado (prompts.log)
+prompt_logger = logging.getLogger("prompts")
+
+_listeners: List[QueueListener] = []
+_setup_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(job_id: Optional[str] = None, file: Optional[str] = None):
+    """
+    Define o job e/ou o arquivo dos registros de log dentro do bloco.
+
+    with log_context(job_id=job.id):
+        ...
+    """
+    tokens = []
+    if job_id is not None:
+        tokens.append((job_id_var, job_id_var.set(job_id)))
+    if file is not None:
+        tokens.append((file_var, file_var.set(file)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Adiciona job_id e file ao registro; executado na thread que gerou o log, onde o contexto está definido"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.job_id = job_id_var.get()
+        record.file = file_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por linha, com o job e o arquivo da análise"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for field in ("job_id", "file"):
+            value = getattr(record, field, None)
+            if value:
+                data[field] = value
+        # Campos extras (logging.info(..., extra={"prompt": ...}))
+        for field in ("prompt", "response", "model", "failed", "done_reason"):
+            if hasattr(record, field):
+                data[field] = getattr(record, field)
+        if record.exc_info or record.exc_text:
+            data["exc"] = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato original (data - nível - mensagem), com o job e o arquivo quando existirem"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - %(context)s%(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        context = [f"job={record.job_id}" if getattr(record, "job_id", None) else "", f"file={record.file}" if getattr(record, "file", None) else ""]
+        record.context = "".join(f"[{item}] " for item in context if item)
+        text = super().format(record)
+        # Registros do log_prompt: prompt e resposta completos após a mensagem
+        if hasattr(record, "prompt"):
+            text += f"\n=====prompt=====\n{record.prompt}\n=====resposta=====\n{record.response}\n=====fim do prompt====="
+        return text
+
+
+class ContextQueueHandler(QueueHandler):
+    """QueueHandler que mantém a mensagem e a exceção separadas, para o formatter do QueueListener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _file_handler(file_name: str) -> logging.Handler:
+    path = str(Path(LOGS_DIR) / file_name)
+    if LOG_ROTATION == "time":
+        handler = TimedRotatingFileHandler(path, when=LOG_ROTATION_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    else:
+        handler = RotatingFileHandler(path, maxBytes=int(LOG_MAX_MB * 1024 * 1024), backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    return handler
+
+
+def _queue_handler(target: logging.Handler) -> QueueHandler:
+    """
+    Handler que somente coloca o registro em uma fila; a escrita no arquivo (e a rotação)
+    acontece na thread do QueueListener, sem bloquear quem gerou o log.
+    """
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = QueueListener(log_queue, target, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+    handler = ContextQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    return handler
+
+
+def setup_logging():
+    """
+    Configura o log da aplicação: logs/analysis.log (e logs/prompts.log para os prompts do LLM),
+    com rotação por tamanho ou horário (LOG_ROTATION) e registros em JSON ou texto (LOG_FORMAT).
+    """
+    with _setup_lock:
+        if _listeners:
+            return
+        Path(LOGS_DIR).mkdir(parents=True, exist_ok=True)
+
+        root = logging.getLogger()
+        # Sobrescreve qualquer configuração anterior de logging (ex.: basicConfig de bibliotecas)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler(_file_handler("analysis.log")))
+        root.setLevel(LOG_LEVEL)
+
+        prompt_logger.propagate = False
+        prompt_logger.setLevel(logging.INFO)
+        if LOG_PROMPTS != PROMPTS_OFF:
+            prompt_logger.addHandler(_queue_handler(_file_handler("prompts.log")))
+
+
+def shutdown_logging():
+    """Grava os registros que ainda estão na fila (desligamento da API)"""
+    with _setup_lock:
+        while _listeners:
+            _listeners.pop().stop()
+
+
+def should_log_prompt(failed: bool) -> bool:
+    if LOG_PROMPTS == PROMPTS_ON:
+        return True
+    if LOG_PROMPTS == PROMPTS_ON_FAILURE:
+        return failed
+    if LOG_PROMPTS == PROMPTS_SAMPLED:
+        return random.random() < LOG_PROMPTS_SAMPLE_RATE
+    return False
+
+
+def log_prompt(model: str, prompt: str, response: Optional[str], failed: bool, done_reason: Optional[str] = None):
+    """Registra o prompt e a resposta do LLM em logs/prompts.log, conforme o modo LOG_PROMPTS"""
+    if not should_log_prompt(failed):
+        return
+    prompt_logger.info(
+        f"Prompt {model}{' (falha)' if failed else ''}",
+        extra={"model": model, "prompt": prompt, "response": response, "failed": failed, "done_reason": done_reason}
+    )
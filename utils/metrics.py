@@ -0,0 +1,189 @@
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+import threading
+import bisect
+import time
+
+# Limites (segundos) dos buckets dos histogramas de tempo: de chamadas rápidas (Chroma, embeddings) até análises longas do LLM
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# Limites dos histogramas de quantidade de tokens
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base das métricas no formato texto do Prometheus (sem dependências externas)"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Valor que só aumenta (ex.: tokens gerados, falhas no parsing do JSON)"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    """Distribuição de valores em buckets acumulados (ex.: latência das chamadas ao Ollama)"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por labels: (contagem por bucket, não acumulada, com o bucket +Inf no final, soma dos valores)
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Mede o tempo do bloco: with histogram.time(operation="fetch"): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+
+        samples = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                samples.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            samples.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(round(total, 6))}")
+            samples.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return samples
+
+
+GaugeValue = Union[float, Dict[LabelValues, float]]
+
+
+class Gauge(Metric):
+    """
+    Valor lido no momento da consulta (ex.: tamanho das filas, chamadas em andamento).
+    'collect' retorna o valor, ou um dict {(valores dos labels): valor} quando a métrica tem labels.
+    """
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], GaugeValue], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def _samples(self) -> List[str]:
+        value = self.collect()
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(sample)}" for key, sample in sorted(value.items())]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric):
+        with self._lock:
+            # Registrar de novo com o mesmo nome substitui (ex.: gauge registrado novamente após reiniciar um componente)
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# Erro ao coletar {metric.name}: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def render_metrics() -> str:
+    """Todas as métricas no formato texto do Prometheus (endpoint /metrics)"""
+    return REGISTRY.render()
+
+
+# Repositórios e varredura do projeto
+GIT_SECONDS = Histogram("analyzer_git_seconds", "Tempo das operações git do cache de repositórios (clone, fetch, worktree)", ["operation"])
+SCAN_SECONDS = Histogram("analyzer_scan_seconds", "Tempo da varredura do projeto (estrutura e lista de arquivos)")
+
+# Análise dos arquivos
+FILE_ANALYSIS_SECONDS = Histogram("analyzer_file_analysis_seconds", "Tempo total da análise de cada arquivo (cache ou LLM)")
+JSON_PARSE_FAILURES = Counter("analyzer_json_parse_failures_total", "Respostas do modelo com JSON inválido", ["result"])
+JSON_SALVAGED_ISSUES = Counter("analyzer_json_salvaged_issues_total", "Issues das respostas com JSON inválido recuperadas (recovered) ou perdidas (lost)", ["result"])
+
+# Chamadas ao Ollama (todas as gerações: análise de código, chat e descrição de imagens)
+LLM_REQUEST_SECONDS = Histogram("ollama_request_seconds", "Tempo total das chamadas de geração ao Ollama", ["model", "endpoint"])
+LLM_PROMPT_EVAL_SECONDS = Histogram("ollama_prompt_eval_seconds", "Tempo de avaliação do prompt (prompt_eval_duration do Ollama)", ["model"])
+LLM_GENERATION_SECONDS = Histogram("ollama_generation_seconds", "Tempo de geração da resposta (eval_duration do Ollama)", ["model"])
+LLM_TOKENS = Counter("ollama_tokens_total", "Tokens avaliados no prompt (in) e gerados (out)", ["model", "direction"])
+LLM_PROMPT_TOKENS = Histogram("ollama_prompt_tokens", "Tokens do prompt avaliados por chamada (sem a parte em cache)", ["model"], buckets=TOKEN_BUCKETS)
+LLM_REQUESTS = Counter("ollama_requests_total", "Chamadas de geração ao Ollama por motivo de encerramento", ["model", "done_reason"])
+
+# RAG (/ask e /upload-pdf)
+EMBEDDING_SECONDS = Histogram("ollama_embedding_seconds", "Tempo das chamadas de embedding ao Ollama", ["model"])
+CHROMA_SECONDS = Histogram("chroma_seconds", "Tempo das operações no ChromaDB", ["operation"])
@@ -0,0 +1,221 @@
+from config import OLLAMA_CONNECT_TIMEOUT, OLLAMA_DEADLINE_SECONDS, OLLAMA_MAX_OUTPUT_TOKENS, OLLAMA_KEEP_ALIVE
+from utils.json_treatment import JsonCompletionTracker
+from utils.ollama_router import get_router
+from utils.metrics import (
+    LLM_REQUESTS, LLM_REQUEST_SECONDS, LLM_PROMPT_EVAL_SECONDS, LLM_GENERATION_SECONDS, LLM_TOKENS, LLM_PROMPT_TOKENS
+)
+from typing import Optional
+import logging
+import json
+import time
+
+# Motivos de encerramento da geração
+DONE_STOP = "stop" # O modelo terminou normalmente
+DONE_JSON = "json_complete" # O JSON da resposta foi fechado, o restante da geração foi cancelado
+DONE_DEADLINE = "deadline" # Tempo máximo da chamada atingido
+DONE_MAX_TOKENS = "max_tokens" # Quantidade máxima de tokens de saída atingida
+
+
+def generate(payload: dict, **kwargs) -> dict:
+    """Chama o /api/generate do Ollama em modo streaming (ver stream_completion)"""
+    return stream_completion("/api/generate", payload, **kwargs)
+
+
+def chat(payload: dict, **kwargs) -> dict:
+    """
+    Chama o /api/chat do Ollama em modo streaming (ver stream_completion).
+    Mensagens "system" idênticas entre as chamadas permitem ao Ollama reaproveitar o cache do prompt (KV cache).
+    """
+    return stream_completion("/api/chat", payload, **kwargs)
+
+
+async def agenerate(payload: dict, **kwargs) -> dict:
+    """Versão assíncrona do generate(), para os endpoints (não bloqueia o event loop)"""
+    return await astream_completion("/api/generate", payload, **kwargs)
+
+
+async def achat(payload: dict, **kwargs) -> dict:
+    """Versão assíncrona do chat(), para os endpoints (não bloqueia o event loop)"""
+    return await astream_completion("/api/chat", payload, **kwargs)
+
+
+class CompletionStream:
+    """
+    Processa as linhas da resposta em streaming do Ollama, conforme chegam, e decide quando
+    interromper a geração. Usado tanto na chamada síncrona quanto na assíncrona.
+    """
+
+    def __init__(self, path: str, payload: dict, deadline_seconds: float, max_output_tokens: int, stop_on_json: bool):
+        self.path = path
+        self.deadline_seconds = deadline_seconds
+        self.max_output_tokens = max_output_tokens
+
+        payload = {**payload, "stream": True}
+        # keep_alive fixo mantém o modelo (e o cache do prompt) carregado entre as chamadas
+        payload.setdefault("keep_alive", OLLAMA_KEEP_ALIVE)
+        # Limite também no servidor, para o modelo não continuar gerando caso a conexão não seja encerrada
+        options = {**payload.get("options", {})}
+        options.setdefault("num_predict", max_output_tokens)
+        payload["options"] = options
+        self.payload = payload
+        self.model = payload.get("model")
+
+        self.start_time = time.time()
+        self.deadline = self.start_time + deadline_seconds
+        self.first_token_time: Optional[float] = None
+        self.tracker = JsonCompletionTracker() if stop_on_json else None
+
+        self.chunks = []
+        self.output_tokens = 0
+        self.final_data = {}
+        self.done_reason = None
+
+    @property
+    def timeout(self):
+        # O timeout de leitura garante que um socket parado não segure a chamada além do prazo
+        return (OLLAMA_CONNECT_TIMEOUT, self.deadline_seconds)
+
+    def feed(self, line) -> bool:
+        """Processa uma linha da resposta; retorna True quando a leitura deve ser encerrada"""
+        if not line:
+            return False
+
+        data = json.loads(line)
+        if "error" in data:
+            raise RuntimeError(f"Erro retornado pelo Ollama: {data['error']}")
+
+        # /api/generate retorna o texto em "response" e o /api/chat em "message.content"
+        token = data.get("response") or data.get("message", {}).get("content", "")
+        if token:
+            if self.first_token_time is None:
+                self.first_token_time = time.time()
+            self.chunks.append(token)
+            self.output_tokens += 1
+
+        if data.get("done"):
+            self.final_data = data
+            self.done_reason = DONE_STOP
+        elif self.tracker and token and self.tracker.feed(token):
+            self.done_reason = DONE_JSON
+        elif self.output_tokens >= self.max_output_tokens:
+            self.done_reason = DONE_MAX_TOKENS
+        elif time.time() > self.deadline:
+            self.done_reason = DONE_DEADLINE
+
+        return self.done_reason is not None
+
+    def result(self) -> dict:
+        # Conexão encerrada pelo servidor sem a mensagem final
+        done_reason = self.done_reason or DONE_STOP
+        final_data = self.final_data
+        first_token_time = self.first_token_time
+        start_time = self.start_time
+        elapsed = time.time() - start_time
+
+        # Quando a geração é interrompida o Ollama não envia as estatísticas finais, então são estimadas pelo cliente
+        eval_count = final_data.get("eval_count", self.output_tokens)
+        eval_duration = final_data.get("eval_duration")
+        if eval_duration:
+            tokens_per_second = eval_count / (eval_duration / 1e9)
+        else:
+            generation_time = elapsed - ((first_token_time - start_time) if first_token_time else 0)
+            tokens_per_second = eval_count / generation_time if generation_time > 0 else 0.0
+
+        metrics = {
+            "ttft": round(first_token_time - start_time, 3) if first_token_time else None,
+            "total_time": round(elapsed, 3),
+            "eval_count": eval_count,
+            "tokens_per_second": round(tokens_per_second, 2),
+            "prompt_eval_count": final_data.get("prompt_eval_count"),
+            "prompt_eval_duration": final_data.get("prompt_eval_duration"),
+            # Tempo de avaliação do prompt; sem as estatísticas finais usa o ttft como estimativa
+            "prompt_eval_seconds": round(final_data["prompt_eval_duration"] / 1e9, 3) if final_data.get("prompt_eval_duration") else (round(first_token_time - start_time, 3) if first_token_time else None),
+            "eval_duration": eval_duration
+        }
+
+        self._observe(metrics, done_reason)
+
+        ttft_text = f"{metrics['ttft']:.2f}s" if metrics["ttft"] is not None else "-"
+        prompt_eval_text = f"{metrics['prompt_eval_seconds']:.2f}s" if metrics["prompt_eval_seconds"] is not None else "-"
+        if metrics["prompt_eval_count"] is not None:
+            # Quando o início do prompt está no cache, o prompt_eval_count considera somente os tokens novos
+            prompt_eval_text += f" ({metrics['prompt_eval_count']} tokens avaliados)"
+        log = logging.warning if done_reason in (DONE_DEADLINE, DONE_MAX_TOKENS) else logging.info
+        log(
+            f"⏱️ Ollama {self.model} {self.path}: ttft {ttft_text} | prompt {prompt_eval_text} | {eval_count} tokens | "
+            f"{metrics['tokens_per_second']:.1f} tokens/s | {elapsed:.2f}s | encerramento: {done_reason}"
+        )
+
+        return {
+            **final_data,
+            "response": "".join(self.chunks),
+            "done_reason": done_reason,
+            "metrics": metrics
+        }
+
+    def _observe(self, result_metrics: dict, done_reason: str):
+        """Registra a chamada nas métricas do /metrics (latência, avaliação do prompt, geração e tokens)"""
+        model = self.model or ""
+        LLM_REQUESTS.inc(model=model, done_reason=done_reason)
+        LLM_REQUEST_SECONDS.observe(result_metrics["total_time"], model=model, endpoint=self.path)
+        if result_metrics["prompt_eval_seconds"] is not None:
+            LLM_PROMPT_EVAL_SECONDS.observe(result_metrics["prompt_eval_seconds"], model=model)
+        if result_metrics["eval_duration"]:
+            LLM_GENERATION_SECONDS.observe(result_metrics["eval_duration"] / 1e9, model=model)
+        if result_metrics["prompt_eval_count"] is not None:
+            LLM_TOKENS.inc(result_metrics["prompt_eval_count"], model=model, direction="in")
+            LLM_PROMPT_TOKENS.observe(result_metrics["prompt_eval_count"], model=model)
+        LLM_TOKENS.inc(result_metrics["eval_count"], model=model, direction="out")
+
+
+def stream_completion(
+    path: str,
+    payload: dict,
+    deadline_seconds: float = OLLAMA_DEADLINE_SECONDS,
+    max_output_tokens: int = OLLAMA_MAX_OUTPUT_TOKENS,
+    stop_on_json: bool = False
+) -> dict:
+    """
+    Chama o Ollama em modo streaming, processando os tokens conforme chegam.
+    O servidor Ollama é escolhido pelo roteador (utils/ollama_router.py) entre os configurados em OLLAMA_URLS.
+
+    A geração é interrompida (fechando a conexão, o que cancela a geração no Ollama) quando:
+    - o tempo total passa de 'deadline_seconds';
+    - a resposta passa de 'max_output_tokens' tokens;
+    - 'stop_on_json' está ativo e um array/objeto JSON completo já foi gerado.
+
+    :return: dict no mesmo formato da resposta do Ollama ("response", "eval_count", ...), com
+             "done_reason" indicando o motivo do encerramento e "metrics" com o tempo até o
+             primeiro token (ttft) e os tokens por segundo.
+    """
+    completion = CompletionStream(path, payload, deadline_seconds, max_output_tokens, stop_on_json)
+
+    with get_router().stream("POST", path, model=completion.model, json=completion.payload, stream=True, timeout=completion.timeout) as response:
+        if response.status_code >= 400:
+            # Corpo do erro ({"error": "..."}) lido antes de liberar a conexão, disponível para quem tratar o HTTPError
+            response.content
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if completion.feed(line):
+                break
+
+    return completion.result()
+
+
+async def astream_completion(
+    path: str,
+    payload: dict,
+    deadline_seconds: float = OLLAMA_DEADLINE_SECONDS,
+    max_output_tokens: int = OLLAMA_MAX_OUTPUT_TOKENS,
+    stop_on_json: bool = False
+) -> dict:
+    """Versão assíncrona (httpx) do stream_completion(), com os mesmos limites e o mesmo retorno"""
+    completion = CompletionStream(path, payload, deadline_seconds, max_output_tokens, stop_on_json)
+
+    async with get_router().astream("POST", path, model=completion.model, json=completion.payload, timeout=completion.timeout) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if completion.feed(line):
+                break
+
+    return completion.result()
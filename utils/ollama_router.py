@@ -0,0 +1,255 @@
+from config import OLLAMA_URLS, OLLAMA_PS_REFRESH_SECONDS, OLLAMA_MODEL_LOAD_PENALTY, OLLAMA_CONNECT_TIMEOUT, HTTP_RETRIES
+from utils.http_client import get_client, UPSTREAM_TIMEOUTS, CircuitOpenError, UpstreamClient
+from utils.metrics import Gauge
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, List, Optional, Set
+import threading
+import requests
+import asyncio
+import httpx
+import logging
+import random
+import time
+
+
+class NoOllamaNodeAvailable(requests.ConnectionError):
+    """Nenhum servidor Ollama saudável para receber a chamada"""
+
+
+class OllamaNode:
+    """Um servidor Ollama, com as requisições em andamento e os modelos carregados na memória"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        # Cada servidor tem o próprio pool de conexões e circuit breaker (servidor com falha é retirado da rotação)
+        self.client: UpstreamClient = get_client(f"ollama:{self.url}", timeout=UPSTREAM_TIMEOUTS["ollama"])
+        self.outstanding = 0
+        self.loaded_models: Set[str] = set()
+        self.models_updated_at = 0.0
+
+    def is_available(self) -> bool:
+        return self.client.breaker.is_available()
+
+    def status(self) -> dict:
+        return {
+            "url": self.url,
+            "available": self.is_available(),
+            "circuit": self.client.breaker.state,
+            "outstanding": self.outstanding,
+            "loaded_models": sorted(self.loaded_models)
+        }
+
+
+class OllamaRouter:
+    """
+    Distribui as chamadas entre vários servidores Ollama.
+
+    O servidor escolhido é o com menos requisições em andamento, penalizando (OLLAMA_MODEL_LOAD_PENALTY)
+    os que ainda não têm o modelo carregado segundo o /api/ps. Servidores com falhas seguidas têm o
+    circuito aberto e saem da rotação; voltam automaticamente quando o /api/ps (ou uma chamada de teste) responde.
+    """
+
+    def __init__(self, urls: List[str], refresh_seconds: float = OLLAMA_PS_REFRESH_SECONDS):
+        self.nodes = [OllamaNode(url) for url in urls]
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Inicia a thread que atualiza os modelos carregados e a saúde dos servidores"""
+        with self._lock:
+            if self._refresh_thread or self.refresh_seconds <= 0:
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh_loop, name="ollama-router-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            for node in self.nodes:
+                self.refresh_node(node)
+            time.sleep(self.refresh_seconds)
+
+    def refresh_node(self, node: OllamaNode):
+        """Consulta o /api/ps do servidor; a resposta também serve de teste para recolocar o servidor na rotação"""
+        if not node.is_available():
+            return
+        try:
+            response = node.client.get(f"{node.url}/api/ps", retry=False, timeout=(OLLAMA_CONNECT_TIMEOUT, 5))
+            response.raise_for_status()
+            models = {model.get("name") or model.get("model") for model in response.json().get("models", [])}
+            with self._lock:
+                node.loaded_models = {model for model in models if model}
+                node.models_updated_at = time.time()
+        except CircuitOpenError:
+            return
+        except Exception as e:
+            logging.warning(f"Não foi possível consultar os modelos carregados em {node.url}: {e}")
+
+    def pick(self, model: Optional[str] = None, exclude: Optional[Set[str]] = None) -> OllamaNode:
+        """Escolhe o servidor para a chamada e já conta a requisição como em andamento"""
+        with self._lock:
+            candidates = [node for node in self.nodes if node.is_available() and node.url not in (exclude or set())]
+            if not candidates:
+                # Todos os disponíveis já foram tentados, permite repetir um deles
+                candidates = [node for node in self.nodes if node.is_available()]
+            if not candidates:
+                raise NoOllamaNodeAvailable("Nenhum servidor Ollama disponível (todos com falhas recentes)")
+
+            def score(node: OllamaNode) -> float:
+                penalty = OLLAMA_MODEL_LOAD_PENALTY if model and model not in node.loaded_models else 0
+                return node.outstanding + penalty
+
+            best = min(score(node) for node in candidates)
+            node = random.choice([node for node in candidates if score(node) == best])
+            node.outstanding += 1
+            return node
+
+    def release(self, node: OllamaNode, model: Optional[str] = None, success: bool = True):
+        with self._lock:
+            node.outstanding -= 1
+            # Depois de uma chamada com sucesso o modelo fica carregado no servidor
+            if success and model:
+                node.loaded_models.add(model)
+
+    def _send(self, method: str, path: str, model: Optional[str], **kwargs):
+        """Envia a requisição, tentando outro servidor em caso de falha. Retorna (resposta, servidor)"""
+        tried: Set[str] = set()
+        last_error: Optional[Exception] = None
+
+        for attempt in range(1, HTTP_RETRIES + 2):
+            node = self.pick(model, exclude=tried)
+            if node.url in tried:
+                # Sem outro servidor para tentar, aguarda antes de repetir no mesmo
+                UpstreamClient._sleep_backoff(attempt - 1)
+            tried.add(node.url)
+
+            try:
+                response = node.client.request(method, f"{node.url}{path}", retry=False, **kwargs)
+            except requests.RequestException as e:
+                self.release(node, success=False)
+                last_error = e
+                logging.warning(f"Falha ao chamar o Ollama {node.url}{path}: {e}")
+                continue
+
+            if response.status_code >= 500:
+                self.release(node, success=False)
+                last_error = requests.HTTPError(f"{response.status_code} em {node.url}{path}", response=response)
+                logging.warning(f"Ollama {node.url} respondeu {response.status_code} em {path}")
+                response.close()
+                continue
+
+            return response, node
+
+        raise last_error or NoOllamaNodeAvailable("Nenhum servidor Ollama respondeu")
+
+    @contextmanager
+    def stream(self, method: str, path: str, model: Optional[str] = None, **kwargs) -> Iterator[requests.Response]:
+        """
+        Abre uma chamada (ex.: geração em streaming) mantendo o servidor ocupado até o final da leitura.
+
+        with router.stream("POST", "/api/generate", model=..., json=..., stream=True) as response:
+            ...
+        """
+        response, node = self._send(method, path, model, **kwargs)
+        success = response.status_code < 400
+        try:
+            yield response
+        except Exception:
+            success = False
+            raise
+        finally:
+            response.close()
+            self.release(node, model, success=success)
+
+    def request(self, method: str, path: str, model: Optional[str] = None, **kwargs) -> requests.Response:
+        """Chamada simples (resposta lida por completo), ex.: embeddings"""
+        with self.stream(method, path, model=model, **kwargs) as response:
+            # Garante que o corpo foi lido antes de liberar o servidor
+            response.content
+            return response
+
+    async def _asend(self, method: str, path: str, model: Optional[str], **kwargs):
+        """Versão assíncrona do _send() (httpx), usada pelos endpoints"""
+        tried: Set[str] = set()
+        last_error: Optional[Exception] = None
+
+        for attempt in range(1, HTTP_RETRIES + 2):
+            node = self.pick(model, exclude=tried)
+            if node.url in tried:
+                await asyncio.sleep(UpstreamClient.backoff_delay(attempt - 1))
+            tried.add(node.url)
+
+            try:
+                response = await node.client.arequest(method, f"{node.url}{path}", retry=False, stream=True, **kwargs)
+            except (requests.RequestException, httpx.HTTPError) as e:
+                self.release(node, success=False)
+                last_error = e
+                logging.warning(f"Falha ao chamar o Ollama {node.url}{path}: {e}")
+                continue
+
+            if response.status_code >= 500:
+                self.release(node, success=False)
+                last_error = httpx.HTTPStatusError(f"{response.status_code} em {node.url}{path}", request=response.request, response=response)
+                logging.warning(f"Ollama {node.url} respondeu {response.status_code} em {path}")
+                await response.aclose()
+                continue
+
+            return response, node
+
+        raise last_error or NoOllamaNodeAvailable("Nenhum servidor Ollama respondeu")
+
+    @asynccontextmanager
+    async def astream(self, method: str, path: str, model: Optional[str] = None, **kwargs) -> AsyncIterator[httpx.Response]:
+        """
+        Versão assíncrona do stream(), sem bloquear o event loop.
+
+        async with router.astream("POST", "/api/generate", model=..., json=...) as response:
+            async for line in response.aiter_lines():
+                ...
+        """
+        response, node = await self._asend(method, path, model, **kwargs)
+        success = response.status_code < 400
+        try:
+            yield response
+        except Exception:
+            success = False
+            raise
+        finally:
+            await response.aclose()
+            self.release(node, model, success=success)
+
+    async def arequest(self, method: str, path: str, model: Optional[str] = None, **kwargs) -> httpx.Response:
+        """Versão assíncrona do request() (resposta lida por completo)"""
+        async with self.astream(method, path, model=model, **kwargs) as response:
+            await response.aread()
+            return response
+
+    def status(self) -> List[dict]:
+        with self._lock:
+            return [node.status() for node in self.nodes]
+
+
+_router: Optional[OllamaRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> OllamaRouter:
+    """Retorna o roteador compartilhado dos servidores configurados em OLLAMA_URLS"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = OllamaRouter(OLLAMA_URLS)
+            if len(_router.nodes) > 1:
+                logging.info(f"Distribuindo chamadas entre {len(_router.nodes)} servidores Ollama: {OLLAMA_URLS}")
+            _router.start()
+        return _router
+
+
+def _nodes_metric(field: str) -> dict:
+    if _router is None:
+        return {}
+    return {(node["url"],): float(node[field]) for node in _router.status()}
+
+
+OLLAMA_NODE_OUTSTANDING = Gauge("ollama_node_in_flight", "Chamadas em andamento em cada servidor Ollama (inclusive gerações em streaming)", lambda: _nodes_metric("outstanding"), ["node"])
+OLLAMA_NODE_AVAILABLE = Gauge("ollama_node_available", "Servidor Ollama na rotação (1) ou com o circuito aberto (0)", lambda: _nodes_metric("available"), ["node"])
@@ -3,8 +3,8 @@ from PIL import Image
 import pytesseract
 import io
 import base64
-import requests
-from config import OLLAMA_URL, MODEL_IMAGE_ANALYZE
+from config import MODEL_IMAGE_ANALYZE
+from utils import ollama_client
 
 # Obter uma descrição detalhada de uma imagem de acordo com o base64 da imagem usando o modelo LLM llava 
 def describe_image_with_llava(image: Image.Image, description: str, ocr_text="") -> str:
@@ -34,14 +34,14 @@ def describe_image_with_llava(image: Image.Image, description: str, ocr_text="")
     )
     
 
-    response = requests.post(f"{OLLAMA_URL}/api/generate", json={
+    response = ollama_client.generate({
         "model": MODEL_IMAGE_ANALYZE, # Modelo LLM desejado para processar
         "prompt": prompt, # prompt explicativo doque ele precisa fazer e entender
-        "images": [img_base64], # Base64 da imagem que será descrita
-        "stream": False 
+        "images": [img_base64] # Base64 da imagem que será descrita
     })
-    response.raise_for_status()
-    return response.json()["response"]
+    if response["done_reason"] == ollama_client.DONE_DEADLINE:
+        raise TimeoutError(f"Tempo máximo atingido ao descrever a imagem com o modelo {MODEL_IMAGE_ANALYZE}")
+    return response["response"]
 
 # Extrair textos e imagens do pdf para ser tratado
 def extract_text_and_images(file, filename: str, description: str) -> str:
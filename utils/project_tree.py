@@ -1,4 +1,8 @@
 import os
+from config import PROJECT_TREE_TOKEN_BUDGET, PROJECT_TREE_SHOW_SIZES
+from utils.code_splitter import estimate_tokens
+from typing import Dict, List, Optional, Set, Tuple
+import threading
 
 def generate_project_tree_grafic(root_path):
     tree = ""
@@ -10,4 +14,170 @@ def generate_project_tree_grafic(root_path):
         subindent = '│   ' * (level + 1)
         for f in filenames:
             tree += f"{subindent}├── {f}\n"
-    return tree
\ No newline at end of file
+    return tree
+
+
+def _format_size(size: int) -> str:
+    if size >= 1024 * 1024:
+        return f"{size / 1024 / 1024:.1f}MB"
+    if size >= 1024:
+        return f"{size / 1024:.1f}KB"
+    return f"{size}B"
+
+
+class _TreeNode:
+    """Diretório da árvore com caminho relativo ('src/app'), usado na codificação compacta"""
+
+    def __init__(self, path: Tuple[str, ...], name: str):
+        self.path = path
+        self.name = name
+        self.dirs: List["_TreeNode"] = []
+        self.files: List[Tuple[str, int]] = []
+        self.total_files = 0
+        self.total_size = 0
+
+
+def _build_nodes(structure: Dict, path: Tuple[str, ...] = ()) -> _TreeNode:
+    """Converte o dicionário do generate_project_tree, ordenando os itens (mesma entrada gera sempre o mesmo texto)"""
+    node = _TreeNode(path, structure.get("name", ""))
+    for child in structure.get("children", []):
+        if child.get("type") == "directory":
+            child_node = _build_nodes(child, path + (child["name"],))
+            node.dirs.append(child_node)
+            node.total_files += child_node.total_files
+            node.total_size += child_node.total_size
+        else:
+            size = child.get("size", 0) or 0
+            node.files.append((child["name"], size))
+            node.total_files += 1
+            node.total_size += size
+
+    node.dirs.sort(key=lambda item: item.name)
+    node.files.sort()
+    return node
+
+
+class ProjectTreeEncoder:
+    """
+    Codificação compacta da estrutura do projeto para o prompt:
+    lista indentada de caminhos, diretórios com um único subdiretório agrupados ("src/main/java/"),
+    tamanhos opcionais e um limite de tokens.
+
+    Quando a árvore completa não cabe em 'token_budget', os diretórios mais distantes do arquivo
+    analisado são resumidos em uma linha ("legacy/ … 120 arquivos").
+    """
+
+    def __init__(self, structure: Dict, token_budget: int = PROJECT_TREE_TOKEN_BUDGET, show_sizes: bool = PROJECT_TREE_SHOW_SIZES):
+        self.root = _build_nodes(structure)
+        self.token_budget = token_budget
+        self.show_sizes = show_sizes
+        self._full = self._render(set())
+        self._cache: Dict[Optional[Tuple[str, ...]], str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def fits_budget(self) -> bool:
+        """Se a árvore completa cabe no limite (nesse caso é a mesma para todos os arquivos)"""
+        return estimate_tokens(self._full) <= self.token_budget
+
+    def encode(self, focus_dir: Optional[str] = None) -> str:
+        """
+        Retorna a árvore codificada.
+
+        :param focus_dir: diretório do arquivo analisado ("src/app"); usado somente se a árvore não couber no limite
+        """
+        if self.fits_budget:
+            return self._full
+
+        focus = tuple(part for part in (focus_dir or "").replace("\\", "/").split("/") if part)
+        with self._lock:
+            encoded = self._cache.get(focus)
+        if encoded is None:
+            encoded = self._encode_budgeted(focus)
+            with self._lock:
+                self._cache[focus] = encoded
+        return encoded
+
+    def _file_line(self, name: str, size: int, indent: str) -> str:
+        return f"{indent}{name} ({_format_size(size)})" if self.show_sizes else f"{indent}{name}"
+
+    def _summary_line(self, node: _TreeNode, label: str, indent: str) -> str:
+        size = f", {_format_size(node.total_size)}" if self.show_sizes else ""
+        return f"{indent}{label}/ … {node.total_files} arquivos{size}"
+
+    def _render(self, collapsed: Set[Tuple[str, ...]]) -> str:
+        lines: List[str] = []
+
+        def render_dir(node: _TreeNode, depth: int):
+            indent = "  " * depth
+            for child in node.dirs:
+                # Agrupa diretórios que só possuem um subdiretório (src/main/java/...)
+                label = child.name
+                while not child.files and len(child.dirs) == 1 and child.path not in collapsed:
+                    child = child.dirs[0]
+                    label += f"/{child.name}"
+
+                if child.path in collapsed:
+                    lines.append(self._summary_line(child, label, indent))
+                else:
+                    lines.append(f"{indent}{label}/")
+                    render_dir(child, depth + 1)
+
+            for name, size in node.files:
+                lines.append(self._file_line(name, size, indent))
+
+        render_dir(self.root, 0)
+        return "\n".join(lines)
+
+    def _encode_budgeted(self, focus: Tuple[str, ...]) -> str:
+        # Todos os diretórios, exceto a raiz, o diretório do arquivo e os diretórios acima dele
+        candidates: List[_TreeNode] = []
+
+        def collect(node: _TreeNode):
+            for child in node.dirs:
+                if focus[:len(child.path)] != child.path:
+                    candidates.append(child)
+                collect(child)
+
+        collect(self.root)
+
+        def distance(node: _TreeNode) -> int:
+            common = 0
+            for a, b in zip(node.path, focus):
+                if a != b:
+                    break
+                common += 1
+            return (len(node.path) - common) + (len(focus) - common)
+
+        # Resume primeiro os mais distantes do arquivo e, entre eles, os mais profundos
+        candidates.sort(key=lambda node: (distance(node), len(node.path), node.total_files), reverse=True)
+
+        def render_collapsing(count: int) -> str:
+            return self._render({node.path for node in candidates[:count]})
+
+        # Busca binária pela menor quantidade de diretórios resumidos que cabe no limite
+        # (evita renderizar a árvore inteira a cada diretório em projetos grandes)
+        low, high = 1, len(candidates)
+        encoded = render_collapsing(high)
+        if estimate_tokens(encoded) <= self.token_budget:
+            while low < high:
+                middle = (low + high) // 2
+                attempt = render_collapsing(middle)
+                if estimate_tokens(attempt) <= self.token_budget:
+                    high, encoded = middle, attempt
+                else:
+                    low = middle + 1
+            return encoded
+
+        # Mesmo resumida não coube (ex.: milhares de arquivos na raiz): corta as linhas excedentes
+        lines = encoded.split("\n")
+        kept: List[str] = []
+        used = 0
+        for line in lines:
+            cost = estimate_tokens(line + "\n")
+            if used + cost > self.token_budget:
+                break
+            kept.append(line)
+            used += cost
+        kept.append(f"… ({len(lines) - len(kept)} linhas omitidas)")
+        return "\n".join(kept)
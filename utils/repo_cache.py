@@ -0,0 +1,229 @@
+from config import (
+    GIT_PROJECT_TEMP, GIT_FETCH_DEPTH, GIT_PARTIAL_CLONE, GIT_SPARSE_CHECKOUT, GIT_CACHE_MAX_MB, ACCEPTED_EXTENSIONS
+)
+from utils.git_integration import build_auth_url
+from utils.metrics import GIT_SECONDS
+from git import Git, Repo, GitCommandError
+from urllib.parse import urlparse
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+import threading
+import hashlib
+import logging
+import shutil
+import time
+import uuid
+import os
+
+# Worktrees sem uso há mais tempo que isso (ex.: sobras de uma execução interrompida) são removidas
+STALE_WORKTREE_SECONDS = 6 * 60 * 60
+
+
+class RepoCache:
+    """
+    Cache de repositórios: um espelho "bare" por remoto, atualizado com fetch incremental,
+    e um worktree leve por análise, com a branch pedida.
+
+    Cada análise tem o próprio worktree, então análises simultâneas do mesmo repositório
+    (inclusive em branches diferentes) não interferem entre si. Os worktrees usam sparse checkout
+    (somente ACCEPTED_EXTENSIONS e .gitignore) e o espelho pode ser raso (GIT_FETCH_DEPTH) e sem
+    o conteúdo dos arquivos antigos (GIT_PARTIAL_CLONE), baixado só quando necessário.
+    Quando o tamanho total passa de 'max_bytes', os espelhos usados há mais tempo são removidos.
+    """
+
+    def __init__(self, base_dir: str = GIT_PROJECT_TEMP, max_bytes: int = GIT_CACHE_MAX_MB * 1024 * 1024):
+        self.mirrors_dir = Path(base_dir) / "mirrors"
+        self.worktrees_dir = Path(base_dir) / "worktrees"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._mirror_locks: Dict[str, threading.Lock] = {}
+        # Worktree em uso -> espelho ao qual pertence
+        self._active_worktrees: Dict[str, Path] = {}
+
+    def _mirror_path(self, repo_url: str) -> Path:
+        # Nome legível + hash da URL, evitando conflito entre repositórios com o mesmo nome
+        repo_name = os.path.basename(urlparse(repo_url).path.rstrip("/")).replace(".git", "") or "repo"
+        url_hash = hashlib.sha1(repo_url.encode("utf-8")).hexdigest()[:12]
+        return self.mirrors_dir / f"{repo_name}-{url_hash}.git"
+
+    def _mirror_lock(self, mirror_path: Path) -> threading.Lock:
+        with self._lock:
+            return self._mirror_locks.setdefault(str(mirror_path), threading.Lock())
+
+    @staticmethod
+    def _mirror_git(mirror_path: Path) -> Git:
+        # Comandos executados dentro do espelho. Não usa Repo(): o sparse checkout dos worktrees move o
+        # "core.bare" para o config.worktree e o GitPython deixa de reconhecer o repositório como bare
+        return Git(str(mirror_path))
+
+    @staticmethod
+    def _depth_args() -> List[str]:
+        return [f"--depth={GIT_FETCH_DEPTH}"] if GIT_FETCH_DEPTH > 0 else []
+
+    def _update_mirror(self, repo_url: str, branch: str, mirror_path: Path):
+        """Cria o espelho ou busca somente os commits novos da branch"""
+        auth_repo_url = build_auth_url(repo_url)
+
+        if mirror_path.exists():
+            try:
+                mirror = self._mirror_git(mirror_path)
+                # A URL é atualizada a cada uso, o token pode ter mudado
+                mirror.remote("set-url", "origin", auth_repo_url)
+                # Limpa o registro de worktrees removidos sem o git (ex.: worktrees abandonados)
+                mirror.worktree("prune")
+                with GIT_SECONDS.time(operation="fetch"):
+                    mirror.fetch("origin", f"+refs/heads/{branch}:refs/heads/{branch}", "--prune", *self._depth_args())
+                logging.info(f"Repositório {repo_url} ({branch}) atualizado no cache {mirror_path}")
+                return
+            except GitCommandError as e:
+                # Espelho corrompido: apaga e cria novamente
+                logging.warning(f"Erro ao atualizar o cache do repositório {mirror_path}: {e}")
+                logging.warning("Tentando clonar novamente...")
+                shutil.rmtree(mirror_path, ignore_errors=True)
+
+        logging.info(f"Clonando repositório {repo_url} no cache {mirror_path}")
+        mirror_path.parent.mkdir(parents=True, exist_ok=True)
+        clone_args = ["--bare", "--no-tags", *self._depth_args()]
+        if GIT_PARTIAL_CLONE:
+            # Histórico completo (necessário na análise incremental), sem o conteúdo dos arquivos antigos
+            clone_args.append("--filter=blob:none")
+        with GIT_SECONDS.time(operation="clone"):
+            Repo.clone_from(auth_repo_url, str(mirror_path), multi_options=clone_args)
+            # O clone "bare" já traz as branches em refs/heads; garante a branch pedida mesmo com --depth (somente a padrão)
+            self._mirror_git(mirror_path).fetch("origin", f"+refs/heads/{branch}:refs/heads/{branch}", *self._depth_args())
+        logging.info("Clonagem concluída.")
+
+    @staticmethod
+    def _sparse_patterns() -> List[str]:
+        return [f"*{extension}" for extension in ACCEPTED_EXTENSIONS] + [".gitignore"]
+
+    def remote_head(self, repo_url: str, branch: str = "master") -> Optional[str]:
+        """Commit atual da branch no remoto (git ls-remote), sem atualizar o espelho; None se não for possível consultar"""
+        ref = f"refs/heads/{branch}"
+        try:
+            with GIT_SECONDS.time(operation="ls-remote"):
+                output = Git().ls_remote(build_auth_url(repo_url), ref)
+        except GitCommandError:
+            # A mensagem do erro contém a URL com o token, não é registrada
+            logging.warning(f"Não foi possível consultar o commit da branch '{branch}' de {repo_url}")
+            return None
+        for line in output.splitlines():
+            sha, _, name = line.partition("\t")
+            if name == ref:
+                return sha
+        return None
+
+    def checkout(self, repo_url: str, branch: str = "master") -> str:
+        """
+        Atualiza o espelho do repositório e cria um worktree novo com a branch pedida.
+
+        :return: caminho do worktree; deve ser liberado com release() ao final da análise
+        """
+        mirror_path = self._mirror_path(repo_url)
+        worktree_path = self.worktrees_dir / f"{mirror_path.stem}-{uuid.uuid4().hex[:8]}"
+
+        with self._mirror_lock(mirror_path):
+            self._update_mirror(repo_url, branch, mirror_path)
+            mirror = self._mirror_git(mirror_path)
+
+            self.worktrees_dir.mkdir(parents=True, exist_ok=True)
+            try:
+                with GIT_SECONDS.time(operation="worktree"):
+                    mirror.worktree("add", "--no-checkout", "--detach", str(worktree_path.resolve()), f"refs/heads/{branch}")
+                    worktree = Repo(str(worktree_path))
+                    if GIT_SPARSE_CHECKOUT and ACCEPTED_EXTENSIONS:
+                        worktree.git.sparse_checkout("set", "--no-cone", *self._sparse_patterns())
+                    worktree.git.checkout("--detach", f"refs/heads/{branch}")
+            except GitCommandError:
+                shutil.rmtree(worktree_path, ignore_errors=True)
+                mirror.worktree("prune")
+                raise
+
+            with self._lock:
+                self._active_worktrees[str(worktree_path)] = mirror_path
+            # Marca o espelho como usado agora (ordem da remoção quando o cache passa do limite)
+            os.utime(mirror_path)
+
+        logging.info(f"Worktree da branch '{branch}' criado em {worktree_path}")
+        self._evict()
+        return str(worktree_path)
+
+    def release(self, worktree_path: str):
+        """Remove o worktree de uma análise concluída"""
+        with self._lock:
+            mirror_path = self._active_worktrees.pop(str(worktree_path), None)
+        self._remove_worktree(Path(worktree_path), mirror_path)
+        self._evict()
+
+    def _remove_worktree(self, worktree_path: Path, mirror_path=None):
+        if mirror_path is not None and mirror_path.exists():
+            with self._mirror_lock(mirror_path):
+                try:
+                    self._mirror_git(mirror_path).worktree("remove", "--force", str(worktree_path.resolve()))
+                except GitCommandError as e:
+                    logging.warning(f"Erro ao remover o worktree {worktree_path}: {e}")
+        shutil.rmtree(worktree_path, ignore_errors=True)
+
+    @staticmethod
+    def _dir_size(path: Path) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+        return total
+
+    def _evict(self):
+        """Remove worktrees abandonados e, se o cache passar do limite, os espelhos usados há mais tempo"""
+        with self._lock:
+            active_worktrees = set(self._active_worktrees)
+            active_mirrors: Set[Path] = set(self._active_worktrees.values())
+
+        now = time.time()
+        if self.worktrees_dir.exists():
+            for worktree_path in self.worktrees_dir.iterdir():
+                if str(worktree_path) in active_worktrees:
+                    continue
+                try:
+                    if now - worktree_path.stat().st_mtime < STALE_WORKTREE_SECONDS:
+                        continue
+                except OSError:
+                    continue
+                logging.info(f"🗑️ Removendo worktree abandonado {worktree_path}")
+                shutil.rmtree(worktree_path, ignore_errors=True)
+
+        if self.max_bytes <= 0 or not self.mirrors_dir.exists():
+            return
+
+        mirrors = []
+        for mirror_path in self.mirrors_dir.iterdir():
+            try:
+                mirrors.append((mirror_path.stat().st_mtime, self._dir_size(mirror_path), mirror_path))
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _ in mirrors)
+        if total <= self.max_bytes:
+            return
+
+        for _, size, mirror_path in sorted(mirrors):
+            if total <= self.max_bytes:
+                break
+            # Espelhos com análise em andamento não são removidos
+            if mirror_path in active_mirrors:
+                continue
+            with self._mirror_lock(mirror_path):
+                # O checkout registra o worktree com o lock do espelho: verificando novamente, um checkout
+                # iniciado depois da lista acima não perde o espelho em uso
+                with self._lock:
+                    in_use = mirror_path in self._active_worktrees.values()
+                if in_use:
+                    continue
+                shutil.rmtree(mirror_path, ignore_errors=True)
+            total -= size
+            logging.info(f"🗑️ Repositório {mirror_path.name} removido do cache ({size / 1024 / 1024:.1f}MB)")
+
+
+repo_cache = RepoCache()
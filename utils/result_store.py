@@ -0,0 +1,319 @@
+from config import RESULT_STORE_ENABLED, RESULT_STORE_PATH, RESULT_STORE_MAX_RUNS
+from pathlib import Path
+from typing import Dict, List, Optional
+import threading
+import sqlite3
+import logging
+import json
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    repo_url TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    commit_sha TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    sonar_project_key TEXT NOT NULL,
+    incremental INTEGER NOT NULL,
+    partial INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    duration_seconds REAL,
+    total_issues INTEGER NOT NULL,
+    statistics TEXT NOT NULL,
+    sonar_publish_id TEXT,
+    sonar_publish_status TEXT,
+    sonar_publish_at REAL
+);
+CREATE INDEX IF NOT EXISTS runs_lookup ON runs (repo_url, commit_sha, model, prompt_version, sonar_project_key);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (repo_url, branch, created_at);
+
+CREATE TABLE IF NOT EXISTS issues (
+    run_id TEXT NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    fingerprint TEXT,
+    file TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS issues_run ON issues (run_id, position);
+
+CREATE TABLE IF NOT EXISTS file_timings (
+    run_id TEXT NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    file TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    issues INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS file_timings_run ON file_timings (run_id);
+"""
+
+RUN_COLUMNS = (
+    "id", "repo_url", "branch", "commit_sha", "model", "prompt_version", "sonar_project_key",
+    "incremental", "partial", "created_at", "duration_seconds", "total_issues"
+)
+
+# Último envio das issues da execução para o SonarQube (core/sonar_publisher.py), atualizado a cada mudança de status
+PUBLISH_COLUMNS = (("sonar_publish_id", "TEXT"), ("sonar_publish_status", "TEXT"), ("sonar_publish_at", "REAL"))
+SELECT_COLUMNS = ", ".join(RUN_COLUMNS + tuple(column for column, _ in PUBLISH_COLUMNS))
+
+# Status (core/sonar_publisher.py) de envios que já atualizaram ou ainda vão atualizar as issues do projeto no SonarQube
+PUBLISH_QUEUED = "queued"
+PUBLISH_SUCCEEDED = "succeeded"
+PUBLISH_EFFECTIVE = (PUBLISH_QUEUED, "running", PUBLISH_SUCCEEDED)
+
+
+class ResultStore:
+    """
+    Histórico das análises em um banco SQLite local: issues, estatísticas e tempo de cada arquivo,
+    por repositório, branch, commit, modelo e versão do prompt.
+
+    Usado para consultar e comparar execuções anteriores e para responder imediatamente
+    uma análise repetida (mesmo commit, modelo e versão do prompt) sem chamar o LLM.
+    Quando passa de 'max_runs' execuções, as mais antigas são removidas.
+    """
+
+    def __init__(self, path: str = RESULT_STORE_PATH, max_runs: int = RESULT_STORE_MAX_RUNS, enabled: bool = RESULT_STORE_ENABLED):
+        self.path = Path(path)
+        self.max_runs = max_runs
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Uma conexão compartilhada entre as threads (acesso protegido pelo _lock), criada no primeiro uso
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(SCHEMA)
+            # Bancos criados antes do registro dos envios para o SonarQube
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(runs)")}
+            for column, column_type in PUBLISH_COLUMNS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE runs ADD COLUMN {column} {column_type}")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _run_dict(row: sqlite3.Row) -> dict:
+        run = {"run_id": row["id"], **{column: row[column] for column in RUN_COLUMNS[1:]}}
+        run.update({column: row[column] for column, _ in PUBLISH_COLUMNS})
+        run["incremental"] = bool(run["incremental"])
+        run["partial"] = bool(run["partial"])
+        return run
+
+    def save_run(self, repo_url: str, branch: str, commit: str, model: str, prompt_version: str, sonar_project_key: str,
+                 incremental: bool, response: dict, file_timings: List[dict], duration: Optional[float] = None) -> Optional[str]:
+        """
+        Salva uma execução do /analyze.
+
+        :param file_timings: [{"file": "src/a.py", "seconds": 1.2, "issues": 3}] de cada arquivo analisado
+        :return: id da execução, ou None se o histórico estiver desligado ou com erro
+        """
+        if not self.enabled:
+            return None
+
+        run_id = str(uuid.uuid4())
+        issues = response.get("analysis", [])
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute(
+                        f"INSERT INTO runs ({', '.join(RUN_COLUMNS)}, statistics) VALUES ({', '.join('?' * (len(RUN_COLUMNS) + 1))})",
+                        (
+                            run_id, repo_url, branch, commit, model, prompt_version, sonar_project_key,
+                            int(incremental), int(bool(response.get("partial"))), time.time(), duration, len(issues),
+                            json.dumps(response.get("statistics") or {}, ensure_ascii=False, default=str)
+                        )
+                    )
+                    conn.executemany(
+                        "INSERT INTO issues (run_id, position, fingerprint, file, data) VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (run_id, position, issue.get("fingerprint"), issue.get("file"), json.dumps(issue, ensure_ascii=False, default=str))
+                            for position, issue in enumerate(issues)
+                        ]
+                    )
+                    conn.executemany(
+                        "INSERT INTO file_timings (run_id, file, seconds, issues) VALUES (?, ?, ?, ?)",
+                        [(run_id, timing["file"], timing["seconds"], timing["issues"]) for timing in file_timings]
+                    )
+                    self._prune(conn)
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao salvar a análise no histórico ({self.path}): {e}")
+            return None
+
+        logging.info(f"💾 Análise do commit {commit[:8]} salva no histórico (execução {run_id})")
+        return run_id
+
+    def set_publish_status(self, run_id: str, publish_id: str, status: str):
+        """
+        Registra o status do envio das issues da execução para o SonarQube (callback on_status do sonar_publisher).
+        Um envio novo ("queued") substitui o anterior; os demais status só valem para o envio registrado.
+        """
+        if not self.enabled:
+            return
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute(
+                        "UPDATE runs SET sonar_publish_id = ?, sonar_publish_status = ?, sonar_publish_at = ? "
+                        "WHERE id = ? AND (? = ? OR sonar_publish_id = ?)",
+                        (publish_id, status, time.time(), run_id, status, PUBLISH_QUEUED, publish_id)
+                    )
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao registrar o envio {publish_id} no histórico ({self.path}): {e}")
+
+    def _prune(self, conn: sqlite3.Connection):
+        if self.max_runs <= 0:
+            return
+        conn.execute(
+            "DELETE FROM runs WHERE id IN (SELECT id FROM runs ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_runs,)
+        )
+
+    def has_runs(self, repo_url: str, model: str, prompt_version: str, sonar_project_key: str) -> bool:
+        """Indica se existe alguma execução completa reaproveitável do repositório (evita consultar o remoto à toa)"""
+        if not self.enabled:
+            return False
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT 1 FROM runs WHERE repo_url = ? AND model = ? AND prompt_version = ? AND sonar_project_key = ? AND partial = 0 LIMIT 1",
+                    (repo_url, model, prompt_version, sonar_project_key)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao consultar o histórico das análises ({self.path}): {e}")
+            return False
+        return row is not None
+
+    def find_run(self, repo_url: str, commit: str, model: str, prompt_version: str, sonar_project_key: str) -> Optional[dict]:
+        """
+        Execução completa (não parcial) mais recente do commit com o mesmo modelo e versão do prompt.
+
+        'sonar_published' indica se as issues da execução são as que estão no SonarQube: o envio dela terminou
+        com sucesso e nenhuma outra execução do projeto foi (ou está sendo) enviada depois.
+        """
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT id, sonar_publish_status, sonar_publish_at FROM runs WHERE repo_url = ? AND commit_sha = ? AND model = ? "
+                    "AND prompt_version = ? AND sonar_project_key = ? AND partial = 0 ORDER BY created_at DESC LIMIT 1",
+                    (repo_url, commit, model, prompt_version, sonar_project_key)
+                ).fetchone()
+                published = row is not None and row["sonar_publish_status"] == PUBLISH_SUCCEEDED and conn.execute(
+                    f"SELECT 1 FROM runs WHERE sonar_project_key = ? AND id != ? AND sonar_publish_at > ? "
+                    f"AND sonar_publish_status IN ({', '.join('?' * len(PUBLISH_EFFECTIVE))}) LIMIT 1",
+                    (sonar_project_key, row["id"], row["sonar_publish_at"], *PUBLISH_EFFECTIVE)
+                ).fetchone() is None
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao consultar o histórico das análises ({self.path}): {e}")
+            return None
+        if row is None:
+            return None
+        run = self.get_run(row["id"])
+        if run is not None:
+            run["sonar_published"] = published
+        return run
+
+    def list_runs(self, repo_url: Optional[str] = None, branch: Optional[str] = None, commit: Optional[str] = None,
+                  sonar_project_key: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """Execuções mais recentes primeiro, sem as issues; 'commit' aceita o sha abreviado"""
+        if not self.enabled:
+            return []
+        filters, params = [], []
+        for column, value in (("repo_url", repo_url), ("branch", branch), ("sonar_project_key", sonar_project_key)):
+            if value:
+                filters.append(f"{column} = ?")
+                params.append(value)
+        if commit:
+            filters.append("commit_sha LIKE ?")
+            params.append(f"{commit}%")
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        try:
+            with self._lock:
+                rows = self._connection().execute(
+                    f"SELECT {SELECT_COLUMNS} FROM runs {where} ORDER BY created_at DESC LIMIT ?",
+                    (*params, limit)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao consultar o histórico das análises ({self.path}): {e}")
+            return []
+        return [self._run_dict(row) for row in rows]
+
+    def get_run(self, run_id: str) -> Optional[dict]:
+        """Execução completa: dados da execução, estatísticas, issues e tempo de cada arquivo"""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute(f"SELECT {SELECT_COLUMNS}, statistics FROM runs WHERE id = ?", (run_id,)).fetchone()
+                if row is None:
+                    return None
+                issues = conn.execute("SELECT data FROM issues WHERE run_id = ? ORDER BY position", (run_id,)).fetchall()
+                timings = conn.execute("SELECT file, seconds, issues FROM file_timings WHERE run_id = ? ORDER BY seconds DESC", (run_id,)).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"❌ Erro ao consultar o histórico das análises ({self.path}): {e}")
+            return None
+
+        run = self._run_dict(row)
+        run["statistics"] = json.loads(row["statistics"])
+        run["analysis"] = [json.loads(issue["data"]) for issue in issues]
+        run["file_timings"] = [dict(timing) for timing in timings]
+        return run
+
+    @staticmethod
+    def _issue_key(issue: dict) -> str:
+        # Issues salvas antes dos fingerprints: usa o id
+        return issue.get("fingerprint") or issue.get("id") or json.dumps(issue, sort_keys=True)
+
+    def diff_runs(self, base_id: str, head_id: str) -> Optional[dict]:
+        """
+        Compara duas execuções pelo fingerprint das issues:
+        novas (somente em head), corrigidas (somente em base) e mantidas.
+        """
+        base, head = self.get_run(base_id), self.get_run(head_id)
+        if base is None or head is None:
+            return None
+
+        base_issues: Dict[str, dict] = {self._issue_key(issue): issue for issue in base["analysis"]}
+        head_issues: Dict[str, dict] = {self._issue_key(issue): issue for issue in head["analysis"]}
+        new = [issue for key, issue in head_issues.items() if key not in base_issues]
+        fixed = [issue for key, issue in base_issues.items() if key not in head_issues]
+        unchanged = len(head_issues.keys() & base_issues.keys())
+
+        base_timings = {timing["file"]: timing["seconds"] for timing in base["file_timings"]}
+        return {
+            "base": {key: value for key, value in base.items() if key not in ("analysis", "file_timings", "statistics")},
+            "head": {key: value for key, value in head.items() if key not in ("analysis", "file_timings", "statistics")},
+            "summary": {"new": len(new), "fixed": len(fixed), "unchanged": unchanged},
+            "new": new,
+            "fixed": fixed,
+            # Arquivos analisados nas duas execuções, com a diferença de tempo (positivo = mais lento em head)
+            "file_time_changes": sorted(
+                (
+                    {"file": timing["file"], "base_seconds": base_timings[timing["file"]], "head_seconds": timing["seconds"],
+                     "change_seconds": round(timing["seconds"] - base_timings[timing["file"]], 3)}
+                    for timing in head["file_timings"] if timing["file"] in base_timings
+                ),
+                key=lambda item: abs(item["change_seconds"]),
+                reverse=True
+            )
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+result_store = ResultStore()